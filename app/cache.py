@@ -0,0 +1,144 @@
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+import time
+
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from . import listener
+from .config import CACHE_TTL_SECONDS, CACHE_MAX_ENTRIES, CACHE_SHARED
+
+# Canal de Postgres por el que los workers se avisan de las invalidaciones
+INVALIDATION_CHANNEL = "cache_invalidation"
+
+MISSING = object()
+
+
+class TTLCache:
+    """
+    Caché LRU en memoria con caducidad por entrada.
+
+    `generation` aumenta con cada invalidación: quien cargó un valor antes de
+    una invalidación no puede guardarlo después (ver `set`).
+    """
+
+    def __init__(self, name: str, maxsize: int, ttl: float):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.generation = 0
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, key: Hashable) -> Any:
+        entry = self._data.get(str(key))
+        if entry is None:
+            self.misses += 1
+            return MISSING
+
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._data[str(key)]
+            self.expirations += 1
+            self.misses += 1
+            return MISSING
+
+        self._data.move_to_end(str(key))
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any, generation: Optional[int] = None) -> None:
+        if self.ttl <= 0 or self.maxsize <= 0:
+            return
+        if generation is not None and generation != self.generation:
+            return  # hubo una invalidación mientras se cargaba el valor
+
+        self._data[str(key)] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(str(key))
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, key: Optional[Hashable] = None) -> None:
+        """
+        Elimina una entrada, o todas si `key` es None.
+        """
+        self.generation += 1
+        self.invalidations += 1
+        if key is None:
+            self._data.clear()
+        else:
+            self._data.pop(str(key), None)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+        }
+
+
+device_cache = TTLCache("devices", CACHE_MAX_ENTRIES, CACHE_TTL_SECONDS)
+location_cache = TTLCache("locations", CACHE_MAX_ENTRIES, CACHE_TTL_SECONDS)
+
+CACHES = {cache.name: cache for cache in (device_cache, location_cache)}
+
+
+def get_cache_stats() -> Dict[str, Any]:
+    return {name: cache.stats() for name, cache in CACHES.items()}
+
+
+def _apply(payload: str) -> None:
+    name, _, key = payload.partition(":")
+    cache = CACHES.get(name)
+    if cache is not None:
+        cache.invalidate(None if key in ("", "*") else key)
+
+
+async def invalidate(db: AsyncSession, name: str, key: Optional[Hashable] = None) -> None:
+    """
+    Registra la invalidación de `name` (una clave, o toda la caché si key es None)
+    en la transacción actual. Se aplica en este worker al hacer commit y, con
+    CACHE_SHARED, se emite un NOTIFY que Postgres solo entrega al resto de
+    workers si la transacción hace commit.
+    """
+    payload = f"{name}:{'*' if key is None else key}"
+    db.sync_session.info.setdefault(_PENDING_KEY, []).append(payload)
+    if CACHE_SHARED:
+        await db.execute(
+            text("SELECT pg_notify(:channel, :payload)"),
+            {"channel": INVALIDATION_CHANNEL, "payload": payload},
+        )
+
+
+_PENDING_KEY = "cache_invalidations"
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_pending(session: Session) -> None:
+    for payload in session.info.pop(_PENDING_KEY, []):
+        _apply(payload)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending(session: Session) -> None:
+    session.info.pop(_PENDING_KEY, None)
+
+
+def _invalidate_all() -> None:
+    for cache in CACHES.values():
+        cache.invalidate()
+
+
+if CACHE_SHARED:
+    listener.register(INVALIDATION_CHANNEL, _apply, on_reconnect=_invalidate_all)
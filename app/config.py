@@ -9,6 +9,16 @@ def get_env(key: str, required: bool = True):
         raise ValueError(f"Falta la variable de entorno: {key}")
     return value
 
+def get_int_env(key: str, default: int) -> int:
+    value = get_env(key, required=False)
+    return int(value) if value else default
+
+def get_bool_env(key: str, default: bool) -> bool:
+    value = get_env(key, required=False)
+    if not value:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "si", "sí")
+
 POSTGRES_USER = get_env("POSTGRES_USER")
 POSTGRES_PASSWORD = get_env("POSTGRES_PASSWORD")
 POSTGRES_HOST = get_env("POSTGRES_HOST")
@@ -19,3 +29,63 @@ DATABASE_URL = (
     f"postgresql+asyncpg://{POSTGRES_USER}:{POSTGRES_PASSWORD}"
     f"@{POSTGRES_HOST}:{POSTGRES_PORT}/{POSTGRES_DB}"
 )
+
+# Motor y pool de conexiones (por worker de uvicorn)
+DB_ECHO = get_bool_env("DB_ECHO", False)
+DB_POOL_SIZE = get_int_env("DB_POOL_SIZE", 5)
+DB_MAX_OVERFLOW = get_int_env("DB_MAX_OVERFLOW", 10)
+DB_POOL_TIMEOUT = get_int_env("DB_POOL_TIMEOUT", 30)  # segundos esperando conexión libre
+DB_POOL_RECYCLE = get_int_env("DB_POOL_RECYCLE", 1800)  # segundos; -1 desactiva
+DB_POOL_PRE_PING = get_bool_env("DB_POOL_PRE_PING", True)
+# Caché de sentencias preparadas de asyncpg; 0 si hay un pgbouncer en modo transacción
+DB_STATEMENT_CACHE_SIZE = get_int_env("DB_STATEMENT_CACHE_SIZE", 100)
+DB_STATEMENT_TIMEOUT_MS = get_int_env("DB_STATEMENT_TIMEOUT_MS", 30000)  # 0 = sin límite
+# Migraciones al arrancar (solo desarrollo): en producción se ejecuta
+# `python -m app.migrations upgrade` antes de los workers, que solo comprueban la versión
+DB_AUTO_MIGRATE = get_bool_env("DB_AUTO_MIGRATE", False)
+
+# Checkpoints del inventario para consultas "as_of" (0 desactiva la tarea periódica)
+SNAPSHOT_INTERVAL_SECONDS = get_int_env("SNAPSHOT_INTERVAL_SECONDS", 3600)
+SNAPSHOT_KEEP = get_int_env("SNAPSHOT_KEEP", 168)
+
+# Caché de lecturas (localizaciones y dispositivos)
+CACHE_TTL_SECONDS = get_int_env("CACHE_TTL_SECONDS", 60)  # 0 desactiva la caché
+CACHE_MAX_ENTRIES = get_int_env("CACHE_MAX_ENTRIES", 10000)
+# Propaga las invalidaciones a los demás workers con LISTEN/NOTIFY de Postgres
+CACHE_SHARED = get_bool_env("CACHE_SHARED", True)
+
+# Sondeo de alcanzabilidad de dispositivos (0 desactiva la tarea periódica)
+PROBE_INTERVAL_SECONDS = get_int_env("PROBE_INTERVAL_SECONDS", 0)
+PROBE_CONCURRENCY = get_int_env("PROBE_CONCURRENCY", 500)  # conexiones simultáneas
+PROBE_TIMEOUT_MS = get_int_env("PROBE_TIMEOUT_MS", 1000)  # por intento de conexión
+PROBE_HOST_INTERVAL_MS = get_int_env("PROBE_HOST_INTERVAL_MS", 100)  # entre intentos al mismo host
+PROBE_SWEEP_BUDGET_SECONDS = get_int_env("PROBE_SWEEP_BUDGET_SECONDS", 60)  # duración máxima de un barrido
+
+# Métricas por ruta en /metrics y cabecera Server-Timing
+METRICS_ENABLED = get_bool_env("METRICS_ENABLED", True)
+METRICS_SLOW_REQUEST_MS = get_int_env("METRICS_SLOW_REQUEST_MS", 1000)  # 0 desactiva el log de lentas
+METRICS_LOG_SQL_CHARS = get_int_env("METRICS_LOG_SQL_CHARS", 500)  # recorte de cada sentencia en el log
+
+# Listados serializados directamente a bytes, sin construir modelos Pydantic por fila
+FAST_JSON = get_bool_env("FAST_JSON", False)
+# Entradas de historial (las más recientes) de cada dispositivo con ?expand=history
+DEVICE_EXPAND_HISTORY_LIMIT = get_int_env("DEVICE_EXPAND_HISTORY_LIMIT", 10)
+
+# Reconciliación de los contadores de /stats con la tabla devices (0 desactiva la tarea)
+STATS_RECONCILE_SECONDS = get_int_env("STATS_RECONCILE_SECONDS", 3600)
+
+# Historial diferido: las filas de historial se escriben en history_outbox dentro
+# de la transacción y una tarea de fondo las mueve por lotes a sus tablas
+AUDIT_OUTBOX = get_bool_env("AUDIT_OUTBOX", False)
+AUDIT_FLUSH_INTERVAL_MS = get_int_env("AUDIT_FLUSH_INTERVAL_MS", 1000)
+AUDIT_BATCH_SIZE = get_int_env("AUDIT_BATCH_SIZE", 5000)  # filas por transacción al mover
+
+# Historial particionado por mes (UTC): mantenimiento de particiones y retención
+HISTORY_MAINTENANCE_SECONDS = get_int_env("HISTORY_MAINTENANCE_SECONDS", 86400)  # 0 desactiva la tarea
+HISTORY_PARTITION_MONTHS_AHEAD = get_int_env("HISTORY_PARTITION_MONTHS_AHEAD", 3)  # particiones creadas por adelantado
+# Meses completos de historial que se conservan, además del actual (0 = sin límite);
+# del historial expirado queda el resumen diario por dispositivo
+HISTORY_RETENTION_MONTHS = get_int_env("HISTORY_RETENTION_MONTHS", 0)
+# Directorio donde archivar (CSV gzip) las particiones expiradas antes de
+# eliminarlas; vacío = solo se separan (DETACH) y quedan como tablas sueltas
+HISTORY_ARCHIVE_DIR = get_env("HISTORY_ARCHIVE_DIR", required=False) or ""
@@ -1,13 +1,31 @@
-from fastapi import APIRouter, Depends, status, HTTPException
+from fastapi import APIRouter, Depends, Header, status, HTTPException, Query, Request, Response
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import List
+from fastapi.responses import StreamingResponse
+from datetime import datetime
+from typing import Literal, Optional
 
-from ..schemas.device_schema import DeviceCreate, DeviceOut, DeviceUpdate
+from ..schemas.device_schema import (
+    DeviceCreate, DeviceOut, DeviceUpdate, DevicePage, BulkImportReport,
+    BulkStatusRequest, BulkMoveRequest, BulkChangeReport, parse_fieldset,
+)
+from ..schemas.history_schema import AssignmentHistoryPage
+from ..pagination import DEFAULT_LIMIT, MAX_LIMIT
 from ..services.device_service import DeviceService
+from ..services.export_service import ExportService, EXPORT_MEDIA_TYPES
+from ..services.import_service import ImportService, parse_csv
+from ..services.history_service import HistoryService
+from ..services.snapshot_service import SnapshotService
+from ..services.change_token_service import ChangeTokenService
 from ..database import get_session
+from ..config import FAST_JSON
+from ..fast_json import FastJSONResponse
+from ..etag import etag_matches, not_modified, validator_headers
 
 router = APIRouter(prefix="/devices", tags=["Dispositivos"])
 
+FIELDS_DESCRIPTION = "Campos del dispositivo separados por comas, ej. id,ip,status (id siempre se incluye)"
+EXPAND_DESCRIPTION = "Relaciones incluidas, separadas por comas: location, ports, history (últimas entradas)"
+
 @router.post("/", response_model=DeviceOut, status_code=status.HTTP_201_CREATED)
 async def create_device(device: DeviceCreate, db: AsyncSession = Depends(get_session)):
     try:
@@ -15,13 +33,142 @@ async def create_device(device: DeviceCreate, db: AsyncSession = Depends(get_ses
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.get("/", response_model=List[DeviceOut])
-async def list_devices(db: AsyncSession = Depends(get_session)):
+@router.post("/bulk", response_model=BulkImportReport)
+async def bulk_import_devices(request: Request, db: AsyncSession = Depends(get_session)):
+    """
+    Alta o actualización masiva de dispositivos por IP.
+    Acepta un array JSON de DeviceCreate o un CSV (Content-Type: text/csv) con cabecera
+    ip,status,description,protocol,location_id,ports y puertos como "22:SSH;80:HTTP".
+    """
+    try:
+        if request.headers.get("content-type", "").startswith("text/csv"):
+            rows = parse_csv((await request.body()).decode("utf-8-sig"))
+        else:
+            rows = await request.json()
+        if not isinstance(rows, list):
+            raise ValueError("Se esperaba un array de dispositivos")
+        return await ImportService.import_devices(db, rows)
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/bulk/status", response_model=BulkChangeReport)
+async def bulk_update_status(body: BulkStatusRequest, db: AsyncSession = Depends(get_session)):
+    """
+    Cambia el status de varios dispositivos (por IDs o filtro) en una transacción.
+    """
+    try:
+        return await DeviceService.bulk_change(db, body, "CAMBIO DE STATUS", {"status": body.status})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/bulk/move", response_model=BulkChangeReport)
+async def bulk_move(body: BulkMoveRequest, db: AsyncSession = Depends(get_session)):
+    """
+    Mueve varios dispositivos (por IDs o filtro) a una localización en una transacción.
+    """
+    try:
+        return await DeviceService.bulk_change(db, body, "CAMBIO DE LOCALIZACIÓN", {"location_id": body.location_id})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/", response_model=DevicePage)
+async def list_devices(
+    response: Response,
+    limit: int = Query(DEFAULT_LIMIT, ge=1, le=MAX_LIMIT),
+    cursor: Optional[str] = Query(None, description="Valor de next_cursor de la página anterior"),
+    status: Optional[str] = None,
+    protocol: Optional[str] = None,
+    location_id: Optional[int] = None,
+    location_subtree: Optional[int] = Query(None, description="Localización y todas sus sublocalizaciones"),
+    ip_prefix: Optional[str] = Query(None, description="Prefijo de IP, ej. 10.20."),
+    cidr: Optional[str] = Query(None, description="Red en notación CIDR, ej. 10.20.0.0/16"),
+    ip_from: Optional[str] = Query(None, description="Primera IP del rango (incluida)"),
+    ip_to: Optional[str] = Query(None, description="Última IP del rango (incluida)"),
+    include_total: bool = False,
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
+    expand: Optional[str] = Query(None, description=EXPAND_DESCRIPTION),
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_session),
+):
+    """
+    Lista dispositivos paginados por cursor, con filtros aplicados en SQL.
+    Con `fields`/`expand` solo se consultan y devuelven esos campos y
+    relaciones; sin ellos, la forma completa de DeviceOut.
+    Con If-None-Match responde 304 si no ha cambiado ningún dispositivo,
+    puerto ni localización (ni, con expand=history, el historial).
+    """
     try:
-        return await DeviceService.get_all_devices(db)
+        fieldset = parse_fieldset(fields, expand)
+        etag, last_modified = await ChangeTokenService.collection(db, "devices", "locations")
+        if fieldset is not None and "history" in fieldset.expand:
+            # Sin Last-Modified: la llegada de historial no tiene fecha en change_tokens
+            etag, last_modified = await ChangeTokenService.with_history(db, etag), None
+        headers = validator_headers(etag, last_modified)
+        if etag_matches(if_none_match, etag):
+            return not_modified(headers)
+
+        page = await DeviceService.get_all_devices(
+            db,
+            limit=limit,
+            cursor=cursor,
+            include_total=include_total,
+            fast=FAST_JSON,
+            fieldset=fieldset,
+            status=status,
+            protocol=protocol,
+            location_id=location_id,
+            location_subtree=location_subtree,
+            ip_prefix=ip_prefix,
+            cidr=cidr,
+            ip_from=ip_from,
+            ip_to=ip_to,
+        )
+        if FAST_JSON or fieldset is not None:
+            return FastJSONResponse(page, headers=headers)
+        response.headers.update(headers)
+        return page
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/export")
+async def export_devices(
+    fmt: Literal["ndjson", "csv"] = Query("ndjson", alias="format"),
+    status: Optional[str] = None,
+    protocol: Optional[str] = None,
+    location_id: Optional[int] = None,
+    location_subtree: Optional[int] = None,
+    ip_prefix: Optional[str] = None,
+    cidr: Optional[str] = None,
+    ip_from: Optional[str] = None,
+    ip_to: Optional[str] = None,
+):
+    """
+    Exporta los dispositivos en streaming (NDJSON o CSV) sin cargarlos en memoria.
+    """
+    try:
+        stream = ExportService.stream_devices(
+            fmt,
+            status=status,
+            protocol=protocol,
+            location_id=location_id,
+            location_subtree=location_subtree,
+            ip_prefix=ip_prefix,
+            cidr=cidr,
+            ip_from=ip_from,
+            ip_to=ip_to,
+        )
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
+    return StreamingResponse(
+        stream,
+        media_type=EXPORT_MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="devices.{fmt}"'},
+    )
+
 @router.delete("/{device_id}")
 async def delete_device(device_id: int, db: AsyncSession = Depends(get_session)):
     try:
@@ -57,15 +204,71 @@ async def update_device(device_id: int, device: DeviceUpdate, db: AsyncSession =
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/{device_id}/history", response_model=AssignmentHistoryPage)
+async def get_device_history(
+    device_id: int,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    limit: int = Query(DEFAULT_LIMIT, ge=1, le=MAX_LIMIT),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_session),
+):
+    """
+    Historial de un dispositivo, del más reciente al más antiguo.
+    """
+    try:
+        return await HistoryService.get_page(
+            db, limit=limit, cursor=cursor, device_id=device_id, since=since, until=until
+        )
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.get("/{device_id}", response_model=DeviceOut)
-async def get_device(device_id: int, db: AsyncSession = Depends(get_session)):
+async def get_device(
+    device_id: int,
+    response: Response,
+    as_of: Optional[datetime] = Query(None, description="Devuelve el status y la localización que tenía en ese instante"),
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
+    expand: Optional[str] = Query(None, description=EXPAND_DESCRIPTION),
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_session),
+):
     """
-    Obtiene un dispositivo por su ID.
+    Obtiene un dispositivo por su ID. Con `fields`/`expand` solo se
+    consultan y devuelven esos campos y relaciones (no con `as_of`).
+    Sin `as_of`, con If-None-Match responde 304 si no ha cambiado (ni,
+    con expand=history, su historial).
     """
     try:
-        device = await DeviceService.get(db, device_id)
+        fieldset = parse_fieldset(fields, expand)
+        if as_of is not None:
+            if fieldset is not None:
+                raise ValueError("fields y expand no se admiten junto con as_of")
+            device = await SnapshotService.get_device_as_of(db, device_id, as_of)
+        else:
+            etag = await ChangeTokenService.device(db, device_id)
+            if etag is None:
+                raise HTTPException(status_code=404, detail="Dispositivo no encontrado")
+            if fieldset is not None and "history" in fieldset.expand:
+                etag = await ChangeTokenService.with_history(db, etag, device_id)
+            headers = validator_headers(etag)
+            if etag_matches(if_none_match, etag):
+                return not_modified(headers)
+            if fieldset is not None:
+                device = await DeviceService.get_fields(db, device_id, fieldset)
+                if device:
+                    return FastJSONResponse(device, headers=headers)
+            else:
+                response.headers.update(headers)
+                device = await DeviceService.get(db, device_id, etag)
         if not device:
             raise HTTPException(status_code=404, detail="Dispositivo no encontrado")
         return device
+    except HTTPException:
+        raise
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
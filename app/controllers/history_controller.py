@@ -1,13 +1,98 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import List
+from datetime import date, datetime
+from typing import List, Literal, Optional
 
-from ..schemas.history_schema import AssignmentHistoryOut
+from ..schemas.history_schema import AssignmentHistoryPage, DeviceHistoryDailyOut
 from ..services.history_service import HistoryService
+from ..services.export_service import ExportService, EXPORT_MEDIA_TYPES
+from ..services.feed_service import FeedService, parse_last_event_id
 from ..database import get_session
+from ..config import FAST_JSON
+from ..fast_json import FastJSONResponse
+from ..pagination import DEFAULT_LIMIT, MAX_LIMIT
 
 router = APIRouter(prefix="/history", tags=["Historial"])
 
-@router.get("/", response_model=List[AssignmentHistoryOut])
-async def get_history(db: AsyncSession = Depends(get_session)):
-    return await HistoryService.get_all(db)
+@router.get("/", response_model=AssignmentHistoryPage)
+async def get_history(
+    device_id: Optional[int] = None,
+    location_id: Optional[int] = Query(None, description="Coincide con la localización anterior o la nueva"),
+    action: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    limit: int = Query(DEFAULT_LIMIT, ge=1, le=MAX_LIMIT),
+    cursor: Optional[str] = Query(None, description="Valor de next_cursor de la página anterior"),
+    db: AsyncSession = Depends(get_session),
+):
+    """
+    Historial de asignaciones filtrado, del más reciente al más antiguo.
+    """
+    try:
+        page = await HistoryService.get_page(
+            db,
+            limit=limit,
+            cursor=cursor,
+            fast=FAST_JSON,
+            device_id=device_id,
+            location_id=location_id,
+            action=action,
+            since=since,
+            until=until,
+        )
+        return FastJSONResponse(page) if FAST_JSON else page
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
+
+
+@router.get("/daily", response_model=List[DeviceHistoryDailyOut])
+async def get_history_daily(
+    device_id: Optional[int] = None,
+    since: Optional[date] = Query(None, description="Primer día (UTC), incluido"),
+    until: Optional[date] = Query(None, description="Último día (UTC), incluido"),
+    db: AsyncSession = Depends(get_session),
+):
+    """
+    Resumen diario de cambios por dispositivo; se conserva cuando el
+    historial detallado de esos días ya ha expirado.
+    """
+    try:
+        return await HistoryService.get_daily(db, device_id=device_id, since=since, until=until)
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
+
+
+@router.get("/stream")
+async def stream_history(
+    device_id: Optional[int] = None,
+    location_id: Optional[int] = None,
+    last_event_id: Optional[str] = Query(None, description="Alternativa a la cabecera Last-Event-ID"),
+    last_event_id_header: Optional[str] = Header(None, alias="Last-Event-ID"),
+):
+    """
+    Server-Sent Events con cada fila nueva del historial de asignaciones y de
+    localizaciones, filtrable por dispositivo o localización.
+    """
+    try:
+        resume = parse_last_event_id(last_event_id_header or last_event_id)
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
+
+    return StreamingResponse(
+        FeedService.stream(device_id, location_id, resume),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/export")
+async def export_history(fmt: Literal["ndjson", "csv"] = Query("ndjson", alias="format")):
+    """
+    Exporta el historial de asignaciones en streaming (NDJSON o CSV).
+    """
+    return StreamingResponse(
+        ExportService.stream_history(fmt),
+        media_type=EXPORT_MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="history.{fmt}"'},
+    )
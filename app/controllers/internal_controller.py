@@ -0,0 +1,82 @@
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..database import get_pool_stats, get_session
+from ..cache import get_cache_stats
+from ..services.probe_service import ProbeService
+from ..services.stats_service import StatsService
+from ..services.audit_service import AuditService
+from ..services.history_maintenance_service import HistoryMaintenanceService
+
+router = APIRouter(prefix="/internal", tags=["Interno"], include_in_schema=False)
+
+@router.get("/pool")
+async def pool_stats():
+    """
+    Estado del pool de conexiones de este worker y tiempos de espera acumulados.
+    """
+    return get_pool_stats()
+
+
+@router.get("/cache")
+async def cache_stats():
+    """
+    Aciertos, fallos, desalojos e invalidaciones de las cachés de este worker.
+    """
+    return get_cache_stats()
+
+
+@router.post("/probe")
+async def run_probe(db: AsyncSession = Depends(get_session)):
+    """
+    Lanza un barrido de sondeo ahora y devuelve su resumen.
+    """
+    try:
+        summary = await ProbeService.sweep(db)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    if summary is None:
+        raise HTTPException(status_code=409, detail="Ya hay un sondeo en curso")
+    return summary
+
+
+@router.post("/stats/reconcile")
+async def reconcile_stats(db: AsyncSession = Depends(get_session)):
+    """
+    Reconcilia ahora los contadores de /stats y devuelve las diferencias corregidas.
+    """
+    try:
+        differences = await StatsService.reconcile(db)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    if differences is None:
+        raise HTTPException(status_code=409, detail="Ya hay una reconciliación en curso")
+    return {"differences": differences}
+
+
+@router.post("/audit/flush")
+async def flush_audit(db: AsyncSession = Depends(get_session)):
+    """
+    Mueve ahora el historial pendiente de history_outbox y devuelve los totales.
+    """
+    try:
+        totals = await AuditService.flush(db)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    if totals is None:
+        raise HTTPException(status_code=409, detail="Ya hay otro worker moviendo el historial")
+    return totals
+
+
+@router.post("/history/maintenance")
+async def maintain_history(db: AsyncSession = Depends(get_session)):
+    """
+    Crea ahora las particiones del historial pendientes y aplica la retención.
+    """
+    try:
+        summary = await HistoryMaintenanceService.maintain(db)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    if summary is None:
+        raise HTTPException(status_code=409, detail="Ya hay un mantenimiento del historial en curso")
+    return summary
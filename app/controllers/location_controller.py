@@ -1,10 +1,17 @@
-from fastapi import APIRouter, Depends, status, HTTPException
+from fastapi import APIRouter, Depends, Header, status, HTTPException, Query, Response
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import List
+from datetime import datetime
+from typing import List, Literal, Optional
 
-from ..schemas.location_schema import LocationCreate, LocationOut
+from ..schemas.location_schema import LocationCreate, LocationMove, LocationOut, LocationUpdate
+from ..schemas.device_schema import DeviceStateOut
 from ..services.location_service import LocationService
+from ..services.snapshot_service import SnapshotService
+from ..services.change_token_service import ChangeTokenService
 from ..database import get_session
+from ..config import FAST_JSON
+from ..fast_json import FastJSONResponse
+from ..etag import etag_matches, not_modified, validator_headers
 
 router = APIRouter(prefix="/locations", tags=["Localizaciones"])
 
@@ -12,21 +19,38 @@ router = APIRouter(prefix="/locations", tags=["Localizaciones"])
 @router.post("/", response_model=LocationOut, status_code=status.HTTP_201_CREATED)
 async def create_location(location: LocationCreate, db: AsyncSession = Depends(get_session)):
     """
-    Crea una nueva localización si no existe una con el mismo nombre.
+    Crea una nueva localización si no existe una con el mismo nombre,
+    opcionalmente dentro de otra (`parent_id`).
     """
     existing = await LocationService.get_by_name(db, location.name)
     if existing:
         raise HTTPException(status_code=400, detail="Ya existe una localización con ese nombre")
-    
-    return await LocationService.create(db, location)
+
+    try:
+        return await LocationService.create(db, location)
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
 
 
 @router.get("/", response_model=List[LocationOut])
-async def list_locations(db: AsyncSession = Depends(get_session)):
+async def list_locations(
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_session),
+):
     """
-    Lista todas las localizaciones disponibles.
+    Lista todas las localizaciones disponibles. Con If-None-Match responde
+    304 si no han cambiado.
     """
-    return await LocationService.get_all(db)
+    etag, last_modified = await ChangeTokenService.collection(db, "locations")
+    headers = validator_headers(etag, last_modified)
+    if etag_matches(if_none_match, etag):
+        return not_modified(headers)
+
+    if FAST_JSON:
+        return FastJSONResponse(await LocationService.get_all_json(db, etag), headers=headers)
+    response.headers.update(headers)
+    return await LocationService.get_all(db, etag)
 
 
 @router.get("/{location_id}", response_model=LocationOut)
@@ -40,8 +64,52 @@ async def get_location(location_id: int, db: AsyncSession = Depends(get_session)
     return location
 
 
+@router.get("/{location_id}/subtree", response_model=List[LocationOut])
+async def get_location_subtree(location_id: int, db: AsyncSession = Depends(get_session)):
+    """
+    La localización y todas sus descendientes, de la raíz a las hojas.
+    """
+    subtree = await LocationService.get_subtree(db, location_id)
+    if subtree is None:
+        raise HTTPException(status_code=404, detail="Localización no encontrada")
+    return subtree
+
+
+@router.get("/{location_id}/devices", response_model=List[DeviceStateOut])
+async def list_location_devices(
+    location_id: int,
+    as_of: Optional[datetime] = Query(None, description="Reconstruye la asignación en ese instante"),
+    status: Optional[str] = None,
+    include_descendants: bool = Query(False, description="Incluye los dispositivos de las sublocalizaciones"),
+    db: AsyncSession = Depends(get_session),
+):
+    """
+    Dispositivos asignados a la localización, ahora o en un instante pasado.
+    """
+    try:
+        return await SnapshotService.get_location_devices(
+            db, location_id, as_of=as_of, status=status, include_descendants=include_descendants
+        )
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
+
+
+@router.post("/{location_id}/move", response_model=LocationOut)
+async def move_location(location_id: int, body: LocationMove, db: AsyncSession = Depends(get_session)):
+    """
+    Mueve la localización, con todas sus descendientes, bajo otra (o a la raíz).
+    """
+    try:
+        moved = await LocationService.move(db, location_id, body.parent_id)
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
+    if moved is None:
+        raise HTTPException(status_code=404, detail="Localización no encontrada")
+    return moved
+
+
 @router.put("/{location_id}", response_model=LocationOut)
-async def update_location(location_id: int, location: LocationCreate, db: AsyncSession = Depends(get_session)):
+async def update_location(location_id: int, location: LocationUpdate, db: AsyncSession = Depends(get_session)):
     """
     Actualiza una localización por ID.
     Guarda historial si cambia nombre o descripción.
@@ -58,10 +126,22 @@ async def update_location(location_id: int, location: LocationCreate, db: AsyncS
 
 
 @router.delete("/{location_id}", status_code=204)
-async def delete_location(location_id: int, db: AsyncSession = Depends(get_session)):
+async def delete_location(
+    location_id: int,
+    on_devices: Literal["restrict", "detach", "reassign"] = Query(
+        "restrict", description="Qué hacer con los dispositivos de la localización"
+    ),
+    target_location_id: Optional[int] = Query(None, description="Destino de los dispositivos al reasignar"),
+    db: AsyncSession = Depends(get_session),
+):
     """
-    Elimina una localización si existe.
+    Elimina una localización si existe. Sus dispositivos nunca se borran:
+    con `detach` quedan sin localización y con `reassign` pasan a
+    `target_location_id`. El historial de asignaciones se conserva.
     """
-    eliminado = await LocationService.delete(db, location_id)
+    try:
+        eliminado = await LocationService.delete(db, location_id, on_devices, target_location_id)
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
     if not eliminado:
         raise HTTPException(status_code=404, detail="Localización no encontrada")
@@ -0,0 +1,28 @@
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+
+from ..schemas.stats_schema import LocationStatsOut, StatusCountOut
+from ..services.stats_service import StatsService
+from ..database import get_session
+
+router = APIRouter(prefix="/stats", tags=["Estadísticas"])
+
+
+@router.get("/locations", response_model=List[LocationStatsOut])
+async def location_stats(db: AsyncSession = Depends(get_session)):
+    """
+    Número de dispositivos por localización y status.
+    """
+    return await StatsService.get_locations(db)
+
+
+@router.get("/status", response_model=List[StatusCountOut])
+async def status_stats(
+    location_subtree: Optional[int] = Query(None, description="Solo esa localización y sus sublocalizaciones"),
+    db: AsyncSession = Depends(get_session),
+):
+    """
+    Número de dispositivos por status.
+    """
+    return await StatsService.get_status(db, location_subtree)
@@ -1,13 +1,100 @@
+from sqlalchemy import event
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker, declarative_base
-from .config import DATABASE_URL
-from typing import AsyncGenerator
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from .config import (
+    DATABASE_URL,
+    DB_ECHO,
+    DB_POOL_SIZE,
+    DB_MAX_OVERFLOW,
+    DB_POOL_TIMEOUT,
+    DB_POOL_RECYCLE,
+    DB_POOL_PRE_PING,
+    DB_STATEMENT_CACHE_SIZE,
+    DB_STATEMENT_TIMEOUT_MS,
+)
+from contextvars import ContextVar
+from typing import Any, AsyncGenerator, Dict, Optional
+import time
 
-engine = create_async_engine(DATABASE_URL, echo=True)
+# Cuándo pidió su conexión al pool la tarea en curso (ver _TimedPool)
+_checkout_started: ContextVar[Optional[float]] = ContextVar("checkout_started", default=None)
+
+
+class _TimedPool(AsyncAdaptedQueuePool):
+    """
+    Pool que anota cuándo se pide cada conexión; el evento checkout mide la
+    espera (ver _record_pool_wait).
+    """
+
+    # Sus logs, con el nombre y la configuración de los del pool original
+    _sqla_logger_namespace = "sqlalchemy.pool.impl.AsyncAdaptedQueuePool"
+
+    def connect(self):
+        token = _checkout_started.set(time.perf_counter())
+        try:
+            return super().connect()
+        finally:
+            _checkout_started.reset(token)
+
+
+engine = create_async_engine(
+    f"{DATABASE_URL}?prepared_statement_cache_size={DB_STATEMENT_CACHE_SIZE}",
+    echo=DB_ECHO,
+    poolclass=_TimedPool,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_timeout=DB_POOL_TIMEOUT,
+    pool_recycle=DB_POOL_RECYCLE,
+    pool_pre_ping=DB_POOL_PRE_PING,
+    # inet/cidr como str (no ipaddress.*), igual que el resto de columnas de texto
+    native_inet_types=False,
+    connect_args={
+        "statement_cache_size": DB_STATEMENT_CACHE_SIZE,
+        "server_settings": {"statement_timeout": str(DB_STATEMENT_TIMEOUT_MS)},
+    },
+)
 SessionLocal = sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
 Base = declarative_base()
 
+# Tiempo que se espera a obtener una conexión del pool, en todas las
+# sesiones (peticiones y tareas de fondo)
+_pool_wait = {"count": 0, "total_seconds": 0.0, "max_seconds": 0.0}
+
+
+@event.listens_for(engine.sync_engine, "checkout")
+def _record_pool_wait(dbapi_connection, connection_record, connection_proxy):
+    """
+    Espera desde que se pidió la conexión hasta que el pool la entrega,
+    incluida la apertura de una conexión nueva o el pre-ping si hacen falta.
+    """
+    started = _checkout_started.get()
+    if started is None:
+        return
+    waited = time.perf_counter() - started
+    _pool_wait["count"] += 1
+    _pool_wait["total_seconds"] += waited
+    _pool_wait["max_seconds"] = max(_pool_wait["max_seconds"], waited)
+
+
+def get_pool_stats() -> Dict[str, Any]:
+    pool = engine.sync_engine.pool
+    count = _pool_wait["count"]
+    return {
+        "size": pool.size(),
+        "max_overflow": DB_MAX_OVERFLOW,
+        "checked_in": pool.checkedin(),
+        "checked_out": pool.checkedout(),
+        "overflow": max(pool.overflow(), 0),
+        "wait_count": count,
+        "wait_seconds_total": round(_pool_wait["total_seconds"], 6),
+        "wait_seconds_avg": round(_pool_wait["total_seconds"] / count, 6) if count else 0.0,
+        "wait_seconds_max": round(_pool_wait["max_seconds"], 6),
+    }
+
 
 async def get_session() -> AsyncGenerator[AsyncSession, None]:
+    # La conexión se toma en la primera sentencia: las peticiones que se
+    # responden desde la caché no ocupan ninguna
     async with SessionLocal() as session:
         yield session
@@ -0,0 +1,44 @@
+"""
+Validadores HTTP (ETag, Last-Modified) a partir de los tokens de cambio y
+respuesta 304 a las peticiones condicionales con If-None-Match.
+"""
+from datetime import datetime
+from email.utils import format_datetime
+from typing import Dict, Optional
+
+from fastapi.responses import Response
+
+
+def make_etag(*tokens: int) -> str:
+    # Débil: el mismo contenido puede enviarse comprimido o sin comprimir
+    return 'W/"' + "-".join(str(token) for token in tokens) + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    Comparación débil (RFC 9110) de If-None-Match con el ETag actual.
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    current = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == current:
+            return True
+    return False
+
+
+def validator_headers(etag: str, last_modified: Optional[datetime] = None) -> Dict[str, str]:
+    # no-cache: el cliente puede guardar la respuesta pero debe revalidarla siempre
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if last_modified is not None:
+        headers["Last-Modified"] = format_datetime(last_modified, usegmt=True)
+    return headers
+
+
+def not_modified(headers: Dict[str, str]) -> Response:
+    return Response(status_code=304, headers=headers)
@@ -0,0 +1,46 @@
+"""
+Serialización directa a bytes para los listados (FAST_JSON).
+
+Los servicios construyen dicts con las mismas claves y en el mismo orden que
+los esquemas de salida, y aquí se codifican sin pasar por Pydantic. El
+resultado es idéntico al de FastAPI: JSON compacto en UTF-8 y fechas en
+ISO 8601 con "Z" para UTC.
+"""
+from datetime import datetime
+from typing import Any
+import json
+
+from fastapi.responses import Response
+
+try:
+    import orjson
+except ImportError:  # orjson es opcional: sin él se usa json (más lento)
+    orjson = None
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, datetime):
+        text = value.isoformat()
+        return text[:-6] + "Z" if text.endswith("+00:00") else text
+    raise TypeError(f"Tipo no serializable: {type(value).__name__}")
+
+
+def dumps(content: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_UTC_Z)
+    return json.dumps(
+        content, default=_default, ensure_ascii=False, allow_nan=False, separators=(",", ":")
+    ).encode("utf-8")
+
+
+class FastJSONResponse(Response):
+    """
+    Respuesta JSON para contenido ya preparado (dicts/listas de tipos básicos o bytes).
+    """
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, bytes):
+            return content
+        return dumps(content)
@@ -0,0 +1,123 @@
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set, Tuple
+import asyncio
+import json
+import logging
+
+from . import listener
+from .database import SessionLocal
+from .models.assignment_model import AssignmentHistory
+from .models.location_history_model import LocationHistory
+from .models.triggers import HISTORY_FEED_CHANNEL
+from .repositories.history_repository import HistoryRepository
+
+logger = logging.getLogger(__name__)
+
+# Eventos pendientes por suscriptor; si se llena, se corta su stream
+FEED_QUEUE_SIZE = 1000
+
+# Tipo de evento -> modelo de su tabla de historial
+FEED_MODELS = {"assignment": AssignmentHistory, "location": LocationHistory}
+
+
+def row_to_dict(row) -> Dict[str, Any]:
+    return {
+        key: value.isoformat() if isinstance(value, datetime) else value
+        for key, value in row._mapping.items()
+    }
+
+
+class FeedSubscriber:
+    def __init__(self, device_id: Optional[int] = None, location_id: Optional[int] = None):
+        self.device_id = device_id
+        self.location_id = location_id
+        self.queue: "asyncio.Queue[tuple]" = asyncio.Queue(maxsize=FEED_QUEUE_SIZE)
+        self.overflowed = False
+
+    def matches(self, kind: str, row: Dict[str, Any]) -> bool:
+        if self.device_id is not None:
+            if kind != "assignment" or row.get("device_id") != self.device_id:
+                return False
+        if self.location_id is not None:
+            if kind == "assignment":
+                return self.location_id in (row.get("old_location_id"), row.get("new_location_id"))
+            return row.get("location_id") == self.location_id
+        return True
+
+
+class FeedHub:
+    """
+    Reparte en memoria los eventos recibidos por la única conexión LISTEN del
+    worker entre todos los suscriptores SSE.
+
+    Los avisos solo traen las claves de la fila (HISTORY_FEED_KEYS): las filas
+    se leen por id, por lotes, en una única tarea que las entrega en el orden
+    de los avisos.
+    """
+
+    def __init__(self):
+        self.subscribers: Set[FeedSubscriber] = set()
+        self.pending: List[Tuple[str, Dict[str, Any]]] = []
+        self.delivery: Optional[asyncio.Task] = None
+
+    def subscribe(self, device_id: Optional[int] = None, location_id: Optional[int] = None) -> FeedSubscriber:
+        subscriber = FeedSubscriber(device_id, location_id)
+        self.subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: FeedSubscriber) -> None:
+        self.subscribers.discard(subscriber)
+
+    def publish(self, payload: str) -> None:
+        event = json.loads(payload)
+        kind, keys = event["kind"], event["row"]
+        if not any(subscriber.matches(kind, keys) for subscriber in self.subscribers):
+            return
+        self.pending.append((kind, keys))
+        if self.delivery is None or self.delivery.done():
+            self.delivery = asyncio.create_task(self._deliver())
+
+    async def _deliver(self) -> None:
+        while self.pending:
+            batch, self.pending = self.pending, []
+            try:
+                rows = await self._load(batch)
+            except Exception as e:
+                # Quien esperaba estos eventos reconectará con Last-Event-ID
+                logger.error(f"Error al leer las filas del feed: {e}")
+                for subscriber in list(self.subscribers):
+                    if any(subscriber.matches(kind, keys) for kind, keys in batch):
+                        subscriber.overflowed = True
+                continue
+
+            for kind, keys in batch:
+                row = rows.get((kind, keys["id"]))
+                if row is not None:  # None: borrada antes de leerla
+                    self._put(kind, keys, row)
+
+    @staticmethod
+    async def _load(batch: List[Tuple[str, Dict[str, Any]]]) -> Dict[Tuple[str, int], Dict[str, Any]]:
+        rows = {}
+        async with SessionLocal() as db:
+            for kind, model in FEED_MODELS.items():
+                ids = [keys["id"] for event_kind, keys in batch if event_kind == kind]
+                if ids:
+                    for row in await HistoryRepository.get_by_ids(db, model, ids):
+                        rows[kind, row.id] = row_to_dict(row)
+        return rows
+
+    def _put(self, kind: str, keys: Dict[str, Any], row: Dict[str, Any]) -> None:
+        for subscriber in list(self.subscribers):
+            if subscriber.overflowed or not subscriber.matches(kind, keys):
+                continue
+            try:
+                subscriber.queue.put_nowait((kind, row))
+            except asyncio.QueueFull:
+                # El cliente reconectará con Last-Event-ID y recuperará lo perdido
+                subscriber.overflowed = True
+                logger.warning("Suscriptor del feed desbordado; se cierra su stream")
+
+
+feed_hub = FeedHub()
+
+listener.register(HISTORY_FEED_CHANNEL, feed_hub.publish)
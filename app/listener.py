@@ -0,0 +1,61 @@
+from typing import Callable, Dict, List
+import asyncio
+import logging
+
+import asyncpg
+
+from .config import DATABASE_URL
+
+logger = logging.getLogger(__name__)
+
+# Una única conexión LISTEN por worker, compartida por todos los canales
+_handlers: Dict[str, Callable[[str], None]] = {}
+_reconnect_hooks: List[Callable[[], None]] = []
+
+
+def register(channel: str, handler: Callable[[str], None], on_reconnect: Callable[[], None] = None) -> None:
+    """
+    Suscribe `handler(payload)` a un canal de NOTIFY. `on_reconnect` se llama
+    cada vez que se (re)establece la conexión, porque pudieron perderse avisos.
+    """
+    _handlers[channel] = handler
+    if on_reconnect is not None:
+        _reconnect_hooks.append(on_reconnect)
+
+
+def has_handlers() -> bool:
+    return bool(_handlers)
+
+
+def _dispatch(connection, pid, channel, payload) -> None:
+    try:
+        _handlers[channel](payload)
+    except Exception as e:
+        logger.error(f"Error al procesar NOTIFY en {channel}: {e}")
+
+
+async def run_listener(retry_seconds: float = 5.0):
+    """
+    Tarea de fondo: mantiene la conexión LISTEN y reconecta si se pierde.
+    """
+    dsn = DATABASE_URL.replace("postgresql+asyncpg://", "postgresql://", 1)
+    while True:
+        conn = None
+        try:
+            conn = await asyncpg.connect(dsn)
+            for channel in _handlers:
+                await conn.add_listener(channel, _dispatch)
+            for hook in _reconnect_hooks:
+                hook()
+            logger.info(f"Escuchando NOTIFY en: {', '.join(_handlers)}")
+
+            while not conn.is_closed():
+                await asyncio.sleep(retry_seconds)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Error en la conexión LISTEN: {e}")
+        finally:
+            if conn is not None and not conn.is_closed():
+                await conn.close()
+        await asyncio.sleep(retry_seconds)
@@ -1,3 +1,4 @@
+import asyncio
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.exceptions import RequestValidationError
@@ -7,12 +8,31 @@ from sqlalchemy.exc import SQLAlchemyError, IntegrityError
 from app.controllers import (
     device_controller,
     location_controller,
-    assignment_controller,
     history_controller,
+    internal_controller,
+    metrics_controller,
+    stats_controller,
 )
 
-# Base de datos y modelos
-from app.database import engine, Base
+# Base de datos y migraciones
+from app.database import engine
+from app import migrations
+from app.config import (
+    DB_AUTO_MIGRATE,
+    SNAPSHOT_INTERVAL_SECONDS,
+    PROBE_INTERVAL_SECONDS,
+    STATS_RECONCILE_SECONDS,
+    AUDIT_OUTBOX,
+    HISTORY_MAINTENANCE_SECONDS,
+    METRICS_ENABLED,
+)
+from app.metrics import MetricsMiddleware, instrument_engine
+from app import listener
+from app.services.snapshot_service import SnapshotService
+from app.services.probe_service import ProbeService
+from app.services.stats_service import StatsService
+from app.services.audit_service import AuditService
+from app.services.history_maintenance_service import HistoryMaintenanceService
 
 # Manejadores de excepciones
 from app.exceptions import (
@@ -37,19 +57,63 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing", "ETag", "Last-Modified"],
 )
 
-# Crear tablas al iniciar
+# Métricas por ruta (latencia, SQL, bytes) y cabecera Server-Timing
+if METRICS_ENABLED:
+    instrument_engine(engine.sync_engine)
+    app.add_middleware(MetricsMiddleware)
+
+# Al iniciar solo se comprueba la versión del esquema (ver app/migrations)
 @app.on_event("startup")
 async def on_startup():
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+    if DB_AUTO_MIGRATE:
+        await migrations.upgrade(engine)
+    await migrations.check_schema(engine)
+
+    app.state.background_tasks = []
+
+    # Checkpoints periódicos para las consultas "as_of"
+    if SNAPSHOT_INTERVAL_SECONDS > 0:
+        app.state.background_tasks.append(asyncio.create_task(SnapshotService.run_periodic()))
+
+    # Sondeo periódico de alcanzabilidad de los dispositivos
+    if PROBE_INTERVAL_SECONDS > 0:
+        app.state.background_tasks.append(asyncio.create_task(ProbeService.run_periodic()))
+
+    # Reconciliación de los contadores de /stats (también rellena una tabla nueva)
+    if STATS_RECONCILE_SECONDS > 0:
+        app.state.background_tasks.append(asyncio.create_task(StatsService.run_periodic()))
+
+    # Historial diferido: mueve history_outbox a las tablas de historial
+    if AUDIT_OUTBOX:
+        app.state.background_tasks.append(asyncio.create_task(AuditService.run_periodic()))
+    else:
+        app.state.background_tasks.append(asyncio.create_task(AuditService.flush_pending()))
+
+    # Particiones mensuales del historial y retención (también al arrancar)
+    if HISTORY_MAINTENANCE_SECONDS > 0:
+        app.state.background_tasks.append(asyncio.create_task(HistoryMaintenanceService.run_periodic()))
+
+    # Conexión LISTEN compartida: invalidaciones de caché y feed de historial
+    if listener.has_handlers():
+        app.state.background_tasks.append(asyncio.create_task(listener.run_listener()))
+
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    for task in getattr(app.state, "background_tasks", []):
+        task.cancel()
 
 # Incluir rutas
 app.include_router(device_controller.router)
 app.include_router(location_controller.router)
-app.include_router(assignment_controller.router)
 app.include_router(history_controller.router)
+app.include_router(stats_controller.router)
+app.include_router(internal_controller.router)
+if METRICS_ENABLED:
+    app.include_router(metrics_controller.router)
 
 # Manejo de errores
 app.add_exception_handler(SQLAlchemyError, sqlalchemy_exception_handler)
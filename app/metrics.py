@@ -0,0 +1,182 @@
+"""
+Métricas por ruta: latencia, sentencias SQL, tiempo en base de datos, filas
+devueltas y bytes de respuesta. Se exponen en formato Prometheus en /metrics
+y cada respuesta lleva una cabecera Server-Timing.
+
+La latencia es el tiempo hasta el inicio de la respuesta (la cabecera). En
+las respuestas normales el endpoint ya ha terminado entonces; en los streams
+(SSE, exportaciones) el resto es la duración del stream, que no es latencia:
+un feed abierto una hora no es una petición lenta.
+"""
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+import logging
+import time
+
+from sqlalchemy import event
+
+from .config import METRICS_SLOW_REQUEST_MS, METRICS_LOG_SQL_CHARS
+
+logger = logging.getLogger(__name__)
+
+# Límites superiores (segundos) del histograma de latencia
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class RequestStats:
+    def __init__(self):
+        self.statements: List[Tuple[str, float]] = []
+        self.db_time = 0.0
+        self.rows = 0
+
+
+_current: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+
+class RouteMetrics:
+    def __init__(self):
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+        self.count = 0
+        self.latency_sum = 0.0
+        self.statements = 0
+        self.db_time = 0.0
+        self.rows = 0
+        self.response_bytes = 0
+
+    def observe(self, latency: float, stats: RequestStats, response_bytes: int) -> None:
+        for index, bound in enumerate(LATENCY_BUCKETS):
+            if latency <= bound:
+                self.buckets[index] += 1
+        self.count += 1
+        self.latency_sum += latency
+        self.statements += len(stats.statements)
+        self.db_time += stats.db_time
+        self.rows += stats.rows
+        self.response_bytes += response_bytes
+
+
+# (método, ruta, status) -> métricas acumuladas de este worker
+_routes: Dict[Tuple[str, str, int], RouteMetrics] = {}
+
+
+def instrument_engine(sync_engine) -> None:
+    """
+    Cuenta las sentencias, su duración y las filas de la petición en curso.
+    """
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_start"].pop()
+        stats = _current.get()
+        if stats is None:
+            return
+        stats.statements.append((statement, elapsed))
+        stats.db_time += elapsed
+        if cursor.rowcount > 0:
+            stats.rows += cursor.rowcount
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def render_prometheus() -> str:
+    lines = [
+        "# HELP http_request_duration_seconds Latencia de las peticiones HTTP, hasta el inicio de la respuesta.",
+        "# TYPE http_request_duration_seconds histogram",
+    ]
+    routes = sorted(_routes.items())
+    for (method, route, status), metrics in routes:
+        labels = f'method="{method}",route="{_escape(route)}",status="{status}"'
+        for bound, count in zip(LATENCY_BUCKETS, metrics.buckets):
+            lines.append(f'http_request_duration_seconds_bucket{{{labels},le="{bound}"}} {count}')
+        lines.append(f'http_request_duration_seconds_bucket{{{labels},le="+Inf"}} {metrics.count}')
+        lines.append(f"http_request_duration_seconds_sum{{{labels}}} {metrics.latency_sum}")
+        lines.append(f"http_request_duration_seconds_count{{{labels}}} {metrics.count}")
+
+    counters = (
+        ("http_request_db_statements_total", "Sentencias SQL ejecutadas.", "statements"),
+        ("http_request_db_seconds_total", "Tiempo en la base de datos.", "db_time"),
+        ("http_request_db_rows_total", "Filas devueltas o modificadas por la base de datos.", "rows"),
+        ("http_response_bytes_total", "Bytes enviados en el cuerpo de las respuestas.", "response_bytes"),
+    )
+    for name, help_text, attribute in counters:
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} counter")
+        for (method, route, status), metrics in routes:
+            labels = f'method="{method}",route="{_escape(route)}",status="{status}"'
+            lines.append(f"{name}{{{labels}}} {getattr(metrics, attribute)}")
+    return "\n".join(lines) + "\n"
+
+
+def _server_timing(elapsed: float, stats: RequestStats) -> bytes:
+    return (
+        f'app;dur={elapsed * 1000:.1f}, '
+        f'db;dur={stats.db_time * 1000:.1f};desc="{len(stats.statements)} queries"'
+    ).encode()
+
+
+def _log_slow(method: str, path: str, status: int, elapsed: float, stats: RequestStats) -> None:
+    statements = "".join(
+        f"\n  {duration * 1000:8.1f} ms  {' '.join(sql.split())[:METRICS_LOG_SQL_CHARS]}"
+        for sql, duration in stats.statements
+    )
+    logger.warning(
+        f"Petición lenta: {method} {path} -> {status} en {elapsed * 1000:.1f} ms, "
+        f"{len(stats.statements)} sentencias SQL ({stats.db_time * 1000:.1f} ms){statements}"
+    )
+
+
+class MetricsMiddleware:
+    """
+    Middleware ASGI (no BaseHTTPMiddleware, para no bufferizar los streams ni el SSE).
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _current.set(stats)
+        started = time.perf_counter()
+        status = 500
+        response_bytes = 0
+        first_byte: Optional[float] = None
+
+        async def send_wrapper(message):
+            nonlocal status, response_bytes, first_byte
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                first_byte = time.perf_counter() - started
+                # En respuestas normales el endpoint ya terminó: las cifras son completas
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", _server_timing(first_byte, stats)))
+                message = {**message, "headers": headers}
+            elif message["type"] == "http.response.body":
+                response_bytes += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
+            # Sin respuesta iniciada (excepción en el endpoint), hasta el final
+            elapsed = first_byte if first_byte is not None else time.perf_counter() - started
+            route = scope.get("route")
+            route_path = getattr(route, "path", None) or "unmatched"
+            key = (scope["method"], route_path, status)
+            metrics = _routes.get(key)
+            if metrics is None:
+                metrics = _routes[key] = RouteMetrics()
+            metrics.observe(elapsed, stats, response_bytes)
+
+            if METRICS_SLOW_REQUEST_MS > 0 and elapsed * 1000 >= METRICS_SLOW_REQUEST_MS:
+                _log_slow(scope["method"], scope["path"], status, elapsed, stats)
@@ -0,0 +1,175 @@
+"""
+Migraciones versionadas del esquema.
+
+Cada módulo vNNNN_<nombre>.py de este paquete es una migración con
+DESCRIPTION y dos corrutinas, upgrade(conn) y downgrade(conn). Se aplican en
+orden de número, cada una en su propia transacción, y la versión aplicada se
+registra en schema_migrations. Se ejecutan una vez antes de arrancar los
+workers (python -m app.migrations upgrade); los workers solo comprueban
+la versión al arrancar (check_schema).
+
+Las migraciones no importan los modelos: su SQL queda fijo aunque los
+modelos cambien después.
+"""
+from dataclasses import dataclass
+from typing import Awaitable, Callable, List, Optional
+import importlib
+import logging
+import pkgutil
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+
+logger = logging.getLogger(__name__)
+
+# Clave del advisory lock que serializa las migraciones entre procesos
+MIGRATION_LOCK_KEY = 5_000_007
+
+_VERSIONS_TABLE = """
+CREATE TABLE IF NOT EXISTS schema_migrations (
+    version integer PRIMARY KEY,
+    description varchar NOT NULL,
+    applied_at timestamp with time zone NOT NULL DEFAULT now()
+)
+"""
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    name: str
+    description: str
+    upgrade: Callable[[AsyncConnection], Awaitable[None]]
+    downgrade: Callable[[AsyncConnection], Awaitable[None]]
+
+
+def load_migrations() -> List[Migration]:
+    """
+    Migraciones del paquete, ordenadas por versión.
+    """
+    migrations = []
+    for module_info in pkgutil.iter_modules(__path__):
+        name = module_info.name
+        if not (name.startswith("v") and name[1:5].isdigit()):
+            continue
+        module = importlib.import_module(f"{__name__}.{name}")
+        migrations.append(Migration(int(name[1:5]), name, module.DESCRIPTION, module.upgrade, module.downgrade))
+    migrations.sort(key=lambda migration: migration.version)
+    versions = [migration.version for migration in migrations]
+    if versions != list(range(1, len(versions) + 1)):
+        raise RuntimeError(f"Numeración de migraciones incorrecta: {versions}")
+    return migrations
+
+
+async def execute_all(conn: AsyncConnection, statements: List[str]) -> None:
+    """
+    Ejecuta las sentencias en orden (asyncpg no admite varias en una llamada),
+    tal cual: sin interpretar ":nombre" como parámetros.
+    """
+    for statement in statements:
+        await conn.exec_driver_sql(statement)
+
+
+async def get_version(conn: AsyncConnection) -> Optional[int]:
+    """
+    Versión aplicada; None si la base de datos nunca se ha migrado.
+    """
+    exists = await conn.execute(text("SELECT to_regclass('schema_migrations') IS NOT NULL"))
+    if not exists.scalar():
+        return None
+    result = await conn.execute(text("SELECT coalesce(max(version), 0) FROM schema_migrations"))
+    return result.scalar_one()
+
+
+async def _begin(conn: AsyncConnection) -> int:
+    """
+    Prepara la transacción de una migración: espera al lock, quita el
+    statement_timeout (las migraciones pueden reescribir tablas grandes) y
+    devuelve la versión actual, ya sin carreras con otros procesos.
+    """
+    await conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": MIGRATION_LOCK_KEY})
+    await conn.execute(text("SET LOCAL statement_timeout = 0"))
+    await conn.execute(text(_VERSIONS_TABLE))
+    return await get_version(conn) or 0
+
+
+async def upgrade(engine: AsyncEngine, target: Optional[int] = None) -> List[str]:
+    """
+    Aplica las migraciones pendientes hasta `target` (por defecto la última).
+    Devuelve los nombres de las aplicadas.
+    """
+    target = HEAD if target is None else target
+    applied = []
+    for migration in MIGRATIONS:
+        if migration.version > target:
+            break
+        async with engine.begin() as conn:
+            if await _begin(conn) >= migration.version:
+                continue
+            logger.info(f"Aplicando migración {migration.name}: {migration.description}")
+            await migration.upgrade(conn)
+            await conn.execute(
+                text("INSERT INTO schema_migrations (version, description) VALUES (:version, :description)"),
+                {"version": migration.version, "description": migration.description},
+            )
+        applied.append(migration.name)
+    return applied
+
+
+async def downgrade(engine: AsyncEngine, target: int) -> List[str]:
+    """
+    Deshace las migraciones aplicadas posteriores a `target`, de la más
+    reciente a la más antigua. Devuelve los nombres de las deshechas.
+    """
+    reverted = []
+    for migration in reversed(MIGRATIONS):
+        if migration.version <= target:
+            break
+        async with engine.begin() as conn:
+            if await _begin(conn) < migration.version:
+                continue
+            logger.info(f"Deshaciendo migración {migration.name}")
+            await migration.downgrade(conn)
+            await conn.execute(
+                text("DELETE FROM schema_migrations WHERE version = :version"), {"version": migration.version}
+            )
+        reverted.append(migration.name)
+    return reverted
+
+
+async def stamp(engine: AsyncEngine, target: int) -> None:
+    """
+    Registra la base de datos en la versión `target` sin ejecutar nada: para
+    bases creadas con Base.metadata.create_all con los modelos de esa versión.
+    """
+    async with engine.begin() as conn:
+        await _begin(conn)
+        await conn.execute(text("DELETE FROM schema_migrations"))
+        for migration in MIGRATIONS[:target]:
+            await conn.execute(
+                text("INSERT INTO schema_migrations (version, description) VALUES (:version, :description)"),
+                {"version": migration.version, "description": migration.description},
+            )
+
+
+async def check_schema(engine: AsyncEngine) -> int:
+    """
+    Comprobación al arrancar un worker: solo lectura, sin DDL ni locks. Lanza
+    RuntimeError si faltan migraciones; si la base de datos está por delante
+    del código (despliegue escalonado) solo avisa. Devuelve la versión.
+    """
+    async with engine.connect() as conn:
+        version = await get_version(conn)
+    if version is None or version < HEAD:
+        raise RuntimeError(
+            f"El esquema está en la versión {version or 0} y este código necesita la {HEAD}: "
+            f"ejecuta `python -m app.migrations upgrade` antes de arrancar"
+        )
+    if version > HEAD:
+        logger.warning(f"El esquema (versión {version}) es más reciente que este código ({HEAD})")
+    return version
+
+
+# Al final: las migraciones importan execute_all de este módulo
+MIGRATIONS = load_migrations()
+HEAD = MIGRATIONS[-1].version if MIGRATIONS else 0
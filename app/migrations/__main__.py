@@ -0,0 +1,77 @@
+"""
+Migraciones del esquema. Ejecutar una vez antes de arrancar los workers:
+
+    python -m app.migrations status
+    python -m app.migrations upgrade [--to N]
+    python -m app.migrations downgrade --to N
+    python -m app.migrations stamp N
+    python -m app.migrations check
+"""
+import argparse
+import asyncio
+import logging
+import sys
+
+from sqlalchemy import text
+
+from ..database import engine
+from . import HEAD, MIGRATIONS, downgrade, get_version, stamp, upgrade
+from .model_check import compare_with_models
+
+
+async def show_status() -> None:
+    async with engine.connect() as conn:
+        version = await get_version(conn)
+        applied = {}
+        if version is not None:
+            result = await conn.execute(text("SELECT version, applied_at FROM schema_migrations"))
+            applied = dict(result.all())
+    print(f"Versión del esquema: {version if version is not None else 'sin migrar'} (última: {HEAD})")
+    for migration in MIGRATIONS:
+        when = applied.get(migration.version)
+        mark = f"aplicada {when:%Y-%m-%d %H:%M:%S}" if when else "pendiente"
+        print(f"  {migration.version:4d}  {migration.name:40s} {mark}")
+
+
+async def main(args: argparse.Namespace) -> int:
+    try:
+        if args.command == "status":
+            await show_status()
+        elif args.command == "upgrade":
+            applied = await upgrade(engine, args.to)
+            print(f"Aplicadas: {', '.join(applied)}" if applied else "Nada que aplicar")
+        elif args.command == "downgrade":
+            reverted = await downgrade(engine, args.to)
+            print(f"Deshechas: {', '.join(reverted)}" if reverted else "Nada que deshacer")
+        elif args.command == "stamp":
+            await stamp(engine, args.version)
+            print(f"Esquema registrado en la versión {args.version}")
+        elif args.command == "check":
+            differences = await compare_with_models(engine)
+            if differences:
+                print("Las migraciones y los modelos no coinciden:")
+                print("\n".join(f"  {difference}" for difference in differences))
+                return 1
+            print("Las migraciones y los modelos coinciden")
+        return 0
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        prog="python -m app.migrations", description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("status", help="Versión actual y migraciones pendientes")
+    upgrade_parser = commands.add_parser("upgrade", help="Aplica las migraciones pendientes")
+    upgrade_parser.add_argument("--to", type=int, choices=range(1, HEAD + 1), metavar="N", help="Versión final (por defecto la última)")
+    downgrade_parser = commands.add_parser("downgrade", help="Deshace migraciones hasta la versión indicada")
+    downgrade_parser.add_argument("--to", type=int, required=True, choices=range(0, HEAD + 1), metavar="N", help="Versión final (0 = esquema vacío)")
+    stamp_parser = commands.add_parser("stamp", help="Registra la versión sin ejecutar nada (bases creadas con create_all)")
+    stamp_parser.add_argument("version", type=int, choices=range(0, HEAD + 1), metavar="N")
+    commands.add_parser("check", help="Compara el esquema de las migraciones con el de los modelos (sin cambiar nada)")
+    arguments = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    sys.exit(asyncio.run(main(arguments)))
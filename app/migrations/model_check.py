@@ -0,0 +1,130 @@
+"""
+Comprueba que las migraciones y los modelos describen el mismo esquema.
+
+Las tablas, índices, triggers y funciones están escritos dos veces: en los
+modelos (con su DDL after_create, que usa create_all) y en el SQL de las
+migraciones. Aquí se aplican todas las migraciones en un esquema vacío y
+create_all en otro, se comparan sus catálogos y se deshace todo: no queda
+nada en la base de datos y puede ejecutarse contra cualquiera.
+"""
+from typing import Dict, List, Set
+import importlib
+import pkgutil
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+
+from . import MIGRATIONS
+
+MIGRATIONS_SCHEMA = "schema_check_migrations"
+MODELS_SCHEMA = "schema_check_models"
+
+# Objetos de un esquema, como texto comparable (sin el nombre del esquema)
+CATALOG_QUERIES: Dict[str, str] = {
+    "tablas": """
+        SELECT c.relname || ' ' || CAST(c.relkind AS text)
+            || coalesce(' PARTITION OF ' || parent.relname || ' ' || pg_get_expr(c.relpartbound, c.oid), '')
+            || coalesce(' ' || pg_get_partkeydef(c.oid), '')
+        FROM pg_class c
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        LEFT JOIN pg_inherits i ON i.inhrelid = c.oid
+        LEFT JOIN pg_class parent ON parent.oid = i.inhparent
+        WHERE n.nspname = :schema AND c.relkind IN ('r', 'p', 'S', 'v', 'm')
+    """,
+    "columnas": """
+        SELECT c.relname || '.' || a.attname || ' ' || format_type(a.atttypid, a.atttypmod)
+            || CASE WHEN a.attnotnull THEN ' NOT NULL' ELSE '' END
+            || coalesce(' DEFAULT ' || pg_get_expr(d.adbin, d.adrelid), '')
+        FROM pg_attribute a
+        JOIN pg_class c ON c.oid = a.attrelid
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        LEFT JOIN pg_attrdef d ON d.adrelid = a.attrelid AND d.adnum = a.attnum
+        WHERE n.nspname = :schema AND c.relkind IN ('r', 'p') AND a.attnum > 0 AND NOT a.attisdropped
+    """,
+    "restricciones": """
+        SELECT c.relname || ' ' || k.conname || ' ' || pg_get_constraintdef(k.oid)
+        FROM pg_constraint k
+        JOIN pg_class c ON c.oid = k.conrelid
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = :schema
+    """,
+    "índices": """
+        SELECT pg_get_indexdef(i.indexrelid)
+        FROM pg_index i
+        JOIN pg_class c ON c.oid = i.indexrelid
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = :schema
+    """,
+    "triggers": """
+        SELECT pg_get_triggerdef(t.oid)
+        FROM pg_trigger t
+        JOIN pg_class c ON c.oid = t.tgrelid
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = :schema AND NOT t.tgisinternal
+    """,
+    # El cuerpo sin diferencias de espacios ni sangría
+    "funciones": """
+        SELECT p.proname || '(' || pg_get_function_arguments(p.oid) || ') '
+            || pg_get_function_result(p.oid) || ' ' || regexp_replace(trim(p.prosrc), '\\s+', ' ', 'g')
+        FROM pg_proc p
+        JOIN pg_namespace n ON n.oid = p.pronamespace
+        WHERE n.nspname = :schema
+    """,
+}
+
+
+def _load_models():
+    """
+    Importa todos los modelos (y con ellos su DDL) y devuelve su metadata.
+    """
+    from ..database import Base
+    from .. import models
+
+    for module_info in pkgutil.iter_modules(models.__path__):
+        importlib.import_module(f"{models.__name__}.{module_info.name}")
+    return Base.metadata
+
+
+async def _apply_migrations(conn: AsyncConnection) -> None:
+    for migration in MIGRATIONS:
+        await migration.upgrade(conn)
+
+
+async def _create_models(conn: AsyncConnection) -> None:
+    await conn.run_sync(_load_models().create_all)
+
+
+async def _catalog(conn: AsyncConnection, schema: str) -> Dict[str, Set[str]]:
+    catalog = {}
+    for kind, query in CATALOG_QUERIES.items():
+        result = await conn.execute(text(query), {"schema": schema})
+        catalog[kind] = {row.replace(f"{schema}.", "") for row in result.scalars()}
+    return catalog
+
+
+async def compare_with_models(engine: AsyncEngine) -> List[str]:
+    """
+    Diferencias entre el esquema de las migraciones y el de los modelos,
+    una por línea ("-" solo en las migraciones, "+" solo en los modelos).
+    Lista vacía si coinciden.
+    """
+    catalogs = []
+    async with engine.connect() as conn:
+        transaction = await conn.begin()
+        try:
+            await conn.execute(text("SET LOCAL statement_timeout = 0"))
+            for schema, build in ((MIGRATIONS_SCHEMA, _apply_migrations), (MODELS_SCHEMA, _create_models)):
+                await conn.exec_driver_sql(f"CREATE SCHEMA {schema}")
+                # Con el esquema como único del search_path los nombres salen sin calificar
+                await conn.exec_driver_sql(f"SET LOCAL search_path = {schema}")
+                await build(conn)
+                catalogs.append(await _catalog(conn, schema))
+        finally:
+            await transaction.rollback()
+
+    migrated, modeled = catalogs
+    differences = []
+    for kind in CATALOG_QUERIES:
+        differences += [f"{kind}: - {item}" for item in sorted(migrated[kind] - modeled[kind])]
+        differences += [f"{kind}: + {item}" for item in sorted(modeled[kind] - migrated[kind])]
+    return differences
@@ -0,0 +1,83 @@
+"""
+Esquema inicial (el que creaba create_all antes de las migraciones). Usa
+IF NOT EXISTS para adoptar las bases de datos creadas así.
+"""
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from . import execute_all
+
+DESCRIPTION = "Esquema inicial: localizaciones, dispositivos, puertos e historial"
+
+UPGRADE = [
+    """
+    CREATE TABLE IF NOT EXISTS locations (
+        id serial PRIMARY KEY,
+        name varchar NOT NULL CONSTRAINT locations_name_key UNIQUE,
+        description varchar
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_locations_id ON locations (id)",
+    """
+    CREATE TABLE IF NOT EXISTS devices (
+        id serial PRIMARY KEY,
+        ip varchar,
+        status varchar,
+        description varchar,
+        protocol varchar,
+        location_id integer REFERENCES locations (id)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_devices_id ON devices (id)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS ix_devices_ip ON devices (ip)",
+    """
+    CREATE TABLE IF NOT EXISTS ports (
+        id serial PRIMARY KEY,
+        port_number integer NOT NULL,
+        description varchar,
+        device_id integer NOT NULL REFERENCES devices (id) ON DELETE CASCADE
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_ports_id ON ports (id)",
+    """
+    CREATE TABLE IF NOT EXISTS assignment_history (
+        id serial PRIMARY KEY,
+        device_id integer NOT NULL REFERENCES devices (id) ON DELETE CASCADE,
+        action varchar NOT NULL,
+        old_status varchar,
+        new_status varchar,
+        old_location_id integer REFERENCES locations (id) ON DELETE SET NULL,
+        new_location_id integer REFERENCES locations (id) ON DELETE SET NULL,
+        "timestamp" timestamp with time zone DEFAULT now()
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_assignment_history_id ON assignment_history (id)",
+    """
+    CREATE TABLE IF NOT EXISTS location_history (
+        id serial PRIMARY KEY,
+        location_id integer NOT NULL REFERENCES locations (id) ON DELETE CASCADE,
+        action varchar NOT NULL,
+        old_name varchar,
+        new_name varchar,
+        old_description varchar,
+        new_description varchar,
+        "timestamp" timestamp with time zone DEFAULT now()
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_location_history_id ON location_history (id)",
+]
+
+DOWNGRADE = [
+    "DROP TABLE location_history",
+    "DROP TABLE assignment_history",
+    "DROP TABLE ports",
+    "DROP TABLE devices",
+    "DROP TABLE locations",
+]
+
+
+async def upgrade(conn: AsyncConnection) -> None:
+    await execute_all(conn, UPGRADE)
+
+
+async def downgrade(conn: AsyncConnection) -> None:
+    await execute_all(conn, DOWNGRADE)
@@ -0,0 +1,29 @@
+"""
+Índices compuestos de los listados paginados por keyset: filtro + id en
+devices y (timestamp, id) con cada filtro en assignment_history.
+"""
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from . import execute_all
+
+DESCRIPTION = "Índices de los listados de dispositivos e historial"
+
+INDEXES = {
+    "ix_devices_status_id": "devices (status, id)",
+    "ix_devices_protocol_id": "devices (protocol, id)",
+    "ix_devices_location_id_id": "devices (location_id, id)",
+    # Búsquedas por prefijo (LIKE 'x%') con cualquier collation; v0008 lo sustituye
+    "ix_devices_ip_pattern": "devices (ip text_pattern_ops)",
+    "ix_assignment_history_timestamp_id": 'assignment_history ("timestamp", id)',
+    "ix_assignment_history_device_timestamp": 'assignment_history (device_id, "timestamp", id)',
+    "ix_assignment_history_old_location_timestamp": 'assignment_history (old_location_id, "timestamp", id)',
+    "ix_assignment_history_new_location_timestamp": 'assignment_history (new_location_id, "timestamp", id)',
+}
+
+
+async def upgrade(conn: AsyncConnection) -> None:
+    await execute_all(conn, [f"CREATE INDEX {name} ON {columns}" for name, columns in INDEXES.items()])
+
+
+async def downgrade(conn: AsyncConnection) -> None:
+    await execute_all(conn, [f"DROP INDEX {name}" for name in INDEXES])
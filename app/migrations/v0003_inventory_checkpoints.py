@@ -0,0 +1,42 @@
+"""
+Checkpoints del inventario para las consultas "as_of".
+"""
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from . import execute_all
+
+DESCRIPTION = "Checkpoints del inventario (inventory_checkpoints, device_snapshots)"
+
+UPGRADE = [
+    """
+    CREATE TABLE inventory_checkpoints (
+        id serial PRIMARY KEY,
+        taken_at timestamp with time zone NOT NULL DEFAULT now()
+    )
+    """,
+    "CREATE INDEX ix_inventory_checkpoints_id ON inventory_checkpoints (id)",
+    "CREATE INDEX ix_inventory_checkpoints_taken_at ON inventory_checkpoints (taken_at)",
+    """
+    CREATE TABLE device_snapshots (
+        checkpoint_id integer NOT NULL REFERENCES inventory_checkpoints (id) ON DELETE CASCADE,
+        device_id integer NOT NULL,
+        status varchar,
+        location_id integer,
+        PRIMARY KEY (checkpoint_id, device_id)
+    )
+    """,
+    "CREATE INDEX ix_device_snapshots_checkpoint_location ON device_snapshots (checkpoint_id, location_id)",
+]
+
+DOWNGRADE = [
+    "DROP TABLE device_snapshots",
+    "DROP TABLE inventory_checkpoints",
+]
+
+
+async def upgrade(conn: AsyncConnection) -> None:
+    await execute_all(conn, UPGRADE)
+
+
+async def downgrade(conn: AsyncConnection) -> None:
+    await execute_all(conn, DOWNGRADE)
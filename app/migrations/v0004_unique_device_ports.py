@@ -0,0 +1,29 @@
+"""
+Un número de puerto solo una vez por dispositivo. Antes de crear la
+restricción se eliminan los duplicados, conservando el de menor id.
+"""
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from . import execute_all
+
+DESCRIPTION = "Puertos únicos por dispositivo (uq_ports_device_port)"
+
+UPGRADE = [
+    """
+    DELETE FROM ports p USING ports older
+    WHERE older.device_id = p.device_id AND older.port_number = p.port_number AND older.id < p.id
+    """,
+    "ALTER TABLE ports ADD CONSTRAINT uq_ports_device_port UNIQUE (device_id, port_number)",
+]
+
+DOWNGRADE = [
+    "ALTER TABLE ports DROP CONSTRAINT uq_ports_device_port",
+]
+
+
+async def upgrade(conn: AsyncConnection) -> None:
+    await execute_all(conn, UPGRADE)
+
+
+async def downgrade(conn: AsyncConnection) -> None:
+    await execute_all(conn, DOWNGRADE)
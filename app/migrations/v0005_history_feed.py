@@ -0,0 +1,43 @@
+"""
+Triggers que publican cada fila nueva de historial en el canal history_feed
+(NOTIFY) para el SSE de /history/stream.
+"""
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from . import execute_all
+
+DESCRIPTION = "Triggers NOTIFY del feed de historial"
+
+FEED_FUNCTION = """
+CREATE OR REPLACE FUNCTION notify_history_feed() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify(
+        'history_feed',
+        json_build_object('kind', TG_ARGV[0], 'row', row_to_json(NEW))::text
+    );
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+"""
+
+UPGRADE = [
+    FEED_FUNCTION,
+    "CREATE TRIGGER assignment_history_feed AFTER INSERT ON assignment_history "
+    "FOR EACH ROW EXECUTE FUNCTION notify_history_feed('assignment')",
+    "CREATE TRIGGER location_history_feed AFTER INSERT ON location_history "
+    "FOR EACH ROW EXECUTE FUNCTION notify_history_feed('location')",
+]
+
+DOWNGRADE = [
+    "DROP TRIGGER location_history_feed ON location_history",
+    "DROP TRIGGER assignment_history_feed ON assignment_history",
+    "DROP FUNCTION notify_history_feed()",
+]
+
+
+async def upgrade(conn: AsyncConnection) -> None:
+    await execute_all(conn, UPGRADE)
+
+
+async def downgrade(conn: AsyncConnection) -> None:
+    await execute_all(conn, DOWNGRADE)
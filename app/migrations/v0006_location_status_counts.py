@@ -0,0 +1,89 @@
+"""
+Contadores de dispositivos por (localización, status) para /stats,
+mantenidos por triggers por sentencia sobre devices y rellenados aquí con el
+estado actual.
+"""
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from . import execute_all
+
+DESCRIPTION = "Contadores location_status_counts y sus triggers"
+
+COUNTS_FUNCTION = """
+CREATE OR REPLACE FUNCTION maintain_location_status_counts() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO location_status_counts AS c (location_id, status, device_count)
+        SELECT location_id, status, count(*) FROM new_rows
+        GROUP BY location_id, status
+        ORDER BY location_id, status
+        ON CONFLICT (location_id, status)
+        DO UPDATE SET device_count = c.device_count + EXCLUDED.device_count;
+    ELSIF TG_OP = 'DELETE' THEN
+        INSERT INTO location_status_counts AS c (location_id, status, device_count)
+        SELECT location_id, status, -count(*) FROM old_rows
+        GROUP BY location_id, status
+        ORDER BY location_id, status
+        ON CONFLICT (location_id, status)
+        DO UPDATE SET device_count = c.device_count + EXCLUDED.device_count;
+    ELSE
+        INSERT INTO location_status_counts AS c (location_id, status, device_count)
+        SELECT location_id, status, sum(delta) FROM (
+            SELECT location_id, status, 1 AS delta FROM new_rows
+            UNION ALL
+            SELECT location_id, status, -1 FROM old_rows
+        ) changes
+        GROUP BY location_id, status
+        HAVING sum(delta) <> 0
+        ORDER BY location_id, status
+        ON CONFLICT (location_id, status)
+        DO UPDATE SET device_count = c.device_count + EXCLUDED.device_count;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+"""
+
+TRANSITIONS = {
+    "insert": "AFTER INSERT ON devices REFERENCING NEW TABLE AS new_rows",
+    "update": "AFTER UPDATE ON devices REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows",
+    "delete": "AFTER DELETE ON devices REFERENCING OLD TABLE AS old_rows",
+}
+
+UPGRADE = [
+    """
+    CREATE TABLE location_status_counts (
+        id serial PRIMARY KEY,
+        location_id integer,
+        status varchar,
+        device_count bigint NOT NULL,
+        CONSTRAINT uq_location_status_counts UNIQUE NULLS NOT DISTINCT (location_id, status)
+    )
+    """,
+    COUNTS_FUNCTION,
+    *[
+        f"CREATE TRIGGER devices_counts_{operation} {event} FOR EACH STATEMENT "
+        f"EXECUTE FUNCTION maintain_location_status_counts()"
+        for operation, event in TRANSITIONS.items()
+    ],
+    # Bloquea devices mientras se rellena: ningún cambio queda sin contar
+    "LOCK TABLE devices IN SHARE MODE",
+    """
+    INSERT INTO location_status_counts (location_id, status, device_count)
+    SELECT location_id, status, count(*) FROM devices GROUP BY location_id, status
+    """,
+]
+
+DOWNGRADE = [
+    *[f"DROP TRIGGER devices_counts_{operation} ON devices" for operation in TRANSITIONS],
+    "DROP FUNCTION maintain_location_status_counts()",
+    "DROP TABLE location_status_counts",
+]
+
+
+async def upgrade(conn: AsyncConnection) -> None:
+    await execute_all(conn, UPGRADE)
+
+
+async def downgrade(conn: AsyncConnection) -> None:
+    await execute_all(conn, DOWNGRADE)
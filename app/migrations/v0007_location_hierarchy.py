@@ -0,0 +1,46 @@
+"""
+Jerarquía de localizaciones: parent_id y la tabla de cierre location_closure,
+rellenada desde parent_id (al migrar, todas las localizaciones son raíces).
+"""
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from . import execute_all
+
+DESCRIPTION = "Jerarquía de localizaciones (parent_id, location_closure)"
+
+UPGRADE = [
+    "ALTER TABLE locations ADD COLUMN parent_id integer REFERENCES locations (id)",
+    "CREATE INDEX ix_locations_parent_id ON locations (parent_id)",
+    """
+    CREATE TABLE location_closure (
+        ancestor_id integer NOT NULL REFERENCES locations (id) ON DELETE CASCADE,
+        descendant_id integer NOT NULL REFERENCES locations (id) ON DELETE CASCADE,
+        depth integer NOT NULL,
+        PRIMARY KEY (ancestor_id, descendant_id)
+    )
+    """,
+    "CREATE INDEX ix_location_closure_descendant_ancestor ON location_closure (descendant_id, ancestor_id)",
+    """
+    INSERT INTO location_closure (ancestor_id, descendant_id, depth)
+    WITH RECURSIVE tree (ancestor_id, descendant_id, depth) AS (
+        SELECT id, id, 0 FROM locations
+        UNION ALL
+        SELECT tree.ancestor_id, child.id, tree.depth + 1
+        FROM tree JOIN locations child ON child.parent_id = tree.descendant_id
+    )
+    SELECT ancestor_id, descendant_id, depth FROM tree
+    """,
+]
+
+DOWNGRADE = [
+    "DROP TABLE location_closure",
+    "ALTER TABLE locations DROP COLUMN parent_id",
+]
+
+
+async def upgrade(conn: AsyncConnection) -> None:
+    await execute_all(conn, UPGRADE)
+
+
+async def downgrade(conn: AsyncConnection) -> None:
+    await execute_all(conn, DOWNGRADE)
@@ -0,0 +1,33 @@
+"""
+devices.ip pasa de varchar a inet, con los índices de los filtros por red
+(GiST) y por prefijo (host(ip) text_pattern_ops). Si alguna IP guardada no
+es válida, el cast falla con ese valor y la migración no cambia nada.
+"""
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from . import execute_all
+
+DESCRIPTION = "IPs de dispositivos como inet, con índices por red y prefijo"
+
+UPGRADE = [
+    # text_pattern_ops no admite inet: lo reemplaza el índice sobre host(ip)
+    "DROP INDEX IF EXISTS ix_devices_ip_pattern",
+    "ALTER TABLE devices ALTER COLUMN ip TYPE inet USING CAST(ip AS inet)",
+    "CREATE INDEX ix_devices_ip_gist ON devices USING gist (ip inet_ops)",
+    "CREATE INDEX ix_devices_ip_host_pattern ON devices (host(ip) text_pattern_ops)",
+]
+
+DOWNGRADE = [
+    "DROP INDEX ix_devices_ip_host_pattern",
+    "DROP INDEX ix_devices_ip_gist",
+    "ALTER TABLE devices ALTER COLUMN ip TYPE varchar USING host(ip)",
+    "CREATE INDEX ix_devices_ip_pattern ON devices (ip text_pattern_ops)",
+]
+
+
+async def upgrade(conn: AsyncConnection) -> None:
+    await execute_all(conn, UPGRADE)
+
+
+async def downgrade(conn: AsyncConnection) -> None:
+    await execute_all(conn, DOWNGRADE)
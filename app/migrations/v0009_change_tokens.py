@@ -0,0 +1,138 @@
+"""
+Tokens de cambio para los ETag: change_token en devices y locations (de la
+secuencia change_token_seq) y contadores por ámbito en change_tokens,
+incrementados al confirmar cada transacción. Ver models/triggers.py.
+"""
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from . import execute_all
+
+DESCRIPTION = "Tokens de cambio (change_token, change_tokens) y sus triggers"
+
+NEXT_TOKEN_FUNCTION = """
+CREATE OR REPLACE FUNCTION next_change_token(scope text) RETURNS bigint AS $$
+DECLARE
+    scope_setting text := 'inventario.change_token_' || scope;
+    token_value bigint := nullif(current_setting(scope_setting, true), '')::bigint;
+BEGIN
+    IF token_value IS NULL THEN
+        token_value := nullif(current_setting('inventario.change_token_global', true), '')::bigint;
+        IF token_value IS NULL THEN
+            UPDATE change_tokens SET token = token + 1, changed_at = clock_timestamp()
+            WHERE change_tokens.scope = 'global'
+            RETURNING token INTO token_value;
+            PERFORM set_config('inventario.change_token_global', token_value::text, true);
+        END IF;
+        UPDATE change_tokens SET token = token_value, changed_at = clock_timestamp()
+        WHERE change_tokens.scope = next_change_token.scope;
+        PERFORM set_config(scope_setting, token_value::text, true);
+    END IF;
+    RETURN token_value;
+END;
+$$ LANGUAGE plpgsql
+"""
+
+ROW_TOKEN_FUNCTION = """
+CREATE OR REPLACE FUNCTION set_row_change_token() RETURNS trigger AS $$
+BEGIN
+    NEW.change_token := nextval('change_token_seq');
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql
+"""
+
+SCOPE_TOKEN_FUNCTION = """
+CREATE OR REPLACE FUNCTION bump_change_token() RETURNS trigger AS $$
+BEGIN
+    PERFORM next_change_token(TG_ARGV[0]);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+"""
+
+PORT_TOKEN_FUNCTION = """
+CREATE OR REPLACE FUNCTION touch_port_devices() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        UPDATE devices SET change_token = nextval('change_token_seq')
+        WHERE id IN (SELECT device_id FROM new_rows);
+    ELSIF TG_OP = 'DELETE' THEN
+        UPDATE devices SET change_token = nextval('change_token_seq')
+        WHERE id IN (SELECT device_id FROM old_rows);
+    ELSE
+        UPDATE devices SET change_token = nextval('change_token_seq')
+        WHERE id IN (SELECT device_id FROM new_rows UNION SELECT device_id FROM old_rows);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+"""
+
+# Tabla -> ámbito de su contador
+SCOPES = {"devices": "devices", "locations": "locations"}
+
+PORT_TRANSITIONS = {
+    "insert": "AFTER INSERT ON ports REFERENCING NEW TABLE AS new_rows",
+    "update": "AFTER UPDATE ON ports REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows",
+    "delete": "AFTER DELETE ON ports REFERENCING OLD TABLE AS old_rows",
+}
+
+UPGRADE = [
+    "CREATE SEQUENCE IF NOT EXISTS change_token_seq",
+    """
+    CREATE TABLE change_tokens (
+        scope varchar PRIMARY KEY,
+        token bigint NOT NULL,
+        changed_at timestamp with time zone NOT NULL DEFAULT now()
+    )
+    """,
+    "INSERT INTO change_tokens (scope, token) VALUES ('global', 0), ('devices', 0), ('locations', 0)",
+    NEXT_TOKEN_FUNCTION,
+    ROW_TOKEN_FUNCTION,
+    SCOPE_TOKEN_FUNCTION,
+    PORT_TOKEN_FUNCTION,
+    *[
+        statement
+        for table, scope in SCOPES.items()
+        for statement in (
+            f"ALTER TABLE {table} ADD COLUMN change_token bigint NOT NULL DEFAULT 0",
+            f"CREATE TRIGGER {table}_change_token BEFORE INSERT OR UPDATE ON {table} "
+            f"FOR EACH ROW EXECUTE FUNCTION set_row_change_token()",
+            f"CREATE CONSTRAINT TRIGGER {table}_change_token_commit "
+            f"AFTER INSERT OR UPDATE OR DELETE ON {table} DEFERRABLE INITIALLY DEFERRED "
+            f"FOR EACH ROW EXECUTE FUNCTION bump_change_token('{scope}')",
+        )
+    ],
+    *[
+        f"CREATE TRIGGER ports_change_token_{operation} {event} FOR EACH STATEMENT "
+        f"EXECUTE FUNCTION touch_port_devices()"
+        for operation, event in PORT_TRANSITIONS.items()
+    ],
+]
+
+DOWNGRADE = [
+    *[f"DROP TRIGGER ports_change_token_{operation} ON ports" for operation in PORT_TRANSITIONS],
+    *[
+        statement
+        for table in SCOPES
+        for statement in (
+            f"DROP TRIGGER {table}_change_token_commit ON {table}",
+            f"DROP TRIGGER {table}_change_token ON {table}",
+            f"ALTER TABLE {table} DROP COLUMN change_token",
+        )
+    ],
+    "DROP FUNCTION touch_port_devices()",
+    "DROP FUNCTION bump_change_token()",
+    "DROP FUNCTION set_row_change_token()",
+    "DROP FUNCTION next_change_token(text)",
+    "DROP TABLE change_tokens",
+    "DROP SEQUENCE change_token_seq",
+]
+
+
+async def upgrade(conn: AsyncConnection) -> None:
+    await execute_all(conn, UPGRADE)
+
+
+async def downgrade(conn: AsyncConnection) -> None:
+    await execute_all(conn, DOWNGRADE)
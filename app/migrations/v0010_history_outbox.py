@@ -0,0 +1,32 @@
+"""
+Outbox del historial (AUDIT_OUTBOX): sin más índices que la clave primaria.
+"""
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from . import execute_all
+
+DESCRIPTION = "Outbox del historial (history_outbox)"
+
+UPGRADE = [
+    """
+    CREATE TABLE history_outbox (
+        id bigserial PRIMARY KEY,
+        target varchar NOT NULL,
+        payload jsonb NOT NULL,
+        created_at timestamp with time zone NOT NULL DEFAULT now()
+    )
+    """,
+]
+
+# El historial pendiente se mueve antes de deshacer (POST /internal/audit/flush)
+DOWNGRADE = [
+    "DROP TABLE history_outbox",
+]
+
+
+async def upgrade(conn: AsyncConnection) -> None:
+    await execute_all(conn, UPGRADE)
+
+
+async def downgrade(conn: AsyncConnection) -> None:
+    await execute_all(conn, DOWNGRADE)
@@ -0,0 +1,177 @@
+"""
+assignment_history y location_history pasan a estar particionadas por mes
+(RANGE sobre timestamp, meses en UTC), con clave primaria (id, timestamp) y
+una partición DEFAULT. Cada tabla se reconstruye: la antigua se renombra, se
+crea la particionada con las particiones de los meses que tienen filas, se
+copian las filas y se elimina la antigua. Las particiones futuras las crea
+HistoryMaintenanceService. También añade el resumen diario
+(device_history_daily) y los checkpoints base.
+"""
+from datetime import date
+from typing import Dict, List
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from . import execute_all
+
+DESCRIPTION = "Historial particionado por mes, resumen diario y checkpoints base"
+
+# Columnas entre id y timestamp. Las FK llevan nombre explícito porque la
+# tabla antigua aún tiene los nombres por defecto cuando se crea la nueva
+TABLES: Dict[str, Dict[str, str]] = {
+    "assignment_history": {
+        "columns": """
+            device_id integer NOT NULL
+                CONSTRAINT assignment_history_device_id_fkey REFERENCES devices (id) ON DELETE CASCADE,
+            action varchar NOT NULL,
+            old_status varchar,
+            new_status varchar,
+            old_location_id integer
+                CONSTRAINT assignment_history_old_location_id_fkey REFERENCES locations (id) ON DELETE SET NULL,
+            new_location_id integer
+                CONSTRAINT assignment_history_new_location_id_fkey REFERENCES locations (id) ON DELETE SET NULL,
+        """,
+        "names": "device_id, action, old_status, new_status, old_location_id, new_location_id",
+        "kind": "assignment",
+    },
+    "location_history": {
+        "columns": """
+            location_id integer NOT NULL
+                CONSTRAINT location_history_location_id_fkey REFERENCES locations (id) ON DELETE CASCADE,
+            action varchar NOT NULL,
+            old_name varchar,
+            new_name varchar,
+            old_description varchar,
+            new_description varchar,
+        """,
+        "names": "location_id, action, old_name, new_name, old_description, new_description",
+        "kind": "location",
+    },
+}
+
+# Índices secundarios de cada tabla (nombre -> columnas)
+INDEXES: Dict[str, Dict[str, str]] = {
+    "assignment_history": {
+        "ix_assignment_history_id": "(id)",
+        "ix_assignment_history_timestamp_id": '("timestamp", id)',
+        "ix_assignment_history_device_timestamp": '(device_id, "timestamp", id)',
+        "ix_assignment_history_old_location_timestamp": '(old_location_id, "timestamp", id)',
+        "ix_assignment_history_new_location_timestamp": '(new_location_id, "timestamp", id)',
+    },
+    "location_history": {
+        "ix_location_history_id": "(id)",
+    },
+}
+
+EXTRA_UPGRADE = [
+    """
+    CREATE TABLE device_history_daily (
+        device_id integer NOT NULL REFERENCES devices (id) ON DELETE CASCADE,
+        day date NOT NULL,
+        changes integer NOT NULL,
+        status_changes integer NOT NULL,
+        location_changes integer NOT NULL,
+        last_status varchar,
+        last_location_id integer,
+        PRIMARY KEY (device_id, day)
+    )
+    """,
+    "ALTER TABLE inventory_checkpoints ADD COLUMN base boolean NOT NULL DEFAULT false",
+]
+
+EXTRA_DOWNGRADE = [
+    "DELETE FROM inventory_checkpoints WHERE base",
+    "ALTER TABLE inventory_checkpoints DROP COLUMN base",
+    "DROP TABLE device_history_daily",
+]
+
+
+def _next_month(month: date) -> date:
+    return month.replace(year=month.year + month.month // 12, month=month.month % 12 + 1)
+
+
+def _retire(table: str) -> List[str]:
+    """
+    Renombra la tabla actual y libera los nombres de sus índices.
+    """
+    return [
+        f"DROP TRIGGER {table}_feed ON {table}",
+        f"ALTER TABLE {table} RENAME TO {table}_old",
+        f"ALTER INDEX {table}_pkey RENAME TO {table}_old_pkey",
+        *[f"DROP INDEX {name}" for name in INDEXES[table]],
+    ]
+
+
+def _finish(table: str) -> List[str]:
+    """
+    Índices y trigger del feed (después de copiar, para no notificar cada fila
+    copiada) y eliminación de la tabla antigua, que ya no es dueña de la secuencia.
+    """
+    spec = TABLES[table]
+    return [
+        *[f"CREATE INDEX {name} ON {table} {columns}" for name, columns in INDEXES[table].items()],
+        f"ALTER SEQUENCE {table}_id_seq OWNED BY {table}.id",
+        f"DROP TABLE {table}_old",
+        f"CREATE TRIGGER {table}_feed AFTER INSERT ON {table} "
+        f"FOR EACH ROW EXECUTE FUNCTION notify_history_feed('{spec['kind']}')",
+    ]
+
+
+async def upgrade(conn: AsyncConnection) -> None:
+    for table, spec in TABLES.items():
+        await execute_all(conn, _retire(table))
+        await execute_all(conn, [
+            f"""
+            CREATE TABLE {table} (
+                id integer NOT NULL DEFAULT nextval('{table}_id_seq'),
+                {spec['columns']}
+                "timestamp" timestamp with time zone NOT NULL DEFAULT now(),
+                PRIMARY KEY (id, "timestamp")
+            ) PARTITION BY RANGE ("timestamp")
+            """,
+            f"CREATE TABLE {table}_default PARTITION OF {table} DEFAULT",
+        ])
+
+        # Una partición por cada mes con filas, para copiarlas ya en su sitio
+        months = await conn.execute(text(
+            f"SELECT DISTINCT CAST(date_trunc('month', \"timestamp\" AT TIME ZONE 'UTC') AS date) "
+            f"FROM {table}_old WHERE \"timestamp\" IS NOT NULL"
+        ))
+        for (month,) in months.all():
+            end = _next_month(month)
+            await conn.exec_driver_sql(
+                f"CREATE TABLE {table}_p{month:%Y%m} PARTITION OF {table} "
+                f"FOR VALUES FROM ('{month.isoformat()} 00:00+00') TO ('{end.isoformat()} 00:00+00')"
+            )
+
+        # Las filas sin timestamp (la columna admitía NULL) van a 1970, a la DEFAULT
+        await conn.exec_driver_sql(
+            f"INSERT INTO {table} (id, {spec['names']}, \"timestamp\") "
+            f"SELECT id, {spec['names']}, coalesce(\"timestamp\", to_timestamp(0)) FROM {table}_old"
+        )
+        await execute_all(conn, _finish(table))
+    await execute_all(conn, EXTRA_UPGRADE)
+
+
+async def downgrade(conn: AsyncConnection) -> None:
+    """
+    Vuelve a tablas sin particionar con las filas de las particiones
+    adjuntas; las separadas o archivadas por la retención no se recuperan.
+    """
+    await execute_all(conn, EXTRA_DOWNGRADE)
+    for table, spec in TABLES.items():
+        await execute_all(conn, _retire(table))
+        # Las particiones tienen su propia clave primaria (<partición>_pkey): no hay conflicto
+        await execute_all(conn, [
+            f"""
+            CREATE TABLE {table} (
+                id integer PRIMARY KEY DEFAULT nextval('{table}_id_seq'),
+                {spec['columns']}
+                "timestamp" timestamp with time zone DEFAULT now()
+            )
+            """,
+            f"INSERT INTO {table} (id, {spec['names']}, \"timestamp\") "
+            f"SELECT id, {spec['names']}, \"timestamp\" FROM {table}_old",
+        ])
+        await execute_all(conn, _finish(table))
@@ -0,0 +1,30 @@
+"""
+replay_from en inventory_checkpoints: desde dónde se aplica el historial
+sobre cada checkpoint. El historial lleva el instante de inicio de su
+transacción, y una transacción abierta al copiar el estado puede confirmar
+después con un timestamp anterior a taken_at. Los checkpoints existentes
+conservan el comportamiento anterior (replay_from = taken_at).
+"""
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from . import execute_all
+
+DESCRIPTION = "Inicio del historial a aplicar sobre cada checkpoint"
+
+UPGRADE = [
+    "ALTER TABLE inventory_checkpoints ADD COLUMN replay_from timestamp with time zone",
+    "UPDATE inventory_checkpoints SET replay_from = taken_at",
+    "ALTER TABLE inventory_checkpoints ALTER COLUMN replay_from SET NOT NULL",
+]
+
+DOWNGRADE = [
+    "ALTER TABLE inventory_checkpoints DROP COLUMN replay_from",
+]
+
+
+async def upgrade(conn: AsyncConnection) -> None:
+    await execute_all(conn, UPGRADE)
+
+
+async def downgrade(conn: AsyncConnection) -> None:
+    await execute_all(conn, DOWNGRADE)
@@ -0,0 +1,109 @@
+"""
+Los contadores de change_tokens se encolan por sentencia en vez de por fila:
+los triggers diferidos de devices y locations (uno por fila modificada) se
+sustituyen por triggers por sentencia que dejan una fila por transacción y
+ámbito en change_token_queue, donde está ahora el trigger diferido.
+Ver models/triggers.py.
+"""
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from . import execute_all
+
+DESCRIPTION = "Tokens de cambio encolados por sentencia (change_token_queue)"
+
+# Tabla -> ámbito de su contador
+SCOPES = {"devices": "devices", "locations": "locations"}
+
+TRANSITIONS = {
+    "insert": "AFTER INSERT ON {table} REFERENCING NEW TABLE AS new_rows",
+    "update": "AFTER UPDATE ON {table} REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows",
+    "delete": "AFTER DELETE ON {table} REFERENCING OLD TABLE AS old_rows",
+}
+
+QUEUE_TOKEN_FUNCTION = """
+CREATE OR REPLACE FUNCTION queue_change_token() RETURNS trigger AS $$
+DECLARE
+    queued_setting text := 'inventario.change_token_queued_' || TG_ARGV[0];
+BEGIN
+    IF coalesce(current_setting(queued_setting, true), '') = '' THEN
+        IF TG_OP = 'DELETE' THEN
+            PERFORM 1 FROM old_rows LIMIT 1;
+        ELSE
+            PERFORM 1 FROM new_rows LIMIT 1;
+        END IF;
+        IF FOUND THEN
+            INSERT INTO change_token_queue (scope) VALUES (TG_ARGV[0]);
+            PERFORM set_config(queued_setting, 'on', true);
+        END IF;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+"""
+
+SCOPE_TOKEN_FUNCTION = """
+CREATE OR REPLACE FUNCTION bump_change_token() RETURNS trigger AS $$
+BEGIN
+    PERFORM next_change_token(NEW.scope);
+    DELETE FROM change_token_queue WHERE id = NEW.id;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+"""
+
+# La de v0009, para deshacer
+ROW_SCOPE_TOKEN_FUNCTION = """
+CREATE OR REPLACE FUNCTION bump_change_token() RETURNS trigger AS $$
+BEGIN
+    PERFORM next_change_token(TG_ARGV[0]);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+"""
+
+UPGRADE = [
+    """
+    CREATE TABLE change_token_queue (
+        id bigserial PRIMARY KEY,
+        scope varchar NOT NULL
+    )
+    """,
+    *[f"DROP TRIGGER {table}_change_token_commit ON {table}" for table in SCOPES],
+    SCOPE_TOKEN_FUNCTION,
+    QUEUE_TOKEN_FUNCTION,
+    "CREATE CONSTRAINT TRIGGER change_token_queue_commit "
+    "AFTER INSERT ON change_token_queue DEFERRABLE INITIALLY DEFERRED "
+    "FOR EACH ROW EXECUTE FUNCTION bump_change_token()",
+    *[
+        f"CREATE TRIGGER {table}_change_token_{operation} {event.format(table=table)} "
+        f"FOR EACH STATEMENT EXECUTE FUNCTION queue_change_token('{scope}')"
+        for table, scope in SCOPES.items()
+        for operation, event in TRANSITIONS.items()
+    ],
+]
+
+DOWNGRADE = [
+    *[
+        f"DROP TRIGGER {table}_change_token_{operation} ON {table}"
+        for table in SCOPES
+        for operation in TRANSITIONS
+    ],
+    "DROP TRIGGER change_token_queue_commit ON change_token_queue",
+    "DROP FUNCTION queue_change_token()",
+    ROW_SCOPE_TOKEN_FUNCTION,
+    *[
+        f"CREATE CONSTRAINT TRIGGER {table}_change_token_commit "
+        f"AFTER INSERT OR UPDATE OR DELETE ON {table} DEFERRABLE INITIALLY DEFERRED "
+        f"FOR EACH ROW EXECUTE FUNCTION bump_change_token('{scope}')"
+        for table, scope in SCOPES.items()
+    ],
+    "DROP TABLE change_token_queue",
+]
+
+
+async def upgrade(conn: AsyncConnection) -> None:
+    await execute_all(conn, UPGRADE)
+
+
+async def downgrade(conn: AsyncConnection) -> None:
+    await execute_all(conn, DOWNGRADE)
@@ -0,0 +1,52 @@
+"""
+El historial deja de tener FK a locations. Con ellas, borrar una localización
+eliminaba su location_history (ON DELETE CASCADE) y ponía a NULL los
+old_location_id/new_location_id de assignment_history (ON DELETE SET NULL):
+la auditoría perdía justo lo que explica la baja. Los ids se conservan como
+columnas normales y pueden apuntar a localizaciones ya eliminadas.
+
+Al deshacer se vuelve a lo anterior, también con las filas: las referencias a
+localizaciones que ya no existen se ponen a NULL y su location_history se
+elimina, como habrían hecho las FK.
+"""
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from . import execute_all
+
+DESCRIPTION = "Historial sin FK a locations"
+
+# Restricción -> (tabla, columna, acción ON DELETE)
+FOREIGN_KEYS = {
+    "assignment_history_old_location_id_fkey": ("assignment_history", "old_location_id", "SET NULL"),
+    "assignment_history_new_location_id_fkey": ("assignment_history", "new_location_id", "SET NULL"),
+    "location_history_location_id_fkey": ("location_history", "location_id", "CASCADE"),
+}
+
+UPGRADE = [
+    f"ALTER TABLE {table} DROP CONSTRAINT {name}"
+    for name, (table, column, action) in FOREIGN_KEYS.items()
+]
+
+DOWNGRADE = [
+    *[
+        f"UPDATE {table} SET {column} = NULL "
+        f"WHERE NOT EXISTS (SELECT 1 FROM locations WHERE locations.id = {column})"
+        for table, column, action in FOREIGN_KEYS.values()
+        if action == "SET NULL"
+    ],
+    "DELETE FROM location_history "
+    "WHERE NOT EXISTS (SELECT 1 FROM locations WHERE locations.id = location_history.location_id)",
+    *[
+        f"ALTER TABLE {table} ADD CONSTRAINT {name} "
+        f"FOREIGN KEY ({column}) REFERENCES locations (id) ON DELETE {action}"
+        for name, (table, column, action) in FOREIGN_KEYS.items()
+    ],
+]
+
+
+async def upgrade(conn: AsyncConnection) -> None:
+    await execute_all(conn, UPGRADE)
+
+
+async def downgrade(conn: AsyncConnection) -> None:
+    await execute_all(conn, DOWNGRADE)
@@ -0,0 +1,54 @@
+"""
+El aviso del feed lleva solo el id de la fila y las columnas por las que
+filtran los suscriptores, no la fila entera: NOTIFY admite como mucho 8000
+bytes y una fila de historial con textos largos hacía fallar la escritura.
+El feed lee las filas por id. Ver models/triggers.py.
+"""
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from . import execute_all
+
+DESCRIPTION = "Aviso del feed de historial con solo las claves de la fila"
+
+FEED_FUNCTION = """
+CREATE OR REPLACE FUNCTION notify_history_feed() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify(
+        'history_feed',
+        json_build_object(
+            'kind', TG_ARGV[0],
+            'row', (
+                SELECT json_object_agg(key, value) FROM json_each(row_to_json(NEW))
+                WHERE key IN ('id', 'timestamp', 'device_id', 'location_id', 'old_location_id', 'new_location_id')
+            )
+        )::text
+    );
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+"""
+
+# La de v0005, para deshacer
+ROW_FEED_FUNCTION = """
+CREATE OR REPLACE FUNCTION notify_history_feed() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify(
+        'history_feed',
+        json_build_object('kind', TG_ARGV[0], 'row', row_to_json(NEW))::text
+    );
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+"""
+
+UPGRADE = [FEED_FUNCTION]
+
+DOWNGRADE = [ROW_FEED_FUNCTION]
+
+
+async def upgrade(conn: AsyncConnection) -> None:
+    await execute_all(conn, UPGRADE)
+
+
+async def downgrade(conn: AsyncConnection) -> None:
+    await execute_all(conn, DOWNGRADE)
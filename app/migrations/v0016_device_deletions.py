@@ -0,0 +1,61 @@
+"""
+device_deletions: cuándo se eliminó cada dispositivo, escrita por un trigger
+por sentencia sobre devices. El historial de un dispositivo se borra con él,
+así que la reconstrucción as_of lo seguía sacando del último checkpoint.
+
+Los dispositivos ya eliminados que están en algún checkpoint se rellenan con
+el taken_at del último que los contiene: se eliminaron después, no se sabe
+cuándo.
+"""
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from . import execute_all
+
+DESCRIPTION = "Registro de dispositivos eliminados para las consultas as_of"
+
+DELETIONS_FUNCTION = """
+CREATE OR REPLACE FUNCTION record_device_deletions() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO device_deletions (device_id, deleted_at)
+    SELECT id, now() FROM old_rows
+    ORDER BY id
+    ON CONFLICT (device_id) DO UPDATE SET deleted_at = EXCLUDED.deleted_at;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+"""
+
+UPGRADE = [
+    """
+    CREATE TABLE device_deletions (
+        device_id integer PRIMARY KEY,
+        deleted_at timestamp with time zone NOT NULL
+    )
+    """,
+    """
+    INSERT INTO device_deletions (device_id, deleted_at)
+    SELECT s.device_id, max(c.taken_at)
+    FROM device_snapshots s
+    JOIN inventory_checkpoints c ON c.id = s.checkpoint_id
+    WHERE NOT EXISTS (SELECT 1 FROM devices d WHERE d.id = s.device_id)
+    GROUP BY s.device_id
+    """,
+    DELETIONS_FUNCTION,
+    "CREATE TRIGGER devices_deletions AFTER DELETE ON devices "
+    "REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT "
+    "EXECUTE FUNCTION record_device_deletions()",
+]
+
+DOWNGRADE = [
+    "DROP TRIGGER devices_deletions ON devices",
+    "DROP FUNCTION record_device_deletions()",
+    "DROP TABLE device_deletions",
+]
+
+
+async def upgrade(conn: AsyncConnection) -> None:
+    await execute_all(conn, UPGRADE)
+
+
+async def downgrade(conn: AsyncConnection) -> None:
+    await execute_all(conn, DOWNGRADE)
@@ -1,13 +1,16 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Index
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 
 from ..database import Base
+from .partitions import monthly_partitions
+from .triggers import history_feed_trigger
 
 class AssignmentHistory(Base):
     __tablename__ = "assignment_history"
 
-    id = Column(Integer, primary_key=True, index=True)
+    # Clave (id, timestamp): la clave de partición debe formar parte de la primaria
+    id = Column(Integer, primary_key=True, autoincrement=True, index=True)
     device_id = Column(Integer, ForeignKey("devices.id", ondelete="CASCADE"), nullable=False)
 
     action = Column(String, nullable=False)  # Ej: CAMBIO DE STATUS, CAMBIO DE LOCALIZACIÓN, ASIGNACIÓN DE LOCALIZACIÓN
@@ -15,10 +18,25 @@ class AssignmentHistory(Base):
     old_status = Column(String, nullable=True)
     new_status = Column(String, nullable=True)
 
-    old_location_id = Column(Integer, ForeignKey("locations.id", ondelete="SET NULL"), nullable=True)
-    new_location_id = Column(Integer, ForeignKey("locations.id", ondelete="SET NULL"), nullable=True)
+    # Sin FK: el historial conserva el id aunque la localización se elimine
+    old_location_id = Column(Integer, nullable=True)
+    new_location_id = Column(Integer, nullable=True)
 
-    timestamp = Column(DateTime(timezone=True), server_default=func.now())
+    timestamp = Column(DateTime(timezone=True), primary_key=True, server_default=func.now())
 
-    # Relaciones opcionales para acceder a datos del dispositivo o ubicación si lo necesitas
-    device = relationship("Device", back_populates="history", lazy="joined")
+    # Índices para las consultas paginadas por (timestamp, id); particionada por mes
+    __table_args__ = (
+        Index("ix_assignment_history_timestamp_id", "timestamp", "id"),
+        Index("ix_assignment_history_device_timestamp", "device_id", "timestamp", "id"),
+        Index("ix_assignment_history_old_location_timestamp", "old_location_id", "timestamp", "id"),
+        Index("ix_assignment_history_new_location_timestamp", "new_location_id", "timestamp", "id"),
+        {"postgresql_partition_by": "RANGE (timestamp)"},
+    )
+
+    # Relaciones opcionales para acceder a datos del dispositivo o ubicación si lo necesitas.
+    # No se cargan nunca implícitamente: usar los perfiles de repositories/load_profiles.py
+    device = relationship("Device", back_populates="history", lazy="raise")
+
+
+monthly_partitions(AssignmentHistory.__table__)
+history_feed_trigger(AssignmentHistory.__table__, "assignment")
@@ -0,0 +1,40 @@
+from sqlalchemy import DDL, BigInteger, Column, DateTime, String, event, func
+from ..database import Base
+from .triggers import change_token_queue_trigger
+
+# Ámbitos con contador; cada uno tiene su fila desde que se crea la tabla.
+# "global" cambia con cualquiera de los demás y fija el orden de los tokens.
+CHANGE_TOKEN_SCOPES = ("global", "devices", "locations")
+
+class ChangeToken(Base):
+    """
+    Contador de cambios por ámbito, actualizado por los triggers de
+    models/triggers.py al confirmar cada transacción que escribe en ese
+    ámbito. Todos los valores salen del contador "global": son comparables.
+    """
+    __tablename__ = "change_tokens"
+
+    scope = Column(String, primary_key=True)
+    token = Column(BigInteger, nullable=False, default=0)
+    changed_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+
+
+event.listen(ChangeToken.__table__, "after_create", DDL(
+    "INSERT INTO change_tokens (scope, token) VALUES "
+    + ", ".join(f"('{scope}', 0)" for scope in CHANGE_TOKEN_SCOPES)
+))
+
+
+class ChangeTokenQueue(Base):
+    """
+    Ámbitos pendientes de incrementar al confirmar la transacción que los
+    encola (una fila por transacción y ámbito). El trigger diferido borra la
+    fila al incrementar el contador: la tabla solo tiene filas sin confirmar.
+    """
+    __tablename__ = "change_token_queue"
+
+    id = Column(BigInteger, primary_key=True)
+    scope = Column(String, nullable=False)
+
+
+change_token_queue_trigger(ChangeTokenQueue.__table__)
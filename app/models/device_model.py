@@ -1,33 +1,54 @@
-from sqlalchemy import Column, Integer, String, ForeignKey
+from sqlalchemy import BigInteger, Column, FetchedValue, Integer, String, ForeignKey, Index, text
+from sqlalchemy.dialects.postgresql import INET
 from sqlalchemy.orm import relationship
 from ..database import Base
+from .triggers import change_token_triggers, device_deletions_trigger, location_status_counts_triggers
 
 class Device(Base):
     __tablename__ = "devices"
 
     id = Column(Integer, primary_key=True, index=True)
-    ip = Column(String, unique=True, index=True)
+    ip = Column(INET, unique=True, index=True)  # Normalizada por DeviceCreate/DeviceUpdate
     status = Column(String)  # Ejemplo: "activo", "inactivo"
     description = Column(String)
     protocol = Column(String)
     location_id = Column(Integer, ForeignKey("locations.id"), nullable=True)
+    # Lo asignan los triggers en cada INSERT/UPDATE del dispositivo o de sus puertos
+    change_token = Column(BigInteger, nullable=False, server_default=text("0"), server_onupdate=FetchedValue())
+
+    # Índices para los filtros del listado paginado (filtro + keyset sobre id)
+    __table_args__ = (
+        Index("ix_devices_status_id", "status", "id"),
+        Index("ix_devices_protocol_id", "protocol", "id"),
+        Index("ix_devices_location_id_id", "location_id", "id"),
+        # Búsquedas por red (ip <<= cidr) y por rango
+        Index("ix_devices_ip_gist", "ip", postgresql_using="gist", postgresql_ops={"ip": "inet_ops"}),
+        # Filtro ip_prefix (host(ip) LIKE 'x%') con cualquier collation
+        Index("ix_devices_ip_host_pattern", text("host(ip) text_pattern_ops")),
+    )
 
     ports = relationship(
         "Port",
         back_populates="device",
         cascade="all, delete-orphan",
-        lazy="selectin"
+        lazy="raise",
+        order_by="Port.id"
     )
 
     location = relationship(
         "Location",
         back_populates="devices",
-        lazy="joined"
+        lazy="raise"
     )
 
     history = relationship(
         "AssignmentHistory",
         back_populates="device",
-        lazy="selectin",
+        lazy="raise",
         cascade="all, delete-orphan"
     )
+
+
+location_status_counts_triggers(Device.__table__)
+device_deletions_trigger(Device.__table__)
+change_token_triggers(Device.__table__, "devices")
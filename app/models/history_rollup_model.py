@@ -0,0 +1,21 @@
+from sqlalchemy import Column, Date, ForeignKey, Integer, String
+from ..database import Base
+
+class DeviceHistoryDaily(Base):
+    """
+    Resumen diario del historial de asignaciones por dispositivo (días en UTC).
+    Se rellena al expirar cada partición mensual y se conserva cuando sus
+    filas ya se han archivado o descartado.
+    """
+    __tablename__ = "device_history_daily"
+
+    device_id = Column(Integer, ForeignKey("devices.id", ondelete="CASCADE"), primary_key=True)
+    day = Column(Date, primary_key=True)
+
+    changes = Column(Integer, nullable=False)
+    status_changes = Column(Integer, nullable=False)
+    location_changes = Column(Integer, nullable=False)
+
+    # Estado al terminar el día; sin FK: la localización puede haberse borrado después
+    last_status = Column(String, nullable=True)
+    last_location_id = Column(Integer, nullable=True)
@@ -1,12 +1,16 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime
+from sqlalchemy import Column, Integer, String, DateTime
 from sqlalchemy.sql import func
 from ..database import Base
+from .partitions import monthly_partitions
+from .triggers import history_feed_trigger
 
 class LocationHistory(Base):
     __tablename__ = "location_history"
 
-    id = Column(Integer, primary_key=True, index=True)
-    location_id = Column(Integer, ForeignKey("locations.id", ondelete="CASCADE"), nullable=False)
+    # Clave (id, timestamp): la clave de partición debe formar parte de la primaria
+    id = Column(Integer, primary_key=True, autoincrement=True, index=True)
+    # Sin FK: el historial de una localización sobrevive a su eliminación
+    location_id = Column(Integer, nullable=False)
 
     action = Column(String, nullable=False)  # Ej: EDICIÓN DE LOCALIZACIÓN
 
@@ -16,4 +20,11 @@ class LocationHistory(Base):
     old_description = Column(String, nullable=True)
     new_description = Column(String, nullable=True)
 
-    timestamp = Column(DateTime(timezone=True), server_default=func.now())
+    timestamp = Column(DateTime(timezone=True), primary_key=True, server_default=func.now())
+
+    # Particionada por mes, como assignment_history
+    __table_args__ = {"postgresql_partition_by": "RANGE (timestamp)"}
+
+
+monthly_partitions(LocationHistory.__table__)
+history_feed_trigger(LocationHistory.__table__, "location")
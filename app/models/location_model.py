@@ -1,6 +1,7 @@
-from sqlalchemy import Column, Integer, String
+from sqlalchemy import BigInteger, Column, FetchedValue, Integer, String, ForeignKey, Index, text
 from sqlalchemy.orm import relationship
 from ..database import Base
+from .triggers import change_token_triggers
 
 class Location(Base):
     __tablename__ = "locations"
@@ -8,26 +9,53 @@ class Location(Base):
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, unique=True, nullable=False)
     description = Column(String, nullable=True)
+    # Jerarquía opcional (región → edificio → planta → rack); None es una raíz.
+    # Las consultas de subárbol usan LocationClosure, no este campo.
+    parent_id = Column(Integer, ForeignKey("locations.id"), nullable=True, index=True)
+    # Lo asignan los triggers en cada INSERT/UPDATE
+    change_token = Column(BigInteger, nullable=False, server_default=text("0"), server_onupdate=FetchedValue())
 
-    # Relación con los dispositivos
+    # Relación con los dispositivos. Borrar una localización nunca borra sus
+    # dispositivos: LocationService.delete los reasigna o desasigna antes.
     devices = relationship(
         "Device",
         back_populates="location",
-        cascade="all, delete",
-        lazy="selectin"
+        lazy="raise",
+        passive_deletes=True
     )
 
-  
+    # El historial no tiene FK a locations y conserva sus ids tras la baja:
+    # relaciones de solo lectura
     assignment_history_old = relationship(
         "AssignmentHistory",
-        foreign_keys="AssignmentHistory.old_location_id",
-        lazy="selectin",
-        cascade="all, delete-orphan"
+        primaryjoin="Location.id == foreign(AssignmentHistory.old_location_id)",
+        lazy="raise",
+        viewonly=True
     )
 
     assignment_history_new = relationship(
         "AssignmentHistory",
-        foreign_keys="AssignmentHistory.new_location_id",
-        lazy="selectin",
-        cascade="all, delete-orphan"
+        primaryjoin="Location.id == foreign(AssignmentHistory.new_location_id)",
+        lazy="raise",
+        viewonly=True
     )
+
+
+class LocationClosure(Base):
+    """
+    Tabla de cierre de la jerarquía: una fila por cada par (antepasado,
+    descendiente), incluida la de cada localización consigo misma (depth 0).
+    El subárbol de X es `WHERE ancestor_id = X`, sin recursión.
+    """
+    __tablename__ = "location_closure"
+
+    ancestor_id = Column(Integer, ForeignKey("locations.id", ondelete="CASCADE"), primary_key=True)
+    descendant_id = Column(Integer, ForeignKey("locations.id", ondelete="CASCADE"), primary_key=True)
+    depth = Column(Integer, nullable=False)
+
+    __table_args__ = (
+        Index("ix_location_closure_descendant_ancestor", "descendant_id", "ancestor_id"),
+    )
+
+
+change_token_triggers(Location.__table__, "locations")
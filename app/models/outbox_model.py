@@ -0,0 +1,18 @@
+from sqlalchemy import BigInteger, Column, DateTime, String
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.sql import func
+from ..database import Base
+
+class HistoryOutbox(Base):
+    """
+    Filas de historial pendientes de mover a su tabla (AUDIT_OUTBOX). Sin más
+    índices que la clave primaria, para que escribir aquí sea barato; la
+    tarea de AuditService las mueve por lotes en orden de id.
+    """
+    __tablename__ = "history_outbox"
+
+    id = Column(BigInteger, primary_key=True)
+    target = Column(String, nullable=False)  # nombre de la tabla de historial
+    payload = Column(JSONB, nullable=False)  # columnas de la fila, sin id ni timestamp
+    # Instante del cambio (inicio de la transacción), igual que el timestamp por defecto del historial
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
@@ -0,0 +1,47 @@
+from datetime import date, datetime, timezone
+from typing import Optional, Tuple
+from sqlalchemy import DDL, Table, event
+
+# Particiones mensuales (meses en UTC): assignment_history_p202601, ...
+PARTITION_SUFFIX = "_p"
+DEFAULT_PARTITION_SUFFIX = "_default"
+
+
+def add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def month_bounds(month: date) -> Tuple[datetime, datetime]:
+    """
+    [inicio, fin) del mes en UTC, los límites de su partición.
+    """
+    start = datetime(month.year, month.month, 1, tzinfo=timezone.utc)
+    end = add_months(month, 1)
+    return start, datetime(end.year, end.month, 1, tzinfo=timezone.utc)
+
+
+def partition_name(table_name: str, month: date) -> str:
+    return f"{table_name}{PARTITION_SUFFIX}{month:%Y%m}"
+
+
+def partition_month(table_name: str, name: str) -> Optional[date]:
+    """
+    Mes de una partición mensual por su nombre; None si no es una de ellas.
+    """
+    suffix = name[len(table_name) + len(PARTITION_SUFFIX):]
+    if not name.startswith(table_name + PARTITION_SUFFIX) or len(suffix) != 6 or not suffix.isdigit():
+        return None
+    return date(int(suffix[:4]), int(suffix[4:]), 1)
+
+
+def monthly_partitions(table: Table) -> None:
+    """
+    La tabla se declara particionada por RANGE (timestamp) en el modelo
+    (postgresql_partition_by); aquí se le crea la partición DEFAULT, que
+    recoge lo que no tenga partición mensual. HistoryMaintenanceService crea
+    las mensuales y reparte lo que haya caído en la DEFAULT.
+    """
+    event.listen(table, "after_create", DDL(
+        f"CREATE TABLE {table.name}{DEFAULT_PARTITION_SUFFIX} PARTITION OF {table.name} DEFAULT"
+    ))
@@ -1,6 +1,7 @@
-from sqlalchemy import Column, Integer, String, ForeignKey
+from sqlalchemy import Column, Integer, String, ForeignKey, UniqueConstraint
 from sqlalchemy.orm import relationship
 from ..database import Base
+from .triggers import port_change_token_triggers
 
 class Port(Base):
     __tablename__ = "ports"
@@ -10,4 +11,11 @@ class Port(Base):
     description = Column(String, nullable=True)
 
     device_id = Column(Integer, ForeignKey("devices.id", ondelete="CASCADE"), nullable=False)
-    device = relationship("Device", back_populates="ports", lazy="selectin")
+    device = relationship("Device", back_populates="ports", lazy="raise")
+
+    __table_args__ = (
+        UniqueConstraint("device_id", "port_number", name="uq_ports_device_port"),
+    )
+
+
+port_change_token_triggers(Port.__table__)
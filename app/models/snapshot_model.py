@@ -0,0 +1,41 @@
+from sqlalchemy import Boolean, Column, Integer, String, ForeignKey, DateTime, Index, text
+from sqlalchemy.sql import func
+from ..database import Base
+
+class InventoryCheckpoint(Base):
+    __tablename__ = "inventory_checkpoints"
+
+    id = Column(Integer, primary_key=True, index=True)
+    taken_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False, index=True)
+    # Inicio de la transacción más antigua abierta al copiar el estado: sus
+    # cambios llevan un timestamp anterior a taken_at y quizá no estén copiados
+    replay_from = Column(DateTime(timezone=True), nullable=False)
+    # Checkpoint base: estado en el límite del historial expirado, no se poda
+    base = Column(Boolean, nullable=False, server_default=text("false"))
+
+
+class DeviceSnapshot(Base):
+    __tablename__ = "device_snapshots"
+
+    checkpoint_id = Column(Integer, ForeignKey("inventory_checkpoints.id", ondelete="CASCADE"), primary_key=True)
+    # Sin FK a devices: el snapshot debe sobrevivir al borrado del dispositivo
+    device_id = Column(Integer, primary_key=True)
+
+    status = Column(String, nullable=True)
+    location_id = Column(Integer, nullable=True)
+
+    __table_args__ = (
+        Index("ix_device_snapshots_checkpoint_location", "checkpoint_id", "location_id"),
+    )
+
+
+class DeviceDeletion(Base):
+    """
+    Cuándo se eliminó cada dispositivo; la escribe un trigger sobre devices
+    (ver models/triggers.py). get_states_as_of descarta los eliminados.
+    """
+    __tablename__ = "device_deletions"
+
+    # Sin FK a devices, como DeviceSnapshot
+    device_id = Column(Integer, primary_key=True, autoincrement=False)
+    deleted_at = Column(DateTime(timezone=True), nullable=False)
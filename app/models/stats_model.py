@@ -0,0 +1,23 @@
+from sqlalchemy import BigInteger, Column, Integer, String, UniqueConstraint
+from ..database import Base
+
+class LocationStatusCount(Base):
+    """
+    Número de dispositivos por (localización, status), mantenido por triggers
+    sobre devices (ver models/triggers.py) y corregido por la reconciliación.
+    """
+    __tablename__ = "location_status_counts"
+
+    id = Column(Integer, primary_key=True)
+    # Sin FK: location_id NULL son los dispositivos sin localización
+    location_id = Column(Integer, nullable=True)
+    status = Column(String, nullable=True)
+    device_count = Column(BigInteger, nullable=False, default=0)
+
+    __table_args__ = (
+        UniqueConstraint(
+            "location_id", "status",
+            name="uq_location_status_counts",
+            postgresql_nulls_not_distinct=True,
+        ),
+    )
@@ -0,0 +1,281 @@
+from sqlalchemy import DDL, Table, event
+
+# Canal de NOTIFY por el que se publica cada fila nueva de historial
+HISTORY_FEED_CHANNEL = "history_feed"
+
+# Columnas que viajan en el aviso: el id para leer la fila y las que filtran
+# los suscriptores. La fila entera no cabe siempre (NOTIFY admite como mucho
+# 8000 bytes y una descripción larga haría fallar la escritura)
+HISTORY_FEED_KEYS = ("id", "timestamp", "device_id", "location_id", "old_location_id", "new_location_id")
+
+_FEED_FUNCTION = DDL(f"""
+CREATE OR REPLACE FUNCTION notify_history_feed() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify(
+        '{HISTORY_FEED_CHANNEL}',
+        json_build_object(
+            'kind', TG_ARGV[0],
+            'row', (
+                SELECT json_object_agg(key, value) FROM json_each(row_to_json(NEW))
+                WHERE key IN ({", ".join(f"'{key}'" for key in HISTORY_FEED_KEYS)})
+            )
+        )::text
+    );
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+""")
+
+
+def history_feed_trigger(table: Table, kind: str) -> None:
+    """
+    Tras crear la tabla, instala un trigger que publica cada INSERT en el canal
+    del feed (solo HISTORY_FEED_KEYS). NOTIFY solo se entrega si la
+    transacción hace commit.
+    """
+    event.listen(table, "after_create", _FEED_FUNCTION)
+    event.listen(table, "after_create", DDL(
+        f"CREATE TRIGGER {table.name}_feed AFTER INSERT ON {table.name} "
+        f"FOR EACH ROW EXECUTE FUNCTION notify_history_feed('{kind}')"
+    ))
+
+
+# Tablas de transición de los triggers por sentencia, por operación
+_TRANSITIONS = {
+    "INSERT": "NEW TABLE AS new_rows",
+    "UPDATE": "OLD TABLE AS old_rows NEW TABLE AS new_rows",
+    "DELETE": "OLD TABLE AS old_rows",
+}
+
+
+# Contadores por (localización, status): triggers por sentencia con tablas de
+# transición, así un UPDATE masivo aplica todos sus cambios en un solo upsert.
+# Orden fijo (ORDER BY) para que dos transacciones no se bloqueen mutuamente.
+_COUNTS_FUNCTION = DDL("""
+CREATE OR REPLACE FUNCTION maintain_location_status_counts() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO location_status_counts AS c (location_id, status, device_count)
+        SELECT location_id, status, count(*) FROM new_rows
+        GROUP BY location_id, status
+        ORDER BY location_id, status
+        ON CONFLICT (location_id, status)
+        DO UPDATE SET device_count = c.device_count + EXCLUDED.device_count;
+    ELSIF TG_OP = 'DELETE' THEN
+        INSERT INTO location_status_counts AS c (location_id, status, device_count)
+        SELECT location_id, status, -count(*) FROM old_rows
+        GROUP BY location_id, status
+        ORDER BY location_id, status
+        ON CONFLICT (location_id, status)
+        DO UPDATE SET device_count = c.device_count + EXCLUDED.device_count;
+    ELSE
+        INSERT INTO location_status_counts AS c (location_id, status, device_count)
+        SELECT location_id, status, sum(delta) FROM (
+            SELECT location_id, status, 1 AS delta FROM new_rows
+            UNION ALL
+            SELECT location_id, status, -1 FROM old_rows
+        ) changes
+        GROUP BY location_id, status
+        HAVING sum(delta) <> 0
+        ORDER BY location_id, status
+        ON CONFLICT (location_id, status)
+        DO UPDATE SET device_count = c.device_count + EXCLUDED.device_count;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+""")
+
+
+def location_status_counts_triggers(table: Table) -> None:
+    """
+    Tras crear `table` (devices), instala los triggers que mantienen
+    location_status_counts. Las tablas existentes necesitan una migración.
+    """
+    event.listen(table, "after_create", _COUNTS_FUNCTION)
+    for operation, referencing in _TRANSITIONS.items():
+        event.listen(table, "after_create", DDL(
+            f"CREATE TRIGGER {table.name}_counts_{operation.lower()} AFTER {operation} ON {table.name} "
+            f"REFERENCING {referencing} FOR EACH STATEMENT "
+            f"EXECUTE FUNCTION maintain_location_status_counts()"
+        ))
+
+
+
+# Bajas de dispositivos. Su historial se borra con ellos (ON DELETE CASCADE):
+# sin esta fila la reconstrucción as_of los seguiría sacando del último
+# checkpoint. Lleva now(), el mismo instante que el historial de la transacción
+_DELETIONS_FUNCTION = DDL("""
+CREATE OR REPLACE FUNCTION record_device_deletions() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO device_deletions (device_id, deleted_at)
+    SELECT id, now() FROM old_rows
+    ORDER BY id
+    ON CONFLICT (device_id) DO UPDATE SET deleted_at = EXCLUDED.deleted_at;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+""")
+
+
+def device_deletions_trigger(table: Table) -> None:
+    """
+    Tras crear `table` (devices), instala el trigger por sentencia que anota
+    cada borrado en device_deletions.
+    """
+    event.listen(table, "after_create", _DELETIONS_FUNCTION)
+    event.listen(table, "after_create", DDL(
+        f"CREATE TRIGGER {table.name}_deletions AFTER DELETE ON {table.name} "
+        f"REFERENCING {_TRANSITIONS['DELETE']} FOR EACH STATEMENT "
+        f"EXECUTE FUNCTION record_device_deletions()"
+    ))
+
+
+# Tokens de cambio (ETag). Dos niveles:
+# - Cada fila de devices y locations lleva change_token, tomado de una secuencia
+#   en cada INSERT/UPDATE. El bloqueo de la fila ordena a quienes la modifican.
+# - change_tokens guarda un contador por ámbito para los listados, que también
+#   cambian con los borrados. Lo incrementa un trigger diferido al hacer commit,
+#   una vez por transacción y ámbito, y siempre después de la fila "global":
+#   los contadores crecen en el orden en que se confirman las transacciones y
+#   el bloqueo solo se mantiene durante el commit.
+#   Los triggers diferidos son por fila, así que no van sobre devices/locations
+#   (un UPDATE de 10.000 filas encolaría 10.000 eventos): un trigger por
+#   sentencia deja, la primera vez en la transacción, una fila por ámbito en
+#   change_token_queue, y el trigger diferido va sobre esa fila.
+_CHANGE_TOKEN_SEQUENCE = DDL("CREATE SEQUENCE IF NOT EXISTS change_token_seq")
+
+_NEXT_TOKEN_FUNCTION = DDL("""
+CREATE OR REPLACE FUNCTION next_change_token(scope text) RETURNS bigint AS $$
+DECLARE
+    scope_setting text := 'inventario.change_token_' || scope;
+    token_value bigint := nullif(current_setting(scope_setting, true), '')::bigint;
+BEGIN
+    IF token_value IS NULL THEN
+        token_value := nullif(current_setting('inventario.change_token_global', true), '')::bigint;
+        IF token_value IS NULL THEN
+            UPDATE change_tokens SET token = token + 1, changed_at = clock_timestamp()
+            WHERE change_tokens.scope = 'global'
+            RETURNING token INTO token_value;
+            PERFORM set_config('inventario.change_token_global', token_value::text, true);
+        END IF;
+        UPDATE change_tokens SET token = token_value, changed_at = clock_timestamp()
+        WHERE change_tokens.scope = next_change_token.scope;
+        PERFORM set_config(scope_setting, token_value::text, true);
+    END IF;
+    RETURN token_value;
+END;
+$$ LANGUAGE plpgsql
+""")
+
+_ROW_TOKEN_FUNCTION = DDL("""
+CREATE OR REPLACE FUNCTION set_row_change_token() RETURNS trigger AS $$
+BEGIN
+    NEW.change_token := nextval('change_token_seq');
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql
+""")
+
+# Por sentencia; la variable de la transacción evita encolar el ámbito dos veces
+# (y vuelve a su valor anterior, igual que la fila, si se deshace un savepoint)
+_QUEUE_TOKEN_FUNCTION = DDL("""
+CREATE OR REPLACE FUNCTION queue_change_token() RETURNS trigger AS $$
+DECLARE
+    queued_setting text := 'inventario.change_token_queued_' || TG_ARGV[0];
+BEGIN
+    IF coalesce(current_setting(queued_setting, true), '') = '' THEN
+        IF TG_OP = 'DELETE' THEN
+            PERFORM 1 FROM old_rows LIMIT 1;
+        ELSE
+            PERFORM 1 FROM new_rows LIMIT 1;
+        END IF;
+        IF FOUND THEN
+            INSERT INTO change_token_queue (scope) VALUES (TG_ARGV[0]);
+            PERFORM set_config(queued_setting, 'on', true);
+        END IF;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+""")
+
+_SCOPE_TOKEN_FUNCTION = DDL("""
+CREATE OR REPLACE FUNCTION bump_change_token() RETURNS trigger AS $$
+BEGIN
+    PERFORM next_change_token(NEW.scope);
+    DELETE FROM change_token_queue WHERE id = NEW.id;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+""")
+
+# Los puertos forman parte de DeviceOut: cambiarlos marca su dispositivo
+_PORT_TOKEN_FUNCTION = DDL("""
+CREATE OR REPLACE FUNCTION touch_port_devices() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        UPDATE devices SET change_token = nextval('change_token_seq')
+        WHERE id IN (SELECT device_id FROM new_rows);
+    ELSIF TG_OP = 'DELETE' THEN
+        UPDATE devices SET change_token = nextval('change_token_seq')
+        WHERE id IN (SELECT device_id FROM old_rows);
+    ELSE
+        UPDATE devices SET change_token = nextval('change_token_seq')
+        WHERE id IN (SELECT device_id FROM new_rows UNION SELECT device_id FROM old_rows);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+""")
+
+
+def change_token_triggers(table: Table, scope: str) -> None:
+    """
+    Tras crear `table`, instala los triggers que dan un change_token nuevo a
+    cada fila insertada o modificada y los que encolan el contador de `scope`
+    para incrementarlo al confirmar cualquier INSERT, UPDATE o DELETE que
+    afecte a alguna fila.
+    """
+    event.listen(table, "after_create", _CHANGE_TOKEN_SEQUENCE)
+    event.listen(table, "after_create", _ROW_TOKEN_FUNCTION)
+    event.listen(table, "after_create", _QUEUE_TOKEN_FUNCTION)
+    event.listen(table, "after_create", DDL(
+        f"CREATE TRIGGER {table.name}_change_token BEFORE INSERT OR UPDATE ON {table.name} "
+        f"FOR EACH ROW EXECUTE FUNCTION set_row_change_token()"
+    ))
+    for operation, referencing in _TRANSITIONS.items():
+        event.listen(table, "after_create", DDL(
+            f"CREATE TRIGGER {table.name}_change_token_{operation.lower()} AFTER {operation} ON {table.name} "
+            f"REFERENCING {referencing} FOR EACH STATEMENT "
+            f"EXECUTE FUNCTION queue_change_token('{scope}')"
+        ))
+
+
+def change_token_queue_trigger(table: Table) -> None:
+    """
+    Tras crear `table` (change_token_queue), instala el trigger diferido que
+    incrementa al hacer commit el contador de cada ámbito encolado.
+    """
+    event.listen(table, "after_create", _NEXT_TOKEN_FUNCTION)
+    event.listen(table, "after_create", _SCOPE_TOKEN_FUNCTION)
+    event.listen(table, "after_create", DDL(
+        f"CREATE CONSTRAINT TRIGGER {table.name}_commit "
+        f"AFTER INSERT ON {table.name} DEFERRABLE INITIALLY DEFERRED "
+        f"FOR EACH ROW EXECUTE FUNCTION bump_change_token()"
+    ))
+
+
+def port_change_token_triggers(table: Table) -> None:
+    """
+    Tras crear `table` (ports), instala los triggers que dan un change_token
+    nuevo a los dispositivos cuyos puertos cambian.
+    """
+    event.listen(table, "after_create", _CHANGE_TOKEN_SEQUENCE)
+    event.listen(table, "after_create", _PORT_TOKEN_FUNCTION)
+    for operation, referencing in _TRANSITIONS.items():
+        event.listen(table, "after_create", DDL(
+            f"CREATE TRIGGER {table.name}_change_token_{operation.lower()} AFTER {operation} ON {table.name} "
+            f"REFERENCING {referencing} FOR EACH STATEMENT "
+            f"EXECUTE FUNCTION touch_port_devices()"
+        ))
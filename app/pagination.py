@@ -0,0 +1,30 @@
+import base64
+import json
+from typing import Any, Dict, Iterable
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 500
+
+
+def encode_cursor(values: Dict[str, Any]) -> str:
+    """
+    Codifica la posición del último elemento devuelto en un cursor opaco.
+    """
+    raw = json.dumps(values, separators=(",", ":"), default=str).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, keys: Iterable[str]) -> Dict[str, Any]:
+    """
+    Decodifica un cursor generado por encode_cursor.
+    Lanza ValueError si el cursor está mal formado o le faltan claves.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except ValueError:
+        raise ValueError("Cursor inválido")
+
+    if not isinstance(values, dict) or any(key not in values for key in keys):
+        raise ValueError("Cursor inválido")
+    return values
@@ -0,0 +1,33 @@
+from typing import List, Optional
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from ..models.change_token_model import ChangeToken
+from ..models.device_model import Device
+from ..models.location_model import Location
+
+class ChangeTokenRepository:
+    @staticmethod
+    async def get_scopes(db: AsyncSession, scopes: List[str]) -> List:
+        """
+        (scope, token, changed_at) de esos ámbitos, por clave primaria.
+        """
+        result = await db.execute(
+            select(ChangeToken.scope, ChangeToken.token, ChangeToken.changed_at)
+            .where(ChangeToken.scope.in_(scopes))
+            .order_by(ChangeToken.scope)
+        )
+        return result.all()
+
+    @staticmethod
+    async def get_device_tokens(db: AsyncSession, device_id: int) -> Optional[tuple]:
+        """
+        (token del dispositivo, token de su localización o None), o None si
+        el dispositivo no existe. DeviceOut incluye la localización.
+        """
+        result = await db.execute(
+            select(Device.change_token, Location.change_token)
+            .outerjoin(Location, Location.id == Device.location_id)
+            .where(Device.id == device_id)
+        )
+        return result.one_or_none()
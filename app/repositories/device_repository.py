@@ -1,9 +1,22 @@
+import json
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from sqlalchemy import Integer, String, any_, bindparam, cast, func, literal, literal_column, or_, text, tuple_, update
+from sqlalchemy.dialects.postgresql import ARRAY, CIDR, INET, insert as pg_insert
+from sqlalchemy.dialects.postgresql.base import PGDialect
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from sqlalchemy.orm import selectinload
 from ..models.device_model import Device
+from ..models.assignment_model import AssignmentHistory
 from ..models.port_model import Port
-from ..schemas.device_schema import DeviceCreate
+from ..models.location_model import Location
+from ..schemas.device_schema import DEVICE_FIELDS, DeviceCreate, normalize_ip, normalize_network
+from ..pagination import DEFAULT_LIMIT
+from .load_profiles import DEVICE_WITH_PORTS
+from .location_repository import LocationRepository
+from .history_repository import HistoryRepository
+
+# Por encima de este número estimado de filas no se hace COUNT(*) exacto
+EXACT_COUNT_THRESHOLD = 10000
 
 class DeviceRepository:
     @staticmethod
@@ -31,8 +44,292 @@ class DeviceRepository:
         return device
 
     @staticmethod
-    async def get_all(db: AsyncSession):
+    def filter_criteria(
+        status: Optional[str] = None,
+        protocol: Optional[str] = None,
+        location_id: Optional[int] = None,
+        ip_prefix: Optional[str] = None,
+        ids: Optional[List[int]] = None,
+        location_subtree: Optional[int] = None,
+        cidr: Optional[str] = None,
+        ip_from: Optional[str] = None,
+        ip_to: Optional[str] = None,
+    ) -> List:
+        """
+        Condiciones WHERE de los filtros de dispositivos. `location_subtree`
+        selecciona la localización y todas sus descendientes; `cidr` las IPs
+        de esa red e `ip_from`/`ip_to` un rango de IPs (extremos incluidos).
+        Lanza ValueError si la red o las IPs no son válidas.
+        """
+        criteria = []
+        if ids is not None:
+            # Un único parámetro array, sea cual sea el número de IDs
+            criteria.append(Device.id == any_(bindparam("device_ids", ids, type_=ARRAY(Integer))))
+        if status is not None:
+            criteria.append(Device.status == status)
+        if protocol is not None:
+            criteria.append(Device.protocol == protocol)
+        if location_id is not None:
+            criteria.append(Device.location_id == location_id)
+        if location_subtree is not None:
+            criteria.append(Device.location_id.in_(LocationRepository.subtree_ids(location_subtree)))
+        if ip_prefix:
+            escaped = ip_prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            criteria.append(func.host(Device.ip).like(escaped + "%", escape="\\"))
+        # Los valores van como texto con CAST: el EXPLAIN de count() los enlaza desde el texto
+        if cidr is not None:
+            network = cast(literal(normalize_network(cidr), String), CIDR)
+            criteria.append(Device.ip.op("<<=")(network))
+        if ip_from is not None:
+            criteria.append(Device.ip >= cast(literal(normalize_ip(ip_from), String), INET))
+        if ip_to is not None:
+            criteria.append(Device.ip <= cast(literal(normalize_ip(ip_to), String), INET))
+        return criteria
+
+    @staticmethod
+    def apply_filters(stmt, **filters):
+        """
+        Añade a la consulta los filtros del listado de dispositivos.
+        """
+        criteria = DeviceRepository.filter_criteria(**filters)
+        return stmt.where(*criteria) if criteria else stmt
+
+    @staticmethod
+    async def get_all(
+        db: AsyncSession,
+        limit: int = DEFAULT_LIMIT,
+        after_id: Optional[int] = None,
+        profile=DEVICE_WITH_PORTS,
+        **filters,
+    ) -> List[Device]:
+        """
+        Devuelve una página de dispositivos ordenada por id (keyset).
+        """
+        stmt = select(Device).options(*profile)
+        stmt = DeviceRepository.apply_filters(stmt, **filters)
+        if after_id is not None:
+            stmt = stmt.where(Device.id > after_id)
+        stmt = stmt.order_by(Device.id).limit(limit)
+
+        result = await db.execute(stmt)
+        return result.scalars().all()
+
+    @staticmethod
+    async def get_page_rows(
+        db: AsyncSession,
+        limit: int = DEFAULT_LIMIT,
+        after_id: Optional[int] = None,
+        fields: Sequence[str] = DEVICE_FIELDS,
+        location: bool = True,
+        **filters,
+    ) -> List:
+        """
+        Como get_all, pero como tuplas sin construir objetos del ORM: solo
+        las columnas `fields` del dispositivo (deben incluir id) y, con
+        `location`, las de su localización (LEFT JOIN).
+        """
+        columns = [getattr(Device, name) for name in fields]
+        if location:
+            columns += [
+                Location.id.label("location_id"),
+                Location.name.label("location_name"),
+                Location.description.label("location_description"),
+                Location.parent_id.label("location_parent_id"),
+            ]
+        stmt = select(*columns)
+        if location:
+            stmt = stmt.outerjoin(Location, Location.id == Device.location_id)
+        stmt = DeviceRepository.apply_filters(stmt, **filters)
+        if after_id is not None:
+            stmt = stmt.where(Device.id > after_id)
+        stmt = stmt.order_by(Device.id).limit(limit)
+
+        result = await db.execute(stmt)
+        return result.all()
+
+    @staticmethod
+    async def get_port_rows(db: AsyncSession, device_ids: List[int]) -> Dict[int, List]:
+        """
+        {device_id: [(port_number, description, id), ...]} en el orden de Device.ports.
+        """
+        ports: Dict[int, List] = {device_id: [] for device_id in device_ids}
+        if not device_ids:
+            return ports
         result = await db.execute(
-            select(Device).options(selectinload(Device.ports))
+            select(Port.device_id, Port.port_number, Port.description, Port.id)
+            .where(Port.device_id == any_(bindparam("device_ids", device_ids, type_=ARRAY(Integer))))
+            .order_by(Port.id)
         )
-        return result.scalars().all()
+        for row in result.all():
+            ports[row.device_id].append(row)
+        return ports
+
+    @staticmethod
+    async def get_by_id(db: AsyncSession, device_id: int, profile=DEVICE_WITH_PORTS) -> Optional[Device]:
+        result = await db.execute(
+            select(Device).where(Device.id == device_id).options(*profile)
+        )
+        return result.scalar_one_or_none()
+
+    @staticmethod
+    async def get_states(db: AsyncSession, **filters) -> List:
+        """
+        Estado actual (device_id, status, location_id) de los dispositivos filtrados.
+        """
+        stmt = select(Device.id.label("device_id"), Device.status, Device.location_id)
+        stmt = DeviceRepository.apply_filters(stmt, **filters).order_by(Device.id)
+        result = await db.execute(stmt)
+        return result.all()
+
+    @staticmethod
+    async def get_probe_targets(db: AsyncSession, statuses: List[str]) -> List:
+        """
+        (id, ip, protocol, status, ports) de los dispositivos con alguno de
+        esos status; `ports` es la lista de números de puerto registrados.
+        """
+        ports = func.array_remove(func.array_agg(Port.port_number), None)
+        stmt = (
+            select(Device.id, Device.ip, Device.protocol, Device.status, ports.label("ports"))
+            .outerjoin(Port, Port.device_id == Device.id)
+            .where(Device.status.in_(statuses))
+            .group_by(Device.id)
+            .order_by(Device.id)
+        )
+        result = await db.execute(stmt)
+        return result.all()
+
+    @staticmethod
+    async def lock_by_ips(db: AsyncSession, ips: List[str]) -> Dict[str, Any]:
+        """
+        Bloquea (FOR UPDATE) y devuelve {ip: (id, ip, status, location_id)}
+        de los dispositivos existentes con esas IPs.
+        """
+        if not ips:
+            return {}
+        # Bloqueo en orden de id: dos importaciones solapadas no se bloquean mutuamente
+        result = await db.execute(
+            select(Device.id, Device.ip, Device.status, Device.location_id)
+            .where(Device.ip.in_(ips))
+            .order_by(Device.id)
+            .with_for_update()
+        )
+        return {row.ip: row for row in result.all()}
+
+    @staticmethod
+    async def bulk_upsert(db: AsyncSession, rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        INSERT ... ON CONFLICT (ip) DO UPDATE multi-fila. Las filas idénticas a
+        las existentes no se reescriben. Devuelve {ip: (id, inserted)} de las
+        filas insertadas o modificadas; `inserted` es False en las que ya
+        existían. No hace commit.
+        """
+        if not rows:
+            return {}
+
+        stmt = pg_insert(Device).values(rows)
+        updatable = ["status", "description", "protocol", "location_id"]
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[Device.ip],
+            set_={name: stmt.excluded[name] for name in updatable},
+            where=tuple_(*[getattr(Device, name) for name in updatable]).is_distinct_from(
+                tuple_(*[stmt.excluded[name] for name in updatable])
+            ),
+        ).returning(
+            Device.id,
+            Device.ip,
+            # xmax es 0 en las filas recién insertadas y no en las actualizadas
+            (literal_column("xmax") == 0).label("inserted"),
+        )
+
+        result = await db.execute(stmt)
+        return {row.ip: row for row in result.all()}
+
+    @staticmethod
+    async def update_with_history(db: AsyncSession, criteria: List, action: str, values: Dict[str, Any]) -> List:
+        """
+        Cambia `values` (status y/o location_id) en los dispositivos que cumplen
+        `criteria` y escribe su fila de historial, todo en una única sentencia:
+
+            WITH old AS (SELECT ... ORDER BY id FOR UPDATE),
+                 upd AS (UPDATE devices ... WHERE valor IS DISTINCT FROM nuevo RETURNING ...),
+                 hist AS (INSERT INTO assignment_history SELECT ... FROM upd)
+            SELECT old.id, old.id IN (SELECT id FROM upd) FROM old
+
+        Con AUDIT_OUTBOX el historial va a history_outbox (ver HistoryRepository).
+
+        Devuelve una fila (id, changed) por dispositivo encontrado; changed es
+        False cuando el dispositivo ya tenía esos valores. No hace commit.
+        """
+        devices = Device.__table__
+
+        # Bloqueo en orden de id: dos cambios masivos solapados no se bloquean mutuamente
+        old = (
+            select(devices.c.id, devices.c.status, devices.c.location_id)
+            .where(*criteria)
+            .order_by(devices.c.id)
+            .with_for_update()
+            .cte("old")
+        )
+        upd = (
+            update(devices)
+            .where(devices.c.id == old.c.id)
+            .where(or_(*[devices.c[name].is_distinct_from(value) for name, value in values.items()]))
+            .values(**values)
+            .returning(
+                devices.c.id,
+                old.c.status.label("old_status"),
+                devices.c.status.label("new_status"),
+                old.c.location_id.label("old_location_id"),
+                devices.c.location_id.label("new_location_id"),
+            )
+            .cte("upd")
+        )
+        hist = HistoryRepository.insert_from_select(
+            AssignmentHistory,
+            ["device_id", "action", "old_status", "new_status", "old_location_id", "new_location_id"],
+            select(
+                upd.c.id,
+                literal(action),
+                upd.c.old_status,
+                upd.c.new_status,
+                upd.c.old_location_id,
+                upd.c.new_location_id,
+            ),
+        ).cte("hist")
+
+        result = await db.execute(
+            select(old.c.id, old.c.id.in_(select(upd.c.id)).label("changed"))
+            .add_cte(hist)
+            .order_by(old.c.id)
+        )
+        return result.all()
+
+    @staticmethod
+    async def count(db: AsyncSession, **filters) -> Tuple[int, bool]:
+        """
+        Cuenta los dispositivos que cumplen los filtros.
+        Devuelve (total, es_estimado): si el planificador estima más de
+        EXACT_COUNT_THRESHOLD filas se devuelve su estimación en lugar de un COUNT(*).
+        """
+        stmt = DeviceRepository.apply_filters(select(Device.id), **filters)
+
+        # EXPLAIN no tiene construcción propia: la consulta se compila con
+        # parámetros con nombre (:nombre, los de text(); el dialecto base no
+        # añade ::tipo a cada uno) y se vuelven a enlazar con su tipo. Pasa
+        # por db.execute, así que cuenta en las métricas como cualquier otra
+        # sentencia
+        compiled = stmt.compile(dialect=PGDialect(paramstyle="named"))
+        params = compiled.construct_params()
+        explain = text(f"EXPLAIN (FORMAT JSON) {compiled.string}").bindparams(*[
+            bindparam(name, value, type_=compiled.binds[name].type) for name, value in params.items()
+        ])
+        plan = (await db.execute(explain)).scalar_one()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        estimate = int(plan[0]["Plan"]["Plan Rows"])
+
+        if estimate > EXACT_COUNT_THRESHOLD:
+            return estimate, True
+
+        total = await db.execute(select(func.count()).select_from(stmt.subquery()))
+        return total.scalar_one(), False
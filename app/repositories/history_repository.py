@@ -1,9 +1,333 @@
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+from sqlalchemy import Date, Integer, bindparam, case, cast, delete, exists, func, insert, literal, or_, true, tuple_, union_all
+from sqlalchemy.dialects.postgresql import ARRAY, aggregate_order_by, distinct_on, insert as pg_insert
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
+from sqlalchemy.orm import aliased
+from ..config import AUDIT_OUTBOX
 from ..models.assignment_model import AssignmentHistory
+from ..models.history_rollup_model import DeviceHistoryDaily
+from ..models.location_history_model import LocationHistory
+from ..models.outbox_model import HistoryOutbox
+from ..pagination import DEFAULT_LIMIT
+
+# Tablas de historial que pueden escribirse a través de history_outbox
+OUTBOX_TARGETS = {table.name: table for table in (AssignmentHistory.__table__, LocationHistory.__table__)}
 
 class HistoryRepository:
     @staticmethod
     async def get_all(db: AsyncSession):
         result = await db.execute(select(AssignmentHistory))
         return result.scalars().all()
+
+    @staticmethod
+    async def bulk_create(db: AsyncSession, rows: List[Dict[str, Any]], model=AssignmentHistory) -> None:
+        """
+        Inserta varias filas de historial en un INSERT multi-fila, o en
+        history_outbox con AUDIT_OUTBOX. No hace commit.
+        """
+        if not rows:
+            return
+        if AUDIT_OUTBOX:
+            table = model.__table__.name
+            await db.execute(insert(HistoryOutbox), [{"target": table, "payload": row} for row in rows])
+        else:
+            await db.execute(insert(model), rows)
+
+    @staticmethod
+    def insert_from_select(model, names: List[str], query):
+        """
+        INSERT ... SELECT de filas de historial (para usar como CTE), hacia la
+        tabla de `model` o, con AUDIT_OUTBOX, hacia history_outbox.
+        """
+        if not AUDIT_OUTBOX:
+            return insert(model).from_select(names, query)
+        rows = query.subquery()
+        payload = func.jsonb_build_object(
+            *[part for name, column in zip(names, rows.c) for part in (literal(name), column)]
+        )
+        return insert(HistoryOutbox).from_select(
+            ["target", "payload"], select(literal(model.__table__.name), payload)
+        )
+
+    @staticmethod
+    async def move_outbox(db: AsyncSession, limit: int) -> Dict[str, int]:
+        """
+        Mueve hasta `limit` filas de history_outbox, en orden de id, a sus
+        tablas en una sola sentencia (DELETE ... RETURNING + INSERT ... SELECT
+        por tabla). Las filas que referencian por FK algo borrado entretanto
+        siguen sus reglas ON DELETE: se descartan (CASCADE) o pierden la
+        referencia (SET NULL); los ids de localización no tienen FK y se
+        conservan. No hace commit.
+        Devuelve {"moved": n, tabla: filas insertadas, ...}.
+        """
+        pending = select(HistoryOutbox.id).order_by(HistoryOutbox.id).limit(limit)
+        moved = (
+            delete(HistoryOutbox)
+            .where(HistoryOutbox.id.in_(pending))
+            .returning(HistoryOutbox.id, HistoryOutbox.target, HistoryOutbox.payload, HistoryOutbox.created_at)
+            .cte("moved")
+        )
+
+        counts = [select(func.count()).select_from(moved).scalar_subquery().label("moved")]
+        for name, table in OUTBOX_TARGETS.items():
+            names = [column.name for column in table.c if column.name not in ("id", "timestamp")]
+            rows = (
+                select(
+                    moved.c.id,
+                    moved.c.created_at,
+                    *[moved.c.payload[column].astext.cast(table.c[column].type).label(column) for column in names],
+                )
+                .where(moved.c.target == name)
+                .subquery()
+            )
+
+            values, conditions = [], []
+            for column in names:
+                value = rows.c[column]
+                for fk in table.c[column].foreign_keys:
+                    referenced = exists().where(fk.column == value)
+                    if fk.ondelete == "CASCADE":
+                        conditions.append(or_(value.is_(None), referenced))
+                    elif fk.ondelete == "SET NULL":
+                        value = case((referenced, value), else_=None)
+                values.append(value)
+
+            inserted = (
+                insert(table)
+                .from_select(
+                    names + ["timestamp"],
+                    select(*values, rows.c.created_at).where(*conditions).order_by(rows.c.id),
+                )
+                .returning(table.c.id)
+                .cte(f"inserted_{name}")
+            )
+            counts.append(select(func.count()).select_from(inserted).scalar_subquery().label(name))
+
+        result = await db.execute(select(*counts))
+        return dict(result.one()._mapping)
+
+    @staticmethod
+    async def get_last_ids(db: AsyncSession) -> Tuple[int, int]:
+        """
+        Último id de assignment_history y de location_history (0 si están vacías).
+        """
+        result = await db.execute(select(
+            select(func.max(AssignmentHistory.id)).scalar_subquery(),
+            select(func.max(LocationHistory.id)).scalar_subquery(),
+        ))
+        assignment_id, location_id = result.one()
+        return assignment_id or 0, location_id or 0
+
+    @staticmethod
+    async def get_by_ids(db: AsyncSession, model, ids: List[int]) -> List:
+        """
+        Filas de `model` (AssignmentHistory o LocationHistory) con esos ids,
+        como tuplas con todas sus columnas. Las que ya no existan no aparecen.
+        """
+        table = model.__table__
+        result = await db.execute(select(*table.c).where(table.c.id.in_(ids)))
+        return result.all()
+
+    @staticmethod
+    async def get_last_id(db: AsyncSession, device_id: Optional[int] = None) -> int:
+        """
+        Último id de assignment_history, de un dispositivo o de todos (0 si no hay filas).
+        """
+        stmt = select(func.max(AssignmentHistory.id))
+        if device_id is not None:
+            stmt = stmt.where(AssignmentHistory.device_id == device_id)
+        result = await db.execute(stmt)
+        return result.scalar_one() or 0
+
+    @staticmethod
+    def apply_filters(
+        stmt,
+        device_id: Optional[int] = None,
+        location_id: Optional[int] = None,
+        action: Optional[str] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+    ):
+        """
+        Añade a la consulta los filtros del historial.
+        location_id coincide tanto con la localización anterior como con la nueva.
+        """
+        if device_id is not None:
+            stmt = stmt.where(AssignmentHistory.device_id == device_id)
+        if location_id is not None:
+            stmt = stmt.where(or_(
+                AssignmentHistory.old_location_id == location_id,
+                AssignmentHistory.new_location_id == location_id,
+            ))
+        if action is not None:
+            stmt = stmt.where(AssignmentHistory.action == action)
+        if since is not None:
+            stmt = stmt.where(AssignmentHistory.timestamp >= since)
+        if until is not None:
+            stmt = stmt.where(AssignmentHistory.timestamp < until)
+        return stmt
+
+    @staticmethod
+    async def get_page(
+        db: AsyncSession,
+        limit: int = DEFAULT_LIMIT,
+        before: Optional[Tuple[datetime, int]] = None,
+        columns: Optional[List] = None,
+        **filters,
+    ) -> List:
+        """
+        Devuelve una página del historial, de más reciente a más antiguo,
+        paginada por (timestamp, id). Con `columns` devuelve tuplas con esas
+        columnas en lugar de objetos AssignmentHistory.
+
+        Con location_id, el OR entre old_location_id y new_location_id no
+        puede usar sus índices en orden: recorrería el de (timestamp, id)
+        descartando filas, toda la tabla si la localización tiene pocas. Se
+        lee en su lugar la página de cada columna por su índice y se mezclan
+        (UNION ALL ordenado; DISTINCT ON quita las filas con old = new).
+        """
+        location_id = filters.pop("location_id", None)
+        if location_id is None:
+            stmt = select(*columns) if columns else select(AssignmentHistory)
+            stmt = HistoryRepository.apply_filters(stmt, **filters)
+            result = await db.execute(HistoryRepository._keyset(stmt, AssignmentHistory, limit, before))
+            return result.all() if columns else result.scalars().all()
+
+        branches = [
+            HistoryRepository._keyset(
+                HistoryRepository.apply_filters(select(AssignmentHistory), **filters).where(column == location_id),
+                AssignmentHistory, limit, before,
+            )
+            for column in (AssignmentHistory.old_location_id, AssignmentHistory.new_location_id)
+        ]
+        matches = aliased(AssignmentHistory, union_all(*branches).subquery("matches"))
+        stmt = select(*[getattr(matches, column.key) for column in columns]) if columns else select(matches)
+        stmt = stmt.ext(distinct_on(matches.timestamp, matches.id))
+        result = await db.execute(HistoryRepository._keyset(stmt, matches, limit))
+        return result.all() if columns else result.scalars().all()
+
+    @staticmethod
+    def _keyset(stmt, history, limit: int, before: Optional[Tuple[datetime, int]] = None):
+        """
+        Orden (timestamp, id) descendente, límite y, con `before`, la
+        condición de la página siguiente sobre `history` (el modelo o un alias).
+        """
+        if before is not None:
+            stmt = stmt.where(tuple_(history.timestamp, history.id) < before)
+            # Redundante, pero el planificador solo descarta particiones con
+            # comparaciones directas sobre timestamp, no con la de la tupla
+            stmt = stmt.where(history.timestamp <= before[0])
+        return stmt.order_by(history.timestamp.desc(), history.id.desc()).limit(limit)
+
+    @staticmethod
+    async def get_latest(db: AsyncSession, device_ids: List[int], per_device: int, columns: List) -> Dict[int, List]:
+        """
+        {device_id: [filas]} con las `per_device` entradas más recientes de
+        cada dispositivo (columnas `columns`, que deben incluir device_id), de
+        más reciente a más antigua. Un LATERAL por dispositivo: cada uno lee
+        solo sus últimas filas por el índice (device_id, timestamp, id).
+        """
+        latest: Dict[int, List] = {device_id: [] for device_id in device_ids}
+        if not device_ids or per_device <= 0:
+            return latest
+
+        ids = func.unnest(bindparam("device_ids", device_ids, type_=ARRAY(Integer))).table_valued("device_id").render_derived(name="ids")
+        newest = (
+            select(*columns)
+            .where(AssignmentHistory.device_id == ids.c.device_id)
+            .order_by(AssignmentHistory.timestamp.desc(), AssignmentHistory.id.desc())
+            .limit(per_device)
+            .lateral("newest")
+        )
+        result = await db.execute(
+            select(newest)
+            .select_from(ids)
+            .join(newest, true())
+            .order_by(newest.c.device_id, newest.c.timestamp.desc(), newest.c.id.desc())
+        )
+        for row in result.all():
+            latest[row.device_id].append(row)
+        return latest
+
+    @staticmethod
+    def daily_query(
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        device_id: Optional[int] = None,
+    ):
+        """
+        Agregado diario (UTC) del historial de asignaciones por dispositivo,
+        con las columnas de DeviceHistoryDaily. El alta cuenta como cambio de
+        status (y de localización si se crea con una).
+        """
+        newest = (AssignmentHistory.timestamp.desc(), AssignmentHistory.id.desc())
+        stmt = select(
+            AssignmentHistory.device_id,
+            cast(func.timezone("UTC", AssignmentHistory.timestamp), Date).label("day"),
+            func.count().label("changes"),
+            func.count().filter(
+                AssignmentHistory.old_status.is_distinct_from(AssignmentHistory.new_status)
+            ).label("status_changes"),
+            func.count().filter(
+                AssignmentHistory.old_location_id.is_distinct_from(AssignmentHistory.new_location_id)
+            ).label("location_changes"),
+            func.array_agg(aggregate_order_by(AssignmentHistory.new_status, *newest))[1].label("last_status"),
+            func.array_agg(aggregate_order_by(AssignmentHistory.new_location_id, *newest))[1].label("last_location_id"),
+        )
+        if since is not None:
+            stmt = stmt.where(AssignmentHistory.timestamp >= since)
+        if until is not None:
+            stmt = stmt.where(AssignmentHistory.timestamp < until)
+        if device_id is not None:
+            stmt = stmt.where(AssignmentHistory.device_id == device_id)
+        return stmt.group_by(AssignmentHistory.device_id, "day")
+
+    @staticmethod
+    async def rollup_daily(db: AsyncSession, since: datetime, until: datetime) -> int:
+        """
+        Guarda en device_history_daily el agregado de [since, until), que
+        debe cubrir días completos. Idempotente: reescribe los días que ya
+        estuvieran. No hace commit. Devuelve las filas escritas.
+        """
+        names = ["device_id", "day", "changes", "status_changes", "location_changes", "last_status", "last_location_id"]
+        stmt = pg_insert(DeviceHistoryDaily).from_select(names, HistoryRepository.daily_query(since, until))
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[DeviceHistoryDaily.device_id, DeviceHistoryDaily.day],
+            set_={name: stmt.excluded[name] for name in names[2:]},
+        )
+        result = await db.execute(stmt)
+        return result.rowcount
+
+    @staticmethod
+    async def get_daily(
+        db: AsyncSession,
+        horizon: Optional[datetime],
+        device_id: Optional[int] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+    ) -> List:
+        """
+        Resumen diario por dispositivo de los días en [since, until) (límites
+        a medianoche UTC): de device_history_daily para los días anteriores a
+        `horizon` (historial ya expirado) y calculado sobre el historial, con
+        poda de particiones, para los demás. Ordenado por dispositivo y día.
+        """
+        live_since = since if horizon is None or (since is not None and since > horizon) else horizon
+        parts = [HistoryRepository.daily_query(live_since, until, device_id)]
+
+        if horizon is not None and (since is None or since < horizon):
+            stored = select(*[DeviceHistoryDaily.__table__.c[name] for name in parts[0].selected_columns.keys()])
+            stored = stored.where(DeviceHistoryDaily.day < horizon.date())
+            if device_id is not None:
+                stored = stored.where(DeviceHistoryDaily.device_id == device_id)
+            if since is not None:
+                stored = stored.where(DeviceHistoryDaily.day >= since.date())
+            if until is not None:
+                stored = stored.where(DeviceHistoryDaily.day < until.date())
+            parts.append(stored)
+
+        rows = union_all(*parts).subquery() if len(parts) > 1 else parts[0].subquery()
+        result = await db.execute(select(rows).order_by(rows.c.device_id, rows.c.day))
+        return result.all()
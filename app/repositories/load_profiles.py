@@ -0,0 +1,21 @@
+"""
+Perfiles de carga de relaciones.
+
+Todas las relaciones de los modelos son lazy="raise": ninguna consulta carga
+relaciones salvo que el servicio elija explícitamente uno de estos perfiles.
+Los listados y expand=history no cargan objetos: leen solo las columnas
+pedidas (DeviceRepository.get_page_rows, HistoryRepository.get_latest).
+"""
+from sqlalchemy.orm import joinedload, selectinload
+
+from ..models.device_model import Device
+# Las opciones se construyen al importar: todos los modelos relacionados deben estar registrados
+from ..models.location_model import Location  # noqa: F401
+from ..models.port_model import Port  # noqa: F401
+from ..models.assignment_model import AssignmentHistory  # noqa: F401
+
+# Forma de DeviceOut: localización (JOIN) y puertos (1 SELECT adicional)
+DEVICE_WITH_PORTS = (
+    joinedload(Device.location),
+    selectinload(Device.ports),
+)
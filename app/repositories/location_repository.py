@@ -1,8 +1,13 @@
+from typing import List, Optional
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-from ..models.location_model import Location
+from sqlalchemy import delete, insert, literal, select, text, union_all, update
+from ..models.location_model import Location, LocationClosure
 from ..schemas.location_schema import LocationCreate
 
+# Advisory lock que serializa las escrituras en el cierre del árbol: los
+# movimientos de subárboles (evita ciclos por carreras) y las altas con padre
+LOCATION_TREE_LOCK_KEY = 5_000_004
+
 class LocationRepository:
     @staticmethod
     async def create(db: AsyncSession, location_data: LocationCreate):
@@ -19,3 +24,92 @@ class LocationRepository:
     async def get_all(db: AsyncSession):
         result = await db.execute(select(Location))
         return result.scalars().all()
+
+    @staticmethod
+    def subtree_ids(location_id: int):
+        """
+        Subconsulta con los ids del subárbol de `location_id` (incluida ella).
+        """
+        return select(LocationClosure.descendant_id).where(LocationClosure.ancestor_id == location_id)
+
+    @staticmethod
+    async def add_to_tree(db: AsyncSession, location_id: int, parent_id: Optional[int]) -> None:
+        """
+        Filas de cierre de una localización nueva: las de los antepasados de
+        su padre más la suya propia, en un solo INSERT ... SELECT. Con padre,
+        toma el lock del árbol: si no, un movimiento concurrente del padre
+        dejaría a la nueva con los antepasados anteriores.
+        """
+        rows = select(literal(location_id), literal(location_id), literal(0))
+        if parent_id is not None:
+            await db.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": LOCATION_TREE_LOCK_KEY})
+            rows = union_all(
+                rows,
+                select(LocationClosure.ancestor_id, literal(location_id), LocationClosure.depth + 1)
+                .where(LocationClosure.descendant_id == parent_id),
+            )
+        await db.execute(
+            insert(LocationClosure).from_select(["ancestor_id", "descendant_id", "depth"], rows)
+        )
+
+    @staticmethod
+    async def get_subtree(db: AsyncSession, location_id: int) -> List:
+        """
+        (Location, depth) del subárbol, de la raíz a las hojas.
+        """
+        result = await db.execute(
+            select(Location, LocationClosure.depth)
+            .join(LocationClosure, LocationClosure.descendant_id == Location.id)
+            .where(LocationClosure.ancestor_id == location_id)
+            .order_by(LocationClosure.depth, Location.name)
+        )
+        return result.all()
+
+    @staticmethod
+    async def move_subtree(db: AsyncSession, location_id: int, new_parent_id: Optional[int]) -> bool:
+        """
+        Cuelga el subárbol de `location_id` de `new_parent_id` (None: raíz)
+        con un número fijo de sentencias, sea cual sea su tamaño. Devuelve
+        False si la localización no existe. No hace commit.
+        """
+        await db.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": LOCATION_TREE_LOCK_KEY})
+
+        current = await db.execute(select(Location.id).where(Location.id == location_id).with_for_update())
+        if current.scalar_one_or_none() is None:
+            return False
+
+        if new_parent_id is not None:
+            in_subtree = await db.execute(
+                select(LocationClosure.ancestor_id).where(
+                    LocationClosure.ancestor_id == location_id,
+                    LocationClosure.descendant_id == new_parent_id,
+                )
+            )
+            if in_subtree.first() is not None:
+                raise ValueError("No se puede mover una localización dentro de su propio subárbol")
+
+        subtree = LocationRepository.subtree_ids(location_id)
+
+        # 1. Desenganchar el subárbol de sus antepasados actuales
+        await db.execute(
+            delete(LocationClosure).where(
+                LocationClosure.descendant_id.in_(subtree),
+                LocationClosure.ancestor_id.not_in(subtree),
+            )
+        )
+
+        # 2. Enlazar cada antepasado del nuevo padre con cada nodo del subárbol
+        if new_parent_id is not None:
+            above = LocationClosure.__table__.alias("above")
+            below = LocationClosure.__table__.alias("below")
+            await db.execute(
+                insert(LocationClosure).from_select(
+                    ["ancestor_id", "descendant_id", "depth"],
+                    select(above.c.ancestor_id, below.c.descendant_id, above.c.depth + below.c.depth + 1)
+                    .where(above.c.descendant_id == new_parent_id, below.c.ancestor_id == location_id),
+                )
+            )
+
+        # 3. El padre directo
+        await db.execute(update(Location).where(Location.id == location_id).values(parent_id=new_parent_id))
+        return True
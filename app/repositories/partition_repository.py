@@ -0,0 +1,133 @@
+from datetime import date
+from typing import List
+import gzip
+import os
+
+from sqlalchemy import Table, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..models.partitions import (
+    DEFAULT_PARTITION_SUFFIX,
+    month_bounds,
+    partition_month,
+    partition_name,
+)
+
+class PartitionRepository:
+    """
+    DDL de las particiones mensuales de las tablas de historial. Los nombres
+    de tabla salen siempre de los modelos, nunca de la entrada del usuario.
+    Nada hace commit.
+    """
+
+    @staticmethod
+    async def get_months(db: AsyncSession, table: Table) -> List[date]:
+        """
+        Meses con partición mensual adjunta a `table`, del más antiguo al más reciente.
+        """
+        result = await db.execute(
+            text(
+                "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+                "WHERE i.inhparent = CAST(:table AS regclass)"
+            ),
+            {"table": table.name},
+        )
+        months = [partition_month(table.name, name) for name in result.scalars()]
+        return sorted(month for month in months if month is not None)
+
+    @staticmethod
+    async def get_default_months(db: AsyncSession, table: Table) -> List[date]:
+        """
+        Meses (UTC) que tienen filas en la partición DEFAULT.
+        """
+        result = await db.execute(text(
+            f"SELECT DISTINCT CAST(date_trunc('month', timestamp AT TIME ZONE 'UTC') AS date) "
+            f"FROM {table.name}{DEFAULT_PARTITION_SUFFIX} ORDER BY 1"
+        ))
+        return list(result.scalars())
+
+    @staticmethod
+    async def _lock_for_ddl(db: AsyncSession, table: Table, referenced_mode: str = "SHARE ROW EXCLUSIVE") -> None:
+        """
+        Locks para crear, separar o eliminar particiones de `table`. Las FK de
+        la partición bloquean las tablas referenciadas: se toman antes que la
+        tabla de historial, en el mismo orden que las escrituras (primero
+        devices/locations, luego el historial), para no hacer deadlock, y ya
+        en el modo más fuerte que vaya a hacer falta (eliminar una FK pide
+        ACCESS EXCLUSIVE): subir de modo después también puede hacerlo.
+        """
+        referenced = sorted({fk.column.table.name for fk in table.foreign_keys})
+        if referenced:
+            await db.execute(text(f"LOCK TABLE {', '.join(referenced)} IN {referenced_mode} MODE"))
+        await db.execute(text(f"LOCK TABLE {table.name} IN ACCESS EXCLUSIVE MODE"))
+
+    @staticmethod
+    async def create(db: AsyncSession, table: Table, month: date) -> str:
+        """
+        Crea la partición del mes. Si la DEFAULT tiene filas de ese mes se
+        crea como tabla suelta, se le mueven esas filas y después se adjunta
+        (ATTACH comprueba que ya no quedan en la DEFAULT). Devuelve su nombre.
+        """
+        name = partition_name(table.name, month)
+        start, end = month_bounds(month)
+        bounds = {"start": start, "end": end}
+        default = f"{table.name}{DEFAULT_PARTITION_SUFFIX}"
+        values = f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+
+        await PartitionRepository._lock_for_ddl(db, table)
+        pending = await db.execute(
+            text(f"SELECT EXISTS (SELECT 1 FROM {default} WHERE timestamp >= :start AND timestamp < :end)"),
+            bounds,
+        )
+        if not pending.scalar():
+            await db.execute(text(f"CREATE TABLE {name} PARTITION OF {table.name} {values}"))
+            return name
+
+        # Las filas movidas no pasan por el trigger del feed: se instala al adjuntar
+        await db.execute(text(f"CREATE TABLE {name} (LIKE {table.name} INCLUDING DEFAULTS)"))
+        await db.execute(
+            text(
+                f"WITH moved AS (DELETE FROM {default} WHERE timestamp >= :start AND timestamp < :end "
+                f"RETURNING *) INSERT INTO {name} SELECT * FROM moved"
+            ),
+            bounds,
+        )
+        await db.execute(text(f"ALTER TABLE {table.name} ATTACH PARTITION {name} {values}"))
+        return name
+
+    @staticmethod
+    async def archive(db: AsyncSession, table: Table, month: date, directory: str) -> str:
+        """
+        Copia la partición del mes a `directory`/<partición>.csv.gz (CSV con
+        cabecera, en orden de id). Escribe a un temporal y lo renombra al
+        terminar, así un archivo con el nombre final siempre está completo.
+        Devuelve la ruta del archivo.
+        """
+        name = partition_name(table.name, month)
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{name}.csv.gz")
+        partial = f"{path}.tmp"
+
+        # COPY por la conexión de la sesión: ve las filas de esta transacción
+        conn = await db.connection()
+        raw = await conn.get_raw_connection()
+        with gzip.open(partial, "wb") as output:
+            await raw.driver_connection.copy_from_query(
+                f"SELECT * FROM {name} ORDER BY id", output=output, format="csv", header=True
+            )
+        os.replace(partial, path)
+        return path
+
+    @staticmethod
+    async def detach(db: AsyncSession, table: Table, month: date, drop: bool = False) -> str:
+        """
+        Separa la partición del mes de la tabla (queda como tabla suelta con
+        sus filas) o, con `drop`, la elimina. Devuelve su nombre.
+        """
+        name = partition_name(table.name, month)
+        await PartitionRepository._lock_for_ddl(db, table, "ACCESS EXCLUSIVE" if drop else "SHARE ROW EXCLUSIVE")
+        # Sin CONCURRENTLY: no puede ir dentro de una transacción
+        await db.execute(text(f"ALTER TABLE {table.name} DETACH PARTITION {name}"))
+        if drop:
+            await db.execute(text(f"DROP TABLE {name}"))
+        return name
@@ -1,6 +1,6 @@
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-from typing import List, Union, Dict, Any
+from sqlalchemy import select, delete, insert, update
+from typing import List, Optional, Tuple, Union, Dict, Any
 import logging
 
 from ..models.port_model import Port
@@ -15,41 +15,67 @@ class PortRepository:
         device_id: int,
         new_ports: List[Union[PortCreate, Dict[str, Any]]]
     ) -> List[Port]:
+        """
+        Deja en el dispositivo exactamente `new_ports`, conservando el ID de los
+        puertos cuyo número no cambia. Devuelve los puertos creados.
+        """
         try:
-            # Leer puertos actuales
-            result = await db.execute(
-                select(Port).where(Port.device_id == device_id)
-            )
-            existing_ports = result.scalars().all()
+            created_ports = await PortRepository.sync_ports(db, {device_id: new_ports})
+            logger.info(f"Reemplazados puertos del dispositivo {device_id}")
+            return created_ports
 
-            # Eliminar puertos existentes
-            for port in existing_ports:
-                await db.delete(port)
+        except Exception as e:
+            await db.rollback()
+            logger.error(f"Error al reemplazar puertos del dispositivo {device_id}: {e}")
+            raise
 
-            await db.flush() 
+    @staticmethod
+    async def sync_ports(
+        db: AsyncSession,
+        ports_by_device: Dict[int, List[Union[PortCreate, Dict[str, Any]]]]
+    ) -> List[Port]:
+        """
+        Aplica a varios dispositivos la diferencia entre sus puertos actuales y los
+        nuevos, por número de puerto: como mucho un DELETE, un UPDATE y un
+        INSERT ... RETURNING. No hace commit. Devuelve los puertos creados.
+        """
+        if not ports_by_device:
+            return []
 
-            # Crear nuevos puertos
-            created_ports = []
-            for port_data in new_ports:
+        wanted: Dict[Tuple[int, int], Optional[str]] = {}
+        for device_id, ports in ports_by_device.items():
+            for port_data in ports:
                 if isinstance(port_data, dict):
                     port_data = PortCreate(**port_data)
+                wanted[(device_id, port_data.port_number)] = port_data.description
 
-                new_port = Port(
-                    device_id=device_id,
-                    port_number=port_data.port_number,
-                    description=port_data.description
-                )
-                db.add(new_port)
-                created_ports.append(new_port)
+        result = await db.execute(
+            select(Port.id, Port.device_id, Port.port_number, Port.description)
+            .where(Port.device_id.in_(list(ports_by_device)))
+        )
 
-            await db.flush()
-            for port in created_ports:
-                await db.refresh(port)
+        to_delete, to_update = [], []
+        for port_id, device_id, port_number, description in result.all():
+            key = (device_id, port_number)
+            if key not in wanted:
+                to_delete.append(port_id)
+                continue
+            new_description = wanted.pop(key)
+            if new_description != description:
+                to_update.append({"id": port_id, "description": new_description})
 
-            logger.info(f"Reemplazados puertos del dispositivo {device_id}")
-            return created_ports
+        if to_delete:
+            await db.execute(delete(Port).where(Port.id.in_(to_delete)))
+        if to_update:
+            await db.execute(update(Port), to_update)
 
-        except Exception as e:
-            await db.rollback()
-            logger.error(f"Error al reemplazar puertos del dispositivo {device_id}: {e}")
-            raise
+        if not wanted:
+            return []
+        created = await db.scalars(
+            insert(Port).returning(Port),
+            [
+                {"device_id": device_id, "port_number": port_number, "description": description}
+                for (device_id, port_number), description in wanted.items()
+            ],
+        )
+        return created.all()
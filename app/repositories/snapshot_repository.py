@@ -0,0 +1,209 @@
+from datetime import datetime
+from typing import List, Optional
+from sqlalchemy import case, delete, exists, func, insert, literal, select, text
+from sqlalchemy.dialects.postgresql import distinct_on
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..models.assignment_model import AssignmentHistory
+from ..models.device_model import Device
+from ..models.snapshot_model import DeviceDeletion, DeviceSnapshot, InventoryCheckpoint
+from .location_repository import LocationRepository
+
+# Inicio de la transacción de cliente abierta más antigua en esta base de
+# datos (sin contar la actual), o now() si no hay ninguna. Requiere ver las
+# sesiones de los demás: el mismo rol o pg_read_all_stats
+_OLDEST_OPEN_TRANSACTION = text("""
+    SELECT least(now(), min(xact_start)) FROM pg_stat_activity
+    WHERE datname = current_database() AND backend_type = 'client backend'
+        AND pid <> pg_backend_pid()
+""")
+
+class SnapshotRepository:
+    @staticmethod
+    async def create_checkpoint(db: AsyncSession):
+        """
+        Copia el estado actual (status y localización) de todos los dispositivos
+        en un checkpoint nuevo, con un único INSERT ... SELECT.
+        Devuelve la fila (id, taken_at) del checkpoint.
+
+        El historial lleva el inicio de su transacción (now()): una escritura
+        abierta durante la copia que confirma después no está en el
+        checkpoint y su historial puede ser anterior a taken_at. replay_from
+        es el inicio de la transacción abierta más antigua antes de copiar, y
+        states_as_of_query aplica el historial desde ahí. Volver a aplicar un
+        cambio ya copiado no altera nada: cada fila lleva el estado completo.
+        """
+        replay_from = (await db.execute(_OLDEST_OPEN_TRANSACTION)).scalar_one()
+        result = await db.execute(
+            insert(InventoryCheckpoint)
+            .values(replay_from=replay_from)
+            .returning(InventoryCheckpoint.id, InventoryCheckpoint.taken_at)
+        )
+        checkpoint = result.one()
+
+        await db.execute(
+            insert(DeviceSnapshot).from_select(
+                ["checkpoint_id", "device_id", "status", "location_id"],
+                select(literal(checkpoint.id), Device.id, Device.status, Device.location_id),
+            )
+        )
+        return checkpoint
+
+    @staticmethod
+    async def create_base_checkpoint(db: AsyncSession, as_of: datetime):
+        """
+        Checkpoint base con el estado reconstruido en `as_of`, antes de
+        descartar el historial anterior a ese instante. Si ya existe uno en
+        `as_of` lo devuelve sin crear otro. Devuelve la fila (id, taken_at).
+        """
+        result = await db.execute(
+            select(InventoryCheckpoint.id, InventoryCheckpoint.taken_at).where(
+                InventoryCheckpoint.base.is_(True), InventoryCheckpoint.taken_at == as_of
+            )
+        )
+        checkpoint = result.one_or_none()
+        if checkpoint is not None:
+            return checkpoint
+
+        states = (await SnapshotRepository.states_as_of_query(db, as_of)).subquery()
+        result = await db.execute(
+            insert(InventoryCheckpoint)
+            .values(taken_at=as_of, replay_from=as_of, base=True)
+            .returning(InventoryCheckpoint.id, InventoryCheckpoint.taken_at)
+        )
+        checkpoint = result.one()
+
+        await db.execute(
+            insert(DeviceSnapshot).from_select(
+                ["checkpoint_id", "device_id", "status", "location_id"],
+                select(literal(checkpoint.id), states.c.device_id, states.c.status, states.c.location_id),
+            )
+        )
+        return checkpoint
+
+    @staticmethod
+    async def get_horizon(db: AsyncSession) -> Optional[datetime]:
+        """
+        Instante del checkpoint base más reciente: antes de él ya no hay
+        historial completo. None si nunca se ha expirado historial.
+        """
+        result = await db.execute(
+            select(func.max(InventoryCheckpoint.taken_at)).where(InventoryCheckpoint.base.is_(True))
+        )
+        return result.scalar_one()
+
+    @staticmethod
+    async def delete_before(db: AsyncSession, before: datetime) -> None:
+        """
+        Elimina los checkpoints (base o no) anteriores a `before`.
+        """
+        await db.execute(delete(InventoryCheckpoint).where(InventoryCheckpoint.taken_at < before))
+
+    @staticmethod
+    async def get_latest(db: AsyncSession, before: Optional[datetime] = None) -> Optional[InventoryCheckpoint]:
+        stmt = select(InventoryCheckpoint)
+        if before is not None:
+            stmt = stmt.where(InventoryCheckpoint.taken_at <= before)
+        stmt = stmt.order_by(InventoryCheckpoint.taken_at.desc()).limit(1)
+        result = await db.execute(stmt)
+        return result.scalar_one_or_none()
+
+    @staticmethod
+    async def prune(db: AsyncSession, keep: int) -> None:
+        """
+        Elimina los checkpoints más antiguos, conservando los `keep` más
+        recientes. Los checkpoints base no se cuentan ni se eliminan.
+        """
+        newest = (
+            select(InventoryCheckpoint.id)
+            .where(InventoryCheckpoint.base.is_(False))
+            .order_by(InventoryCheckpoint.taken_at.desc())
+            .limit(keep)
+        )
+        # Los snapshots se eliminan por ON DELETE CASCADE
+        await db.execute(
+            delete(InventoryCheckpoint).where(
+                InventoryCheckpoint.base.is_(False), InventoryCheckpoint.id.not_in(newest)
+            )
+        )
+
+    @staticmethod
+    async def get_states_as_of(db: AsyncSession, as_of: datetime, **filters) -> List:
+        """
+        Reconstruye (device_id, status, location_id) en el instante `as_of`:
+        parte del checkpoint más reciente anterior a `as_of` y aplica solo el
+        último cambio de historial de cada dispositivo entre su replay_from y
+        `as_of`. Los dispositivos eliminados antes de `as_of` no aparecen.
+        `location_subtree` usa la jerarquía actual, no la de `as_of`.
+        """
+        stmt = await SnapshotRepository.states_as_of_query(db, as_of, **filters)
+        result = await db.execute(stmt)
+        return result.all()
+
+    @staticmethod
+    async def states_as_of_query(
+        db: AsyncSession,
+        as_of: datetime,
+        device_id: Optional[int] = None,
+        location_id: Optional[int] = None,
+        status: Optional[str] = None,
+        location_subtree: Optional[int] = None,
+    ):
+        """
+        Consulta (sin ejecutar) de get_states_as_of; solo lee el checkpoint.
+        """
+        checkpoint = await SnapshotRepository.get_latest(db, before=as_of)
+
+        deltas = (
+            select(
+                AssignmentHistory.device_id,
+                AssignmentHistory.new_status.label("status"),
+                AssignmentHistory.new_location_id.label("location_id"),
+            )
+            .where(AssignmentHistory.timestamp <= as_of)
+            .ext(distinct_on(AssignmentHistory.device_id))
+            .order_by(
+                AssignmentHistory.device_id,
+                AssignmentHistory.timestamp.desc(),
+                AssignmentHistory.id.desc(),
+            )
+        )
+        if checkpoint is not None:
+            deltas = deltas.where(AssignmentHistory.timestamp >= checkpoint.replay_from)
+        if device_id is not None:
+            deltas = deltas.where(AssignmentHistory.device_id == device_id)
+        deltas = deltas.subquery()
+
+        if checkpoint is None:
+            states = select(deltas.c.device_id, deltas.c.status, deltas.c.location_id)
+        else:
+            base = select(DeviceSnapshot.device_id, DeviceSnapshot.status, DeviceSnapshot.location_id).where(
+                DeviceSnapshot.checkpoint_id == checkpoint.id
+            )
+            if device_id is not None:
+                base = base.where(DeviceSnapshot.device_id == device_id)
+            base = base.subquery()
+
+            # Cada fila de historial registra el estado completo tras el cambio
+            changed = deltas.c.device_id.is_not(None)
+            states = select(
+                func.coalesce(deltas.c.device_id, base.c.device_id).label("device_id"),
+                case((changed, deltas.c.status), else_=base.c.status).label("status"),
+                case((changed, deltas.c.location_id), else_=base.c.location_id).label("location_id"),
+            ).select_from(
+                base.join(deltas, base.c.device_id == deltas.c.device_id, full=True)
+            )
+
+        states = states.subquery()
+        # Los eliminados ya no tienen historial, pero siguen en el checkpoint
+        deleted = exists().where(
+            DeviceDeletion.device_id == states.c.device_id, DeviceDeletion.deleted_at <= as_of
+        )
+        stmt = select(states.c.device_id, states.c.status, states.c.location_id).where(~deleted)
+        if location_id is not None:
+            stmt = stmt.where(states.c.location_id == location_id)
+        if location_subtree is not None:
+            stmt = stmt.where(states.c.location_id.in_(LocationRepository.subtree_ids(location_subtree)))
+        if status is not None:
+            stmt = stmt.where(states.c.status == status)
+        return stmt.order_by(states.c.device_id)
@@ -0,0 +1,96 @@
+from typing import List, Optional
+from sqlalchemy import BigInteger, delete, func, insert, literal, text, union_all
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from ..models.device_model import Device
+from ..models.location_model import Location
+from ..models.stats_model import LocationStatusCount
+from .location_repository import LocationRepository
+
+class StatsRepository:
+    @staticmethod
+    async def get_location_counts(db: AsyncSession) -> List:
+        """
+        (location_id, location_name, status, device_count) de la tabla de
+        contadores; O(localizaciones × status), no O(dispositivos).
+        """
+        result = await db.execute(
+            select(
+                LocationStatusCount.location_id,
+                Location.name.label("location_name"),
+                LocationStatusCount.status,
+                LocationStatusCount.device_count,
+            )
+            .outerjoin(Location, Location.id == LocationStatusCount.location_id)
+            .where(LocationStatusCount.device_count > 0)
+            .order_by(
+                LocationStatusCount.location_id.nulls_first(),
+                LocationStatusCount.status.nulls_first(),
+            )
+        )
+        return result.all()
+
+    @staticmethod
+    async def get_status_counts(db: AsyncSession, location_subtree: Optional[int] = None) -> List:
+        """
+        Dispositivos por status, de todo el inventario o de un subárbol de localizaciones.
+        """
+        total = func.sum(LocationStatusCount.device_count)
+        stmt = select(LocationStatusCount.status, total.label("device_count"))
+        if location_subtree is not None:
+            stmt = stmt.where(
+                LocationStatusCount.location_id.in_(LocationRepository.subtree_ids(location_subtree))
+            )
+        result = await db.execute(
+            stmt.group_by(LocationStatusCount.status)
+            .having(total > 0)
+            .order_by(LocationStatusCount.status.nulls_first())
+        )
+        return result.all()
+
+    @staticmethod
+    async def reconcile(db: AsyncSession) -> List:
+        """
+        Compara los contadores con un recuento real de devices y, si difieren,
+        los reescribe. La tabla se bloquea (EXCLUSIVE) antes de contar: las
+        escrituras que lleguen mientras tanto esperan y se aplican después
+        sobre los valores corregidos. Devuelve las diferencias encontradas
+        (location_id, status, stored, actual). No hace commit.
+        """
+        await db.execute(text("LOCK TABLE location_status_counts IN EXCLUSIVE MODE"))
+
+        # UNION ALL + GROUP BY en lugar de FULL JOIN: agrupa los NULL juntos
+        counts = union_all(
+            select(
+                Device.location_id,
+                Device.status,
+                literal(1, BigInteger).label("actual"),
+                literal(0, BigInteger).label("stored"),
+            ),
+            select(
+                LocationStatusCount.location_id,
+                LocationStatusCount.status,
+                literal(0, BigInteger),
+                LocationStatusCount.device_count,
+            ),
+        ).subquery("counts")
+        actual = func.sum(counts.c.actual)
+        stored = func.sum(counts.c.stored)
+        drift = await db.execute(
+            select(counts.c.location_id, counts.c.status, stored.label("stored"), actual.label("actual"))
+            .group_by(counts.c.location_id, counts.c.status)
+            .having(actual != stored)
+        )
+        differences = drift.all()
+
+        if differences:
+            await db.execute(delete(LocationStatusCount))
+            await db.execute(
+                insert(LocationStatusCount).from_select(
+                    ["location_id", "status", "device_count"],
+                    select(Device.location_id, Device.status, func.count())
+                    .group_by(Device.location_id, Device.status),
+                )
+            )
+        return differences
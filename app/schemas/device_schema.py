@@ -1,8 +1,47 @@
-from pydantic import BaseModel
-from typing import List, Optional
+from pydantic import BaseModel, field_validator, model_validator
+from typing import List, Optional, Tuple
+import ipaddress
 from .port_schema import PortCreate, PortOut
 from .location_schema import LocationOut
 
+
+def _unique_port_numbers(ports: Optional[List[PortCreate]]) -> Optional[List[PortCreate]]:
+    if ports is not None:
+        numbers = [port.port_number for port in ports]
+        if len(numbers) != len(set(numbers)):
+            raise ValueError("Hay números de puerto repetidos")
+    return ports
+
+
+def normalize_ip(value: Optional[str]) -> Optional[str]:
+    """
+    Forma canónica de una IP (v4 o v6), la misma con la que PostgreSQL
+    devuelve un inet: "2001:DB8::0:1" -> "2001:db8::1".
+    """
+    if value is None:
+        return value
+    try:
+        address = ipaddress.ip_address(value.strip())
+    except ValueError:
+        raise ValueError(f"IP no válida: {value!r}")
+    if getattr(address, "scope_id", None):
+        raise ValueError(f"IP no válida (zona no admitida): {value!r}")
+    return str(address)
+
+
+def normalize_network(value: Optional[str]) -> Optional[str]:
+    """
+    Forma canónica de una red en notación CIDR; los bits de host se ponen a
+    cero ("10.20.1.7/16" -> "10.20.0.0/16") y una IP sola es una red /32 o /128.
+    """
+    if value is None:
+        return value
+    try:
+        return str(ipaddress.ip_network(value.strip(), strict=False))
+    except ValueError:
+        raise ValueError(f"Red CIDR no válida: {value!r}")
+
+
 class DeviceCreate(BaseModel):
     ip: str
     status: str
@@ -11,6 +50,9 @@ class DeviceCreate(BaseModel):
     location_id: Optional[int]
     ports: List[PortCreate]  # PortCreate, NO PortOut
 
+    check_ip = field_validator("ip")(normalize_ip)
+    check_ports = field_validator("ports")(_unique_port_numbers)
+
     class Config:
         from_attributes = True
 
@@ -22,6 +64,9 @@ class DeviceUpdate(BaseModel):
     location_id: Optional[int] = None
     ports: Optional[List[PortCreate]] = None  # usar PortCreate aquí
 
+    check_ip = field_validator("ip")(normalize_ip)
+    check_ports = field_validator("ports")(_unique_port_numbers)
+
     class Config:
         from_attributes = True
 
@@ -36,3 +81,112 @@ class DeviceOut(BaseModel):
 
     class Config:
         from_attributes = True
+
+# Campos de DeviceOut que pueden pedirse con ?fields=, en su orden de salida
+DEVICE_FIELDS = ("id", "ip", "status", "description", "protocol")
+# Relaciones que pueden pedirse con ?expand=, en su orden de salida
+DEVICE_EXPANSIONS = ("location", "ports", "history")
+# Relaciones de DeviceOut (la salida sin fields ni expand)
+DEFAULT_DEVICE_EXPAND = ("location", "ports")
+
+class DeviceFieldset(BaseModel):
+    """
+    Forma pedida de un dispositivo: campos propios y relaciones incluidas.
+    """
+    fields: Tuple[str, ...] = DEVICE_FIELDS
+    expand: Tuple[str, ...] = DEFAULT_DEVICE_EXPAND
+
+def _parse_names(value: str, allowed: Tuple[str, ...], parameter: str) -> Tuple[str, ...]:
+    names = {name.strip() for name in value.split(",") if name.strip()}
+    unknown = names - set(allowed)
+    if unknown:
+        raise ValueError(
+            f"Valores no válidos en {parameter}: {', '.join(sorted(unknown))} (admitidos: {', '.join(allowed)})"
+        )
+    return tuple(name for name in allowed if name in names)
+
+def parse_fieldset(fields: Optional[str], expand: Optional[str]) -> Optional[DeviceFieldset]:
+    """
+    Interpreta ?fields=id,ip,status y ?expand=ports,location,history.
+    `fields` elige los campos propios (id se incluye siempre: identifica el
+    elemento y es la clave del cursor) y `expand` exactamente las relaciones
+    incluidas: si solo se da `fields` no se incluye ninguna, y si solo se da
+    `expand` van todos los campos propios. Sin ninguno de los dos devuelve
+    None: la forma completa de DeviceOut. Lanza ValueError con nombres desconocidos.
+    """
+    if fields is None and expand is None:
+        return None
+    return DeviceFieldset(
+        fields=_parse_names(f"id,{fields}", DEVICE_FIELDS, "fields") if fields is not None else DEVICE_FIELDS,
+        expand=_parse_names(expand, DEVICE_EXPANSIONS, "expand") if expand is not None else (),
+    )
+
+class DeviceStateOut(BaseModel):
+    device_id: int
+    status: Optional[str]
+    location_id: Optional[int]
+
+    class Config:
+        from_attributes = True
+
+class DevicePage(BaseModel):
+    items: List[DeviceOut]
+    next_cursor: Optional[str] = None  # None cuando no hay más páginas
+    total: Optional[int] = None  # Solo si se pide include_total
+    total_is_estimate: bool = False
+
+class BulkRowResult(BaseModel):
+    row: int  # Posición de la fila en la petición (desde 0)
+    ip: Optional[str] = None
+    result: str  # created | updated | unchanged | error
+    device_id: Optional[int] = None
+    error: Optional[str] = None
+
+class BulkImportReport(BaseModel):
+    created: int
+    updated: int
+    unchanged: int
+    error: int
+    results: List[BulkRowResult]
+
+class DeviceFilter(BaseModel):
+    status: Optional[str] = None
+    protocol: Optional[str] = None
+    location_id: Optional[int] = None
+    location_subtree: Optional[int] = None  # la localización y sus sublocalizaciones
+    ip_prefix: Optional[str] = None
+    cidr: Optional[str] = None  # red, ej. 10.20.0.0/16
+    ip_from: Optional[str] = None  # rango de IPs, ambos extremos incluidos
+    ip_to: Optional[str] = None
+
+    check_cidr = field_validator("cidr")(normalize_network)
+    check_ip_range = field_validator("ip_from", "ip_to")(normalize_ip)
+
+class DeviceSelection(BaseModel):
+    # Exactamente uno de los dos: lista de IDs o filtro
+    ids: Optional[List[int]] = None
+    filter: Optional[DeviceFilter] = None
+
+    @model_validator(mode="after")
+    def check_selection(self):
+        if (self.ids is None) == (self.filter is None):
+            raise ValueError("Indica 'ids' o 'filter', pero no ambos")
+        if self.filter is not None and not self.filter.model_dump(exclude_none=True):
+            raise ValueError("El filtro no puede estar vacío")
+        return self
+
+class BulkStatusRequest(DeviceSelection):
+    status: str
+
+class BulkMoveRequest(DeviceSelection):
+    location_id: int
+
+class BulkChangeResult(BaseModel):
+    device_id: int
+    result: str  # changed | unchanged | not_found
+
+class BulkChangeReport(BaseModel):
+    changed: int
+    unchanged: int
+    not_found: int
+    results: List[BulkChangeResult]
@@ -1,6 +1,6 @@
 from pydantic import BaseModel
-from typing import Optional
-from datetime import datetime
+from typing import List, Optional
+from datetime import date, datetime
 
 class AssignmentHistoryOut(BaseModel):
     id: int
@@ -14,3 +14,19 @@ class AssignmentHistoryOut(BaseModel):
 
     class Config:
         from_attributes = True  # Para Pydantic v2 (antes orm_mode = True)
+
+class AssignmentHistoryPage(BaseModel):
+    items: List[AssignmentHistoryOut]
+    next_cursor: Optional[str] = None  # None cuando no hay más páginas
+
+class DeviceHistoryDailyOut(BaseModel):
+    device_id: int
+    day: date  # en UTC
+    changes: int
+    status_changes: int
+    location_changes: int
+    last_status: Optional[str]  # estado al terminar el día
+    last_location_id: Optional[int]
+
+    class Config:
+        from_attributes = True
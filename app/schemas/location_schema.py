@@ -1,11 +1,18 @@
 from pydantic import BaseModel
+from typing import Optional
 
-class LocationCreate(BaseModel):
+class LocationUpdate(BaseModel):
     name: str
     description: str
 
+class LocationCreate(LocationUpdate):
+    parent_id: Optional[int] = None  # None: localización raíz
+
 class LocationOut(LocationCreate):
     id: int
 
     class Config:
         orm_mode = True
+
+class LocationMove(BaseModel):
+    parent_id: Optional[int]  # None: pasa a ser raíz
@@ -0,0 +1,12 @@
+from pydantic import BaseModel
+from typing import List, Optional
+
+class StatusCountOut(BaseModel):
+    status: Optional[str]
+    count: int
+
+class LocationStatsOut(BaseModel):
+    location_id: Optional[int]  # None: dispositivos sin localización
+    location_name: Optional[str]
+    total: int
+    by_status: List[StatusCountOut]
@@ -0,0 +1,75 @@
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Dict, Optional
+import asyncio
+import logging
+
+from ..config import AUDIT_BATCH_SIZE, AUDIT_FLUSH_INTERVAL_MS
+from ..database import SessionLocal
+from ..repositories.history_repository import HistoryRepository
+
+logger = logging.getLogger(__name__)
+
+# Clave del advisory lock que evita que varios workers muevan el outbox a la vez
+AUDIT_LOCK_KEY = 5_000_005
+
+class AuditService:
+    @staticmethod
+    async def flush(db: AsyncSession, batch_size: int = AUDIT_BATCH_SIZE) -> Optional[Dict[str, int]]:
+        """
+        Mueve el historial pendiente de history_outbox a sus tablas, en lotes
+        de `batch_size` filas con una transacción por lote, hasta vaciarlo.
+        Devuelve los totales movidos, o None si otro worker ya lo está haciendo.
+        """
+        totals: Dict[str, int] = {}
+        try:
+            while True:
+                locked = await db.execute(
+                    text("SELECT pg_try_advisory_xact_lock(:key)"), {"key": AUDIT_LOCK_KEY}
+                )
+                if not locked.scalar():
+                    await db.rollback()
+                    return totals or None
+
+                counts = await HistoryRepository.move_outbox(db, batch_size)
+                await db.commit()
+                for name, count in counts.items():
+                    totals[name] = totals.get(name, 0) + count
+                if counts["moved"] < batch_size:
+                    break
+
+            if totals["moved"]:
+                logger.info(f"Historial movido desde el outbox: {totals}")
+            return totals
+        except Exception as e:
+            await db.rollback()
+            logger.error(f"Error al mover el historial del outbox: {e}")
+            raise
+
+    @staticmethod
+    async def flush_pending():
+        """
+        Vaciado único, al arrancar con AUDIT_OUTBOX desactivado: mueve lo que
+        quedara en el outbox de cuando estaba activado.
+        """
+        try:
+            async with SessionLocal() as db:
+                await AuditService.flush(db)
+        except Exception as e:
+            logger.error(f"Error al vaciar el outbox del historial: {e}")
+
+    @staticmethod
+    async def run_periodic(interval_ms: int = AUDIT_FLUSH_INTERVAL_MS):
+        """
+        Tarea de fondo: vacía el outbox al arrancar (lo que quedara de una
+        ejecución anterior) y después cada `interval_ms`.
+        """
+        while True:
+            try:
+                async with SessionLocal() as db:
+                    await AuditService.flush(db)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error en la tarea periódica del historial: {e}")
+            await asyncio.sleep(interval_ms / 1000)
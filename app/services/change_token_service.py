@@ -0,0 +1,48 @@
+from datetime import datetime
+from typing import Optional, Tuple
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..repositories.change_token_repository import ChangeTokenRepository
+from ..repositories.history_repository import HistoryRepository
+from ..etag import make_etag
+
+class ChangeTokenService:
+    """
+    ETags de los recursos a partir de los tokens de cambio. Se leen antes que
+    los datos: si una escritura se confirma entre las dos lecturas, la
+    respuesta lleva el token anterior y la siguiente revalidación la descarga
+    de nuevo, nunca al revés.
+    """
+
+    @staticmethod
+    async def collection(db: AsyncSession, *scopes: str) -> Tuple[str, datetime]:
+        """
+        (ETag, Last-Modified) de un listado que depende de esos ámbitos.
+        """
+        rows = await ChangeTokenRepository.get_scopes(db, list(scopes))
+        if len(rows) != len(scopes):
+            raise RuntimeError(f"Faltan tokens de cambio para {sorted(set(scopes) - {row.scope for row in rows})}")
+        # Los contadores comparten la misma serie: basta el mayor
+        return make_etag(max(row.token for row in rows)), max(row.changed_at for row in rows)
+
+    @staticmethod
+    async def device(db: AsyncSession, device_id: int) -> Optional[str]:
+        """
+        ETag de un dispositivo (incluye su localización), o None si no existe.
+        """
+        tokens = await ChangeTokenRepository.get_device_tokens(db, device_id)
+        if tokens is None:
+            return None
+        device_token, location_token = tokens
+        return make_etag(device_token, location_token or 0)
+
+    @staticmethod
+    async def with_history(db: AsyncSession, etag: str, device_id: Optional[int] = None) -> str:
+        """
+        ETag de una respuesta que además incluye historial (expand=history):
+        el de los datos más el último id de historial, del dispositivo o de
+        todos. El historial no cambia los tokens (y con AUDIT_OUTBOX llega
+        después de la transacción que lo genera).
+        """
+        history_id = await HistoryRepository.get_last_id(db, device_id)
+        return etag[:-1] + f'-h{history_id}"'
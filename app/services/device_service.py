@@ -1,17 +1,48 @@
-from typing import Union, Dict, List, Any
+from typing import Union, Dict, List, Any, Optional
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import SQLAlchemyError
-from sqlalchemy import select
-from sqlalchemy.orm import selectinload
 import logging
 
 from ..models.device_model import Device
-from ..models.assignment_model import AssignmentHistory
-from ..schemas.device_schema import DeviceCreate, DeviceUpdate
+from ..schemas.device_schema import DeviceCreate, DeviceUpdate, DeviceOut, DeviceSelection, DeviceFieldset
+from ..config import DEVICE_EXPAND_HISTORY_LIMIT
+from ..cache import MISSING, device_cache, invalidate
 from ..repositories.port_repository import PortRepository
+from ..repositories.device_repository import DeviceRepository
+from ..repositories.history_repository import HistoryRepository
+from ..repositories.load_profiles import DEVICE_WITH_PORTS
+from ..pagination import DEFAULT_LIMIT, decode_cursor, encode_cursor
+from .history_service import HISTORY_OUT_COLUMNS
 
 logger = logging.getLogger(__name__)
 
+
+def _device_dict(row, fieldset: DeviceFieldset, ports: Optional[List], history: Optional[List]) -> Dict[str, Any]:
+    """
+    Dispositivo con los campos y relaciones de `fieldset`; con la forma por
+    defecto, la misma (claves y orden) que DeviceOut serializado.
+    """
+    device = {name: getattr(row, name) for name in fieldset.fields}
+    if "location" in fieldset.expand:
+        location = None
+        if row.location_id is not None:
+            location = {
+                "name": row.location_name,
+                "description": row.location_description,
+                "parent_id": row.location_parent_id,
+                "id": row.location_id,
+            }
+        device["location"] = location
+    if "ports" in fieldset.expand:
+        device["ports"] = [
+            {"port_number": port.port_number, "description": port.description, "id": port.id}
+            for port in ports
+        ]
+    if "history" in fieldset.expand:
+        device["history"] = [dict(entry._mapping) for entry in history]
+    return device
+
+
 class DeviceService:
     @staticmethod
     async def create_device(db: AsyncSession, device_data: DeviceCreate) -> Device:
@@ -26,20 +57,23 @@ class DeviceService:
             db.add(device)
             await db.flush()  # Necesario para que se genere el ID
 
+            # Estado inicial, para poder reconstruir el inventario en el tiempo
+            await HistoryRepository.bulk_create(db, [{
+                "device_id": device.id,
+                "action": "ALTA DE DISPOSITIVO",
+                "old_status": None,
+                "new_status": device.status,
+                "old_location_id": None,
+                "new_location_id": device.location_id,
+            }])
+
             if device_data.ports:
                 await PortRepository.replace_ports(db, device.id, device_data.ports)
 
             await db.commit()
-            await db.refresh(device)
 
-            # Recargar relaciones (puertos y localización)
-            result = await db.execute(
-                select(Device).where(Device.id == device.id).options(
-                    selectinload(Device.ports),
-                    selectinload(Device.location)
-                )
-            )
-            device = result.scalar_one()
+            # Cargar relaciones (puertos y localización)
+            device = await DeviceRepository.get_by_id(db, device.id, DEVICE_WITH_PORTS)
 
             logger.info(f"Dispositivo creado: {device.id}")
             return device
@@ -49,29 +83,82 @@ class DeviceService:
             raise
 
     @staticmethod
-    async def get_all_devices(db: AsyncSession) -> List[Device]:
+    async def get_all_devices(
+        db: AsyncSession,
+        limit: int = DEFAULT_LIMIT,
+        cursor: Optional[str] = None,
+        include_total: bool = False,
+        fast: bool = False,
+        fieldset: Optional[DeviceFieldset] = None,
+        **filters,
+    ) -> Dict[str, Any]:
+        """
+        Devuelve una página de dispositivos (keyset sobre id) y el cursor de la siguiente.
+        Con `fieldset` los elementos son dicts con esa forma, leídos como
+        tuplas (solo las columnas y relaciones pedidas) y listos para
+        fast_json.dumps; `fast` hace lo mismo con la forma de DeviceOut.
+        """
         try:
-            result = await db.execute(
-                select(Device).options(
-                    selectinload(Device.ports),
-                    selectinload(Device.location)
+            after_id = None
+            if cursor:
+                after_id = int(decode_cursor(cursor, ["id"])["id"])
+
+            if fieldset is None and fast:
+                fieldset = DeviceFieldset()
+            if fieldset is not None:
+                devices = await DeviceRepository.get_page_rows(
+                    db,
+                    limit=limit + 1,
+                    after_id=after_id,
+                    fields=fieldset.fields,
+                    location="location" in fieldset.expand,
+                    **filters,
                 )
-            )
-            return result.scalars().all()
+            else:
+                devices = await DeviceRepository.get_all(db, limit=limit + 1, after_id=after_id, **filters)
+
+            next_cursor = None
+            if len(devices) > limit:
+                devices = devices[:limit]
+                next_cursor = encode_cursor({"id": devices[-1].id})
+
+            if fieldset is not None:
+                devices = await DeviceService._shape(db, devices, fieldset)
+
+            total, total_is_estimate = None, False
+            if include_total:
+                total, total_is_estimate = await DeviceRepository.count(db, **filters)
+
+            return {
+                "items": devices,
+                "next_cursor": next_cursor,
+                "total": total,
+                "total_is_estimate": total_is_estimate,
+            }
         except Exception as e:
             logger.error(f"Error al obtener dispositivos: {e}")
             raise
 
+    @staticmethod
+    async def _shape(db: AsyncSession, rows: List, fieldset: DeviceFieldset) -> List[Dict[str, Any]]:
+        """
+        Dicts con la forma de `fieldset` para las filas de get_page_rows: una
+        consulta más por cada relación pedida (puertos, historial), ninguna si no se pide.
+        """
+        device_ids = [row.id for row in rows]
+        ports, history = {}, {}
+        if "ports" in fieldset.expand:
+            ports = await DeviceRepository.get_port_rows(db, device_ids)
+        if "history" in fieldset.expand:
+            history = await HistoryRepository.get_latest(
+                db, device_ids, DEVICE_EXPAND_HISTORY_LIMIT, HISTORY_OUT_COLUMNS
+            )
+        return [_device_dict(row, fieldset, ports.get(row.id), history.get(row.id)) for row in rows]
+
     @staticmethod
     async def get_device(db: AsyncSession, device_id: int) -> Union[Device, None]:
         try:
-            result = await db.execute(
-                select(Device).where(Device.id == device_id).options(
-                    selectinload(Device.ports),
-                    selectinload(Device.location)
-                )
-            )
-            return result.scalar_one_or_none()
+            return await DeviceRepository.get_by_id(db, device_id, DEVICE_WITH_PORTS)
         except Exception as e:
             logger.error(f"Error al obtener dispositivo {device_id}: {e}")
             raise
@@ -83,6 +170,7 @@ class DeviceService:
             if not device:
                 return {"error": "Dispositivo no encontrado"}
             await db.delete(device)
+            await invalidate(db, "devices", device_id)
             await db.commit()
             logger.info(f"Dispositivo eliminado: {device_id}")
             return {"mensaje": "Dispositivo eliminado correctamente"}
@@ -94,7 +182,8 @@ class DeviceService:
     @staticmethod
     async def update_device(db: AsyncSession, device_id: int, device_data: Union[DeviceUpdate, Dict[str, Any]]) -> Device:
         try:
-            device = await db.get(Device, device_id)
+            # Bloqueo antes de tocar los puertos: su trigger actualiza también la fila del dispositivo
+            device = await db.get(Device, device_id, with_for_update=True)
             if not device:
                 raise ValueError("Dispositivo no encontrado")
 
@@ -113,32 +202,23 @@ class DeviceService:
             if "ports" in data:
                 await PortRepository.replace_ports(db, device.id, data["ports"])
 
-            history_fields = {}
-            if "status" in data and data["status"] != old_status:
-                history_fields["old_status"] = old_status
-                history_fields["new_status"] = device.status
-            if "location_id" in data and data["location_id"] != old_location:
-                history_fields["old_location_id"] = old_location
-                history_fields["new_location_id"] = device.location_id
-
-            if history_fields:
-                history = AssignmentHistory(
-                    device_id=device.id,
-                    action="ACTUALIZACIÓN DE DISPOSITIVO",
-                    **history_fields
-                )
-                db.add(history)
-
+            # Cada fila de historial guarda el estado completo (status y localización)
+            status_changed = "status" in data and data["status"] != old_status
+            location_changed = "location_id" in data and data["location_id"] != old_location
+            if status_changed or location_changed:
+                await HistoryRepository.bulk_create(db, [{
+                    "device_id": device.id,
+                    "action": "ACTUALIZACIÓN DE DISPOSITIVO",
+                    "old_status": old_status,
+                    "new_status": device.status,
+                    "old_location_id": old_location,
+                    "new_location_id": device.location_id,
+                }])
+
+            await invalidate(db, "devices", device_id)
             await db.commit()
-            await db.refresh(device)
 
-            result = await db.execute(
-                select(Device).where(Device.id == device.id).options(
-                    selectinload(Device.ports),
-                    selectinload(Device.location)
-                )
-            )
-            device = result.scalar_one()
+            device = await DeviceRepository.get_by_id(db, device.id, DEVICE_WITH_PORTS)
 
             logger.info(f"Dispositivo actualizado: {device_id}")
             return device
@@ -157,30 +237,64 @@ class DeviceService:
             raise
 
     @staticmethod
-    async def change_status(db: AsyncSession, device_id: int, new_status: str):
-        try:
-            device = await db.get(Device, device_id)
-            if not device:
-                raise ValueError("Dispositivo no encontrado")
+    async def _update_one(db: AsyncSession, device_id: int, action: str, values: Dict[str, Any]) -> bool:
+        """
+        Aplica el cambio y su historial en una sola sentencia y hace commit.
+        Devuelve False si el dispositivo ya tenía esos valores.
+        """
+        rows = await DeviceRepository.update_with_history(db, [Device.id == device_id], action, values)
+        if not rows:
+            raise ValueError("Dispositivo no encontrado")
+        if rows[0].changed:
+            await invalidate(db, "devices", device_id)
+        await db.commit()
+        return rows[0].changed
 
-            old_status = device.status
-            if old_status == new_status:
-                return {"mensaje": f"El dispositivo ya tiene el estado '{new_status}'"}
-
-            device.status = new_status
-
-            history = AssignmentHistory(
-                device_id=device.id,
-                action="CAMBIO DE STATUS",
-                old_status=old_status,
-                new_status=new_status,
-                old_location_id=device.location_id,
-                new_location_id=device.location_id
-            )
-            db.add(history)
+    @staticmethod
+    async def bulk_change(db: AsyncSession, selection: DeviceSelection, action: str, values: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Aplica el mismo cambio a un conjunto de dispositivos (por IDs o por filtro)
+        en una sola sentencia y una sola transacción, con su historial.
+        """
+        try:
+            if selection.ids is not None:
+                criteria = DeviceRepository.filter_criteria(ids=selection.ids)
+            else:
+                criteria = DeviceRepository.filter_criteria(**selection.filter.model_dump(exclude_none=True))
+
+            rows = await DeviceRepository.update_with_history(db, criteria, action, values)
+            if any(row.changed for row in rows):
+                await invalidate(db, "devices")
             await db.commit()
-            await db.refresh(device)
-            return device
+
+            results = [
+                {"device_id": row.id, "result": "changed" if row.changed else "unchanged"}
+                for row in rows
+            ]
+            if selection.ids is not None:
+                found = {row.id for row in rows}
+                results.extend(
+                    {"device_id": device_id, "result": "not_found"}
+                    for device_id in dict.fromkeys(selection.ids) if device_id not in found
+                )
+
+            summary = {"changed": 0, "unchanged": 0, "not_found": 0}
+            for result in results:
+                summary[result["result"]] += 1
+            logger.info(f"{action} masivo: {summary['changed']} dispositivos modificados")
+            return {**summary, "results": results}
+
+        except Exception as e:
+            await db.rollback()
+            logger.error(f"Error en el cambio masivo ({action}): {e}")
+            raise
+
+    @staticmethod
+    async def change_status(db: AsyncSession, device_id: int, new_status: str):
+        try:
+            # Si ya tenía ese estado no se escribe nada y se devuelve tal cual (DeviceOut)
+            await DeviceService._update_one(db, device_id, "CAMBIO DE STATUS", {"status": new_status})
+            return await DeviceRepository.get_by_id(db, device_id, DEVICE_WITH_PORTS)
 
         except Exception as e:
             await db.rollback()
@@ -190,28 +304,10 @@ class DeviceService:
     @staticmethod
     async def assign_location(db: AsyncSession, device_id: int, location_id: int):
         try:
-            device = await db.get(Device, device_id)
-            if not device:
-                raise ValueError("Dispositivo no encontrado")
-
-            if device.location_id == location_id:
+            changed = await DeviceService._update_one(db, device_id, "ASIGNACIÓN DE LOCALIZACIÓN", {"location_id": location_id})
+            if not changed:
                 return {"mensaje": f"El dispositivo ya está en la localización {location_id}"}
-
-            history = AssignmentHistory(
-                device_id=device.id,
-                action="ASIGNACIÓN DE LOCALIZACIÓN",
-                old_location_id=device.location_id,
-                new_location_id=location_id,
-                old_status=device.status,
-                new_status=device.status
-            )
-
-            device.location_id = location_id
-            db.add(device)
-            db.add(history)
-            await db.commit()
-            await db.refresh(device)
-            return device
+            return await DeviceRepository.get_by_id(db, device_id, DEVICE_WITH_PORTS)
 
         except Exception as e:
             await db.rollback()
@@ -221,28 +317,10 @@ class DeviceService:
     @staticmethod
     async def change_location(db: AsyncSession, device_id: int, location_id: int):
         try:
-            device = await db.get(Device, device_id)
-            if not device:
-                raise ValueError("Dispositivo no encontrado")
-
-            if device.location_id == location_id:
+            changed = await DeviceService._update_one(db, device_id, "CAMBIO DE LOCALIZACIÓN", {"location_id": location_id})
+            if not changed:
                 return {"mensaje": f"El dispositivo ya está en la localización {location_id}"}
-
-            history = AssignmentHistory(
-                device_id=device.id,
-                action="CAMBIO DE LOCALIZACIÓN",
-                old_location_id=device.location_id,
-                new_location_id=location_id,
-                old_status=device.status,
-                new_status=device.status
-            )
-
-            device.location_id = location_id
-            db.add(device)
-            db.add(history)
-            await db.commit()
-            await db.refresh(device)
-            return device
+            return await DeviceRepository.get_by_id(db, device_id, DEVICE_WITH_PORTS)
 
         except Exception as e:
             await db.rollback()
@@ -250,15 +328,40 @@ class DeviceService:
             raise
 
     @staticmethod
-    async def get(db: AsyncSession, device_id: int) -> Device:
+    async def get(db: AsyncSession, device_id: int, version: Optional[str] = None) -> Optional[DeviceOut]:
+        """
+        DeviceOut del dispositivo, desde la caché si la entrada es de la misma
+        `version` (su ETag): otro worker puede no haber recibido aún la invalidación.
+        """
         try:
-            result = await db.execute(
-                select(Device).where(Device.id == device_id).options(
-                    selectinload(Device.ports),
-                    selectinload(Device.location)
-                )
+            cached = device_cache.get(device_id)
+            if cached is not MISSING and cached[0] == version:
+                return cached[1]
+
+            generation = device_cache.generation
+            device = await DeviceRepository.get_by_id(db, device_id, DEVICE_WITH_PORTS)
+            if device is None:
+                return None
+            device_out = DeviceOut.model_validate(device, from_attributes=True)
+            device_cache.set(device_id, (version, device_out), generation)
+            return device_out
+        except Exception as e:
+            logger.error(f"Error al obtener dispositivo {device_id}: {e}")
+            raise
+
+    @staticmethod
+    async def get_fields(db: AsyncSession, device_id: int, fieldset: DeviceFieldset) -> Optional[Dict[str, Any]]:
+        """
+        Dispositivo con la forma de `fieldset` (ver parse_fieldset), sin pasar
+        por la caché: solo se leen las columnas y relaciones pedidas.
+        """
+        try:
+            rows = await DeviceRepository.get_page_rows(
+                db, limit=1, fields=fieldset.fields, location="location" in fieldset.expand, ids=[device_id]
             )
-            return result.scalar_one_or_none()
+            if not rows:
+                return None
+            return (await DeviceService._shape(db, rows, fieldset))[0]
         except Exception as e:
             logger.error(f"Error al obtener dispositivo {device_id}: {e}")
             raise
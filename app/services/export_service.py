@@ -0,0 +1,105 @@
+from typing import AsyncIterator, List, Sequence
+from datetime import datetime
+import csv
+import io
+import json
+import logging
+
+from sqlalchemy import select, text
+
+from ..database import SessionLocal
+from ..models.device_model import Device
+from ..models.assignment_model import AssignmentHistory
+from ..repositories.device_repository import DeviceRepository
+
+logger = logging.getLogger(__name__)
+
+EXPORT_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+# Filas que se piden al cursor del servidor en cada viaje
+EXPORT_CHUNK_ROWS = 2000
+
+DEVICE_EXPORT_COLUMNS = [
+    Device.id,
+    Device.ip,
+    Device.status,
+    Device.description,
+    Device.protocol,
+    Device.location_id,
+]
+
+HISTORY_EXPORT_COLUMNS = [
+    AssignmentHistory.id,
+    AssignmentHistory.device_id,
+    AssignmentHistory.action,
+    AssignmentHistory.old_status,
+    AssignmentHistory.new_status,
+    AssignmentHistory.old_location_id,
+    AssignmentHistory.new_location_id,
+    AssignmentHistory.timestamp,
+]
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def _ndjson_chunk(names: List[str], rows: Sequence) -> bytes:
+    return "".join(
+        json.dumps(dict(zip(names, row)), default=_json_default, ensure_ascii=False) + "\n"
+        for row in rows
+    ).encode()
+
+
+def _csv_chunk(rows: Sequence) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerows(
+        [value.isoformat() if isinstance(value, datetime) else value for value in row]
+        for row in rows
+    )
+    return buffer.getvalue().encode()
+
+
+class ExportService:
+    @staticmethod
+    def stream_devices(fmt: str, **filters) -> AsyncIterator[bytes]:
+        stmt = select(*DEVICE_EXPORT_COLUMNS).order_by(Device.id)
+        stmt = DeviceRepository.apply_filters(stmt, **filters)
+        return ExportService._stream(stmt, fmt)
+
+    @staticmethod
+    def stream_history(fmt: str) -> AsyncIterator[bytes]:
+        stmt = select(*HISTORY_EXPORT_COLUMNS).order_by(AssignmentHistory.id)
+        return ExportService._stream(stmt, fmt)
+
+    @staticmethod
+    async def _stream(stmt, fmt: str) -> AsyncIterator[bytes]:
+        """
+        Recorre la consulta con un cursor del lado del servidor y emite
+        bloques ya serializados, sin construir modelos por fila.
+        La sesión se abre aquí porque el cuerpo se envía después de que
+        el endpoint haya retornado.
+        """
+        names = [column.name for column in stmt.selected_columns]
+        if fmt == "csv":
+            yield _csv_chunk([names])
+
+        try:
+            async with SessionLocal() as db:
+                # Una exportación completa puede superar DB_STATEMENT_TIMEOUT_MS
+                await db.execute(text("SET LOCAL statement_timeout = 0"))
+                result = await db.stream(stmt.execution_options(yield_per=EXPORT_CHUNK_ROWS))
+                async for rows in result.partitions():
+                    if fmt == "csv":
+                        yield _csv_chunk(rows)
+                    else:
+                        yield _ndjson_chunk(names, rows)
+        except Exception as e:
+            logger.error(f"Error al exportar: {e}")
+            raise
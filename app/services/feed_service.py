@@ -0,0 +1,128 @@
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+import asyncio
+import heapq
+import json
+import logging
+
+from sqlalchemy import select
+
+from ..database import SessionLocal
+from ..feed import feed_hub, row_to_dict
+from ..models.assignment_model import AssignmentHistory
+from ..models.location_history_model import LocationHistory
+from ..repositories.history_repository import HistoryRepository
+
+logger = logging.getLogger(__name__)
+
+FEED_KEEPALIVE_SECONDS = 15
+# Filas por tabla de cada página que se reenvía al reanudar
+FEED_REPLAY_LIMIT = 5000
+
+
+def parse_last_event_id(value: Optional[str]) -> Optional[Tuple[int, int]]:
+    """
+    El id de cada evento es "<último id de assignment_history>:<último id de location_history>".
+    """
+    if not value:
+        return None
+    try:
+        assignment_id, location_id = value.split(":")
+        return int(assignment_id), int(location_id)
+    except ValueError:
+        raise ValueError("Last-Event-ID inválido")
+
+
+def _format_event(kind: str, row: Dict[str, Any], cursor: Dict[str, int]) -> str:
+    data = json.dumps({"kind": kind, "row": row}, ensure_ascii=False)
+    return f"id: {cursor['assignment']}:{cursor['location']}\nevent: {kind}\ndata: {data}\n\n"
+
+
+class FeedService:
+    @staticmethod
+    async def _last_ids() -> Tuple[int, int]:
+        async with SessionLocal() as db:
+            return await HistoryRepository.get_last_ids(db)
+
+    @staticmethod
+    async def _replay_page(
+        cursor: Dict[str, int], device_id: Optional[int], location_id: Optional[int]
+    ) -> Tuple[List[Tuple[str, Dict[str, Any]]], bool]:
+        """
+        Siguiente página de filas posteriores a `cursor`, hasta FEED_REPLAY_LIMIT
+        por tabla. Cada tabla va en orden de id y las dos se intercalan por
+        timestamp sin reordenar ninguna, así el cursor (el máximo id enviado de
+        cada tabla) nunca salta filas sin enviar. Devuelve (eventos, hay_más).
+        """
+        assignment_cols = [column for column in AssignmentHistory.__table__.c]
+        location_cols = [column for column in LocationHistory.__table__.c]
+
+        async with SessionLocal() as db:
+            stmt = HistoryRepository.apply_filters(
+                select(*assignment_cols), device_id=device_id, location_id=location_id
+            )
+            stmt = (
+                stmt.where(AssignmentHistory.id > cursor["assignment"])
+                .order_by(AssignmentHistory.id)
+                .limit(FEED_REPLAY_LIMIT)
+            )
+            assignment_rows = [row_to_dict(row) for row in (await db.execute(stmt)).all()]
+
+            location_rows = []
+            if device_id is None:
+                stmt = select(*location_cols).where(LocationHistory.id > cursor["location"])
+                if location_id is not None:
+                    stmt = stmt.where(LocationHistory.location_id == location_id)
+                stmt = stmt.order_by(LocationHistory.id).limit(FEED_REPLAY_LIMIT)
+                location_rows = [row_to_dict(row) for row in (await db.execute(stmt)).all()]
+
+        events = list(heapq.merge(
+            [("assignment", row) for row in assignment_rows],
+            [("location", row) for row in location_rows],
+            key=lambda event: event[1]["timestamp"] or "",
+        ))
+        more = len(assignment_rows) == FEED_REPLAY_LIMIT or len(location_rows) == FEED_REPLAY_LIMIT
+        return events, more
+
+    @staticmethod
+    async def stream(
+        device_id: Optional[int] = None,
+        location_id: Optional[int] = None,
+        last_event_id: Optional[Tuple[int, int]] = None,
+    ) -> AsyncIterator[str]:
+        """
+        Stream SSE de filas nuevas de historial. Con `last_event_id` se reenvían
+        primero, por páginas y hasta ponerse al día, las filas posteriores desde
+        la base de datos y después se sigue en vivo sin duplicados. Sin él, el
+        cursor de los eventos empieza en las últimas filas existentes.
+        """
+        # Suscribirse antes de consultar para no perder lo que llegue mientras tanto
+        subscriber = feed_hub.subscribe(device_id, location_id)
+        cursor = {"assignment": 0, "location": 0}
+        replayed = {"assignment": set(), "location": set()}
+        try:
+            if last_event_id is not None:
+                cursor["assignment"], cursor["location"] = last_event_id
+                more = True
+                while more:
+                    events, more = await FeedService._replay_page(cursor, device_id, location_id)
+                    for kind, row in events:
+                        replayed[kind].add(row["id"])
+                        cursor[kind] = max(cursor[kind], row["id"])
+                        yield _format_event(kind, row, cursor)
+            else:
+                # Un cliente nuevo que se reconecte solo debe recibir lo posterior a este momento
+                cursor["assignment"], cursor["location"] = await FeedService._last_ids()
+
+            while not subscriber.overflowed:
+                try:
+                    kind, row = await asyncio.wait_for(subscriber.queue.get(), FEED_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+
+                if row["id"] in replayed[kind]:
+                    continue  # ya enviado en la reanudación
+                cursor[kind] = max(cursor[kind], row["id"])
+                yield _format_event(kind, row, cursor)
+        finally:
+            feed_hub.unsubscribe(subscriber)
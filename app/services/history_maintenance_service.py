@@ -0,0 +1,148 @@
+from sqlalchemy import func, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import date
+from typing import Any, Dict, List, Optional
+import asyncio
+import logging
+
+from ..config import (
+    HISTORY_ARCHIVE_DIR,
+    HISTORY_MAINTENANCE_SECONDS,
+    HISTORY_PARTITION_MONTHS_AHEAD,
+    HISTORY_RETENTION_MONTHS,
+)
+from ..database import SessionLocal
+from ..models.assignment_model import AssignmentHistory
+from ..models.location_history_model import LocationHistory
+from ..models.partitions import add_months, month_bounds, partition_name
+from ..repositories.history_repository import HistoryRepository
+from ..repositories.partition_repository import PartitionRepository
+from ..repositories.snapshot_repository import SnapshotRepository
+
+logger = logging.getLogger(__name__)
+
+# Clave del advisory lock que evita que varios workers toquen las particiones a la vez
+HISTORY_MAINTENANCE_LOCK_KEY = 5_000_006
+
+# Tablas de historial particionadas por mes
+PARTITIONED_TABLES = (AssignmentHistory.__table__, LocationHistory.__table__)
+
+class HistoryMaintenanceService:
+    @staticmethod
+    async def _lock(db: AsyncSession) -> bool:
+        locked = await db.execute(
+            text("SELECT pg_try_advisory_xact_lock(:key)"), {"key": HISTORY_MAINTENANCE_LOCK_KEY}
+        )
+        return bool(locked.scalar())
+
+    @staticmethod
+    async def maintain(
+        db: AsyncSession,
+        months_ahead: int = HISTORY_PARTITION_MONTHS_AHEAD,
+        retention_months: int = HISTORY_RETENTION_MONTHS,
+        archive_dir: Optional[str] = HISTORY_ARCHIVE_DIR,
+    ) -> Optional[Dict[str, List]]:
+        """
+        Crea las particiones mensuales del mes en curso y los `months_ahead`
+        siguientes (y las de los meses que hayan caído en la DEFAULT) y, con
+        `retention_months` > 0, expira las de los meses anteriores a los
+        `retention_months` completos más recientes (ver expire). Una
+        transacción para crear y dos por partición expirada.
+        Devuelve {"created": [particiones], "expired": [resultados de expire]},
+        o None si otro worker ya lo está haciendo.
+        """
+        summary: Dict[str, List] = {"created": [], "expired": []}
+        try:
+            if not await HistoryMaintenanceService._lock(db):
+                await db.rollback()
+                return None
+
+            now = (await db.execute(select(func.timezone("UTC", func.now())))).scalar_one()
+            current = date(now.year, now.month, 1)
+            wanted = {add_months(current, offset) for offset in range(months_ahead + 1)}
+
+            for table in PARTITIONED_TABLES:
+                existing = set(await PartitionRepository.get_months(db, table))
+                pending = set(await PartitionRepository.get_default_months(db, table))
+                for month in sorted((wanted | pending) - existing):
+                    summary["created"].append(await PartitionRepository.create(db, table, month))
+            await db.commit()
+
+            if retention_months > 0:
+                cutoff = add_months(current, -retention_months)
+                expired = []
+                for table in PARTITIONED_TABLES:
+                    months = await PartitionRepository.get_months(db, table)
+                    expired.extend((month, table) for month in months if month < cutoff)
+                await db.rollback()
+
+                # Del mes más antiguo al más reciente, para que el horizonte solo avance
+                for month, table in sorted(expired, key=lambda item: (item[0], item[1].name)):
+                    expired_partition = await HistoryMaintenanceService.expire(db, table, month, archive_dir)
+                    if expired_partition is None:
+                        break
+                    summary["expired"].append(expired_partition)
+
+            if summary["created"] or summary["expired"]:
+                logger.info(f"Mantenimiento de particiones del historial: {summary}")
+            return summary
+        except Exception as e:
+            await db.rollback()
+            logger.error(f"Error en el mantenimiento de particiones del historial: {e}")
+            raise
+
+    @staticmethod
+    async def expire(
+        db: AsyncSession, table, month: date, archive_dir: Optional[str] = None
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Expira la partición del mes de `table`. Para assignment_history antes
+        guarda su resumen diario y un checkpoint base al final del mes, de
+        modo que las consultas "as_of" posteriores siguen siendo exactas, y
+        borra los checkpoints anteriores. Con `archive_dir` copia la partición
+        a un CSV comprimido y la elimina; sin él solo la separa de la tabla.
+
+        Hace commit de dos transacciones, cada una con el lock de
+        mantenimiento. La primera guarda resumen, checkpoint y archivo, y se
+        puede repetir. La segunda solo separa o elimina la partición con los
+        locks de las tablas referenciadas tomados antes que ningún otro: en la
+        primera las FK del resumen ya bloquean filas de devices, y los
+        escritores que esperan esas filas no dejarían tomar esos locks.
+        Devuelve {"partition", "daily_rows"?, "archive"?}, o None si otro
+        worker tiene el lock o ya expiró la partición.
+        """
+        start, end = month_bounds(month)
+        result: Dict[str, Any] = {"partition": partition_name(table.name, month)}
+
+        if not await HistoryMaintenanceService._lock(db):
+            await db.rollback()
+            return None
+        if table is AssignmentHistory.__table__:
+            result["daily_rows"] = await HistoryRepository.rollup_daily(db, start, end)
+            checkpoint = await SnapshotRepository.create_base_checkpoint(db, end)
+            await SnapshotRepository.delete_before(db, checkpoint.taken_at)
+        if archive_dir:
+            result["archive"] = await PartitionRepository.archive(db, table, month, archive_dir)
+        await db.commit()
+
+        if not await HistoryMaintenanceService._lock(db) or month not in await PartitionRepository.get_months(db, table):
+            await db.rollback()
+            return None
+        await PartitionRepository.detach(db, table, month, drop=bool(archive_dir))
+        await db.commit()
+        return result
+
+    @staticmethod
+    async def run_periodic(interval_seconds: int = HISTORY_MAINTENANCE_SECONDS):
+        """
+        Tarea de fondo: mantenimiento al arrancar y después cada `interval_seconds`.
+        """
+        while True:
+            try:
+                async with SessionLocal() as db:
+                    await HistoryMaintenanceService.maintain(db)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error en la tarea periódica de particiones del historial: {e}")
+            await asyncio.sleep(interval_seconds)
@@ -1,18 +1,85 @@
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-from typing import List
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Any, Dict, List, Optional
 import logging
 
 from ..models.assignment_model import AssignmentHistory
+from ..repositories.history_repository import HistoryRepository
+from ..repositories.snapshot_repository import SnapshotRepository
+from ..pagination import DEFAULT_LIMIT, decode_cursor, encode_cursor
 
 logger = logging.getLogger(__name__)
 
+# Columnas de AssignmentHistoryOut, en su orden, para la salida FAST_JSON
+HISTORY_OUT_COLUMNS = [
+    AssignmentHistory.id,
+    AssignmentHistory.device_id,
+    AssignmentHistory.action,
+    AssignmentHistory.old_status,
+    AssignmentHistory.new_status,
+    AssignmentHistory.old_location_id,
+    AssignmentHistory.new_location_id,
+    AssignmentHistory.timestamp,
+]
+
 class HistoryService:
     @staticmethod
-    async def get_all(db: AsyncSession) -> List[AssignmentHistory]:
+    async def get_page(
+        db: AsyncSession,
+        limit: int = DEFAULT_LIMIT,
+        cursor: Optional[str] = None,
+        fast: bool = False,
+        **filters,
+    ) -> Dict[str, Any]:
+        """
+        Devuelve una página del historial filtrado y el cursor de la siguiente.
+        Con `fast` los elementos son dicts listos para fast_json.dumps.
+        """
         try:
-            result = await db.execute(select(AssignmentHistory).order_by(AssignmentHistory.timestamp.desc()))
-            return result.scalars().all()
+            before = None
+            if cursor:
+                values = decode_cursor(cursor, ["ts", "id"])
+                before = (datetime.fromisoformat(values["ts"]), int(values["id"]))
+
+            columns = HISTORY_OUT_COLUMNS if fast else None
+            rows = await HistoryRepository.get_page(db, limit=limit + 1, before=before, columns=columns, **filters)
+
+            next_cursor = None
+            if len(rows) > limit:
+                rows = rows[:limit]
+                last = rows[-1]
+                next_cursor = encode_cursor({"ts": last.timestamp.isoformat(), "id": last.id})
+
+            if fast:
+                rows = [dict(row._mapping) for row in rows]
+            return {"items": rows, "next_cursor": next_cursor}
         except Exception as e:
             logger.error(f"Error al obtener historial: {e}")
             raise
+
+    @staticmethod
+    async def get_daily(
+        db: AsyncSession,
+        device_id: Optional[int] = None,
+        since: Optional[date] = None,
+        until: Optional[date] = None,
+    ) -> List:
+        """
+        Resumen diario por dispositivo entre los días `since` y `until`
+        (incluidos, en UTC). Los días de historial expirado salen del resumen
+        guardado al expirar; los demás se calculan sobre el historial.
+        """
+        try:
+            if since is not None and until is not None and since > until:
+                raise ValueError("since no puede ser posterior a until")
+            horizon = await SnapshotRepository.get_horizon(db)
+            return await HistoryRepository.get_daily(
+                db,
+                horizon,
+                device_id=device_id,
+                since=datetime.combine(since, time(), timezone.utc) if since else None,
+                until=datetime.combine(until + timedelta(days=1), time(), timezone.utc) if until else None,
+            )
+        except Exception as e:
+            logger.error(f"Error al obtener el resumen diario del historial: {e}")
+            raise
@@ -0,0 +1,187 @@
+from typing import Any, Dict, List, Optional
+from sqlalchemy.ext.asyncio import AsyncSession
+from pydantic import ValidationError
+import csv
+import io
+import logging
+
+from ..schemas.device_schema import DeviceCreate
+from ..repositories.device_repository import DeviceRepository
+from ..repositories.history_repository import HistoryRepository
+from ..repositories.port_repository import PortRepository
+from ..cache import invalidate
+
+logger = logging.getLogger(__name__)
+
+# Filas por transacción; 1000 filas x 5 columnas queda lejos del límite de parámetros
+BULK_BATCH_SIZE = 1000
+
+
+def parse_csv(content: str) -> List[Dict[str, Any]]:
+    """
+    Convierte un CSV con cabecera ip,status,description,protocol,location_id,ports
+    en filas. `ports` tiene el formato "22:SSH;80:HTTP".
+    """
+    rows = []
+    for record in csv.DictReader(io.StringIO(content)):
+        row: Dict[str, Any] = {key: value for key, value in record.items() if key}
+        if not row.get("location_id"):
+            row["location_id"] = None
+
+        ports = []
+        for item in (row.get("ports") or "").split(";"):
+            if item.strip():
+                number, _, description = item.partition(":")
+                ports.append({"port_number": number.strip(), "description": description.strip()})
+        row["ports"] = ports
+        rows.append(row)
+    return rows
+
+
+class _ConcurrentInsert(Exception):
+    pass
+
+
+def _validation_message(error: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in item['loc'])}: {item['msg']}" for item in error.errors()
+    )
+
+
+class ImportService:
+    @staticmethod
+    async def import_devices(db: AsyncSession, rows: List[Any]) -> Dict[str, Any]:
+        """
+        Alta/actualización masiva de dispositivos por IP.
+        Cada lote se valida y se escribe en una transacción con sentencias multi-fila.
+        """
+        results: List[Dict[str, Any]] = []
+        for start in range(0, len(rows), BULK_BATCH_SIZE):
+            batch = rows[start:start + BULK_BATCH_SIZE]
+            results.extend(await ImportService._import_batch(db, batch, start))
+
+        summary = {"created": 0, "updated": 0, "unchanged": 0, "error": 0}
+        for result in results:
+            summary[result["result"]] += 1
+        return {**summary, "results": results}
+
+    @staticmethod
+    async def _import_batch(db: AsyncSession, batch: List[Any], offset: int) -> List[Dict[str, Any]]:
+        results: List[Dict[str, Any]] = []
+        valid: Dict[str, Any] = {}  # ip -> (índice, DeviceCreate)
+
+        for index, raw in enumerate(batch, start=offset):
+            ip: Optional[str] = raw.get("ip") if isinstance(raw, dict) else None
+            try:
+                device = DeviceCreate.model_validate(raw)
+            except ValidationError as ve:
+                results.append({"row": index, "ip": ip, "result": "error", "error": _validation_message(ve)})
+                continue
+
+            if device.ip in valid:
+                results.append({"row": index, "ip": device.ip, "result": "error", "error": "IP duplicada en la importación"})
+                continue
+            valid[device.ip] = (index, device)
+
+        if not valid:
+            return results
+
+        error = None
+        # Un reintento: si otra transacción insertó a la vez alguna IP, al repetir ya se bloquea
+        for _ in range(2):
+            try:
+                written = await ImportService._write_batch(db, valid)
+                await db.commit()
+                results.extend(written)
+                error = None
+                break
+            except _ConcurrentInsert as ci:
+                await db.rollback()
+                error = str(ci)
+            except Exception as e:
+                await db.rollback()
+                logger.error(f"Error en la importación masiva (filas {offset}-{offset + len(batch) - 1}): {e}")
+                error = str(e)
+                break
+
+        if error is not None:
+            results.extend(
+                {"row": index, "ip": ip, "result": "error", "error": error}
+                for ip, (index, _) in valid.items()
+            )
+        results.sort(key=lambda result: result["row"])
+        return results
+
+    @staticmethod
+    async def _write_batch(db: AsyncSession, valid: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        Escribe las filas válidas del lote (dispositivos, puertos e historial)
+        sin hacer commit y devuelve su resultado. Una fila es "unchanged" solo
+        si ni sus campos ni sus puertos cambian; sus puertos no se tocan.
+        Lanza _ConcurrentInsert si otra transacción insertó a la vez alguna de las IPs.
+        """
+        existing = await DeviceRepository.lock_by_ips(db, list(valid))
+        written = await DeviceRepository.bulk_upsert(db, [
+            {
+                "ip": device.ip,
+                "status": device.status,
+                "description": device.description,
+                "protocol": device.protocol,
+                "location_id": device.location_id,
+            }
+            for _, device in valid.values()
+        ])
+
+        # Ni bloqueada antes ni insertada aquí: la insertó otra transacción después del
+        # bloqueo (ON CONFLICT esperó a su commit) y no se tienen sus valores anteriores
+        if any(ip not in existing and not (ip in written and written[ip].inserted) for ip in valid):
+            raise _ConcurrentInsert("Otra transacción insertó a la vez alguna de las IPs del lote")
+
+        current_ports = await DeviceRepository.get_port_rows(db, [old.id for old in existing.values()])
+
+        results: List[Dict[str, Any]] = []
+        history_rows = []
+        ports_by_device = {}
+        for ip, (index, device) in valid.items():
+            old = existing.get(ip)
+            if old is None:
+                device_id = written[ip].id
+                outcome = "created"
+                history_rows.append({
+                    "device_id": device_id,
+                    "action": "ALTA DE DISPOSITIVO",
+                    "old_status": None,
+                    "new_status": device.status,
+                    "old_location_id": None,
+                    "new_location_id": device.location_id,
+                })
+                if device.ports:
+                    ports_by_device[device_id] = device.ports
+            else:
+                device_id = old.id
+                ports_changed = (
+                    {(port.port_number, port.description) for port in current_ports[device_id]}
+                    != {(port.port_number, port.description) for port in device.ports}
+                )
+                if ports_changed:
+                    ports_by_device[device_id] = device.ports
+                if ip in written or ports_changed:
+                    outcome = "updated"
+                    if old.status != device.status or old.location_id != device.location_id:
+                        history_rows.append({
+                            "device_id": device_id,
+                            "action": "ACTUALIZACIÓN DE DISPOSITIVO",
+                            "old_status": old.status,
+                            "new_status": device.status,
+                            "old_location_id": old.location_id,
+                            "new_location_id": device.location_id,
+                        })
+                else:
+                    outcome = "unchanged"
+            results.append({"row": index, "ip": ip, "result": outcome, "device_id": device_id})
+
+        await PortRepository.sync_ports(db, ports_by_device)
+        await HistoryRepository.bulk_create(db, history_rows)
+        if any(result["result"] == "updated" for result in results):
+            await invalidate(db, "devices")
+        return results
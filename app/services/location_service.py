@@ -1,8 +1,22 @@
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import delete, exists, select
+from typing import List, Optional
+import logging
+
+from ..models.device_model import Device
 from ..models.location_model import Location
 from ..models.location_history_model import LocationHistory  # ✅ Nuevo modelo de historial
-from ..schemas.location_schema import LocationCreate
+from ..schemas.location_schema import LocationCreate, LocationOut, LocationUpdate
+from ..repositories.device_repository import DeviceRepository
+from ..repositories.location_repository import LocationRepository
+from ..repositories.history_repository import HistoryRepository
+from ..cache import MISSING, invalidate, location_cache
+from ..fast_json import dumps
+
+logger = logging.getLogger(__name__)
+
+# Qué hacer con los dispositivos de una localización que se elimina
+DELETE_MODES = ("restrict", "detach", "reassign")
 
 class LocationService:
     @staticmethod
@@ -11,16 +25,48 @@ class LocationService:
         if existing.scalar():
             raise ValueError("Ya existe una localización con ese nombre")
 
-        new_loc = Location(name=location.name, description=location.description)
+        if location.parent_id is not None and await db.get(Location, location.parent_id) is None:
+            raise ValueError("Localización padre no encontrada")
+
+        new_loc = Location(name=location.name, description=location.description, parent_id=location.parent_id)
         db.add(new_loc)
+        await db.flush()
+        await LocationRepository.add_to_tree(db, new_loc.id, location.parent_id)
+        await invalidate(db, "locations")
         await db.commit()
         await db.refresh(new_loc)
         return new_loc
 
     @staticmethod
-    async def get_all(db: AsyncSession):
+    async def get_all(db: AsyncSession, version: Optional[str] = None):
+        """
+        Todas las localizaciones; la caché solo se usa si es de la misma
+        `version` (ETag del listado).
+        """
+        cached = location_cache.get("all")
+        if cached is not MISSING and cached[0] == version:
+            return cached[1]
+
+        generation = location_cache.generation
         result = await db.execute(select(Location))
-        return result.scalars().all()
+        locations = [LocationOut.model_validate(loc, from_attributes=True) for loc in result.scalars().all()]
+        location_cache.set("all", (version, locations), generation)
+        return locations
+
+    @staticmethod
+    async def get_all_json(db: AsyncSession, version: Optional[str] = None) -> bytes:
+        """
+        Lo mismo que get_all ya serializado (FAST_JSON): se cachean los bytes.
+        """
+        cached = location_cache.get("all:json")
+        if cached is not MISSING and cached[0] == version:
+            return cached[1]
+
+        generation = location_cache.generation
+        result = await db.execute(select(Location.name, Location.description, Location.parent_id, Location.id))
+        content = dumps([dict(row._mapping) for row in result.all()])
+        location_cache.set("all:json", (version, content), generation)
+        return content
 
     @staticmethod
     async def get_by_name(db: AsyncSession, name: str):
@@ -29,10 +75,20 @@ class LocationService:
 
     @staticmethod
     async def get(db: AsyncSession, location_id: int):
-        return await db.get(Location, location_id)
+        cached = location_cache.get(location_id)
+        if cached is not MISSING:
+            return cached
+
+        generation = location_cache.generation
+        location = await db.get(Location, location_id)
+        if location is None:
+            return None
+        location_out = LocationOut.model_validate(location, from_attributes=True)
+        location_cache.set(location_id, location_out, generation)
+        return location_out
 
     @staticmethod
-    async def update(db: AsyncSession, location_id: int, location: LocationCreate):
+    async def update(db: AsyncSession, location_id: int, location: LocationUpdate):
         """
         Actualiza nombre y descripción de una localización.
         Guarda en historial si hay cambios.
@@ -48,32 +104,138 @@ class LocationService:
         if existing.scalar():
             raise ValueError("Ya existe otra localización con ese nombre")
 
-        # Guardar historial si hay cambios
-        if location_obj.name != location.name or location_obj.description != location.description:
-            history = LocationHistory(
-                location_id=location_obj.id,
-                action="EDICIÓN DE LOCALIZACIÓN",
-                old_name=location_obj.name,
-                new_name=location.name,
-                old_description=location_obj.description,
-                new_description=location.description
-            )
-            db.add(history)
+        changed = location_obj.name != location.name or location_obj.description != location.description
+        old_name, old_description = location_obj.name, location_obj.description
 
-        # Actualiza datos
+        # Actualiza datos; antes que el historial, en el mismo orden que el
+        # resto de escrituras (ver PartitionRepository._lock_for_ddl)
         location_obj.name = location.name
         location_obj.description = location.description
         db.add(location_obj)
+        await db.flush()
+
+        # Guardar historial si hay cambios
+        if changed:
+            await HistoryRepository.bulk_create(db, [{
+                "location_id": location_obj.id,
+                "action": "EDICIÓN DE LOCALIZACIÓN",
+                "old_name": old_name,
+                "new_name": location.name,
+                "old_description": old_description,
+                "new_description": location.description,
+            }], model=LocationHistory)
 
+        # Los dispositivos en caché incluyen su localización
+        await invalidate(db, "locations")
+        await invalidate(db, "devices")
         await db.commit()
         await db.refresh(location_obj)
         return location_obj
 
     @staticmethod
-    async def delete(db: AsyncSession, location_id: int):
-        location = await db.get(Location, location_id)
-        if not location:
-            return False
-        await db.delete(location)
-        await db.commit()
-        return True
+    async def get_subtree(db: AsyncSession, location_id: int) -> Optional[List[LocationOut]]:
+        """
+        La localización y todos sus descendientes, de la raíz a las hojas.
+        """
+        rows = await LocationRepository.get_subtree(db, location_id)
+        if not rows:
+            return None
+        return [LocationOut.model_validate(row.Location, from_attributes=True) for row in rows]
+
+    @staticmethod
+    async def move(db: AsyncSession, location_id: int, parent_id: Optional[int]) -> Optional[Location]:
+        """
+        Mueve la localización, con todo su subárbol, bajo `parent_id` (None: raíz).
+        Los dispositivos no cambian de localización, así que no hay historial de asignación.
+        """
+        try:
+            if parent_id is not None and await db.get(Location, parent_id) is None:
+                raise ValueError("Localización padre no encontrada")
+
+            moved = await LocationRepository.move_subtree(db, location_id, parent_id)
+            if not moved:
+                await db.rollback()
+                return None
+
+            # Los dispositivos en caché incluyen su localización (con parent_id)
+            await invalidate(db, "locations")
+            await invalidate(db, "devices")
+            await db.commit()
+            return await db.get(Location, location_id, populate_existing=True)
+        except Exception:
+            await db.rollback()
+            raise
+
+    @staticmethod
+    async def delete(
+        db: AsyncSession,
+        location_id: int,
+        on_devices: str = "restrict",
+        target_location_id: Optional[int] = None,
+    ):
+        """
+        Elimina una localización sin cargar sus dependientes en memoria.
+
+        - restrict: falla si tiene dispositivos.
+        - detach: sus dispositivos quedan sin localización.
+        - reassign: sus dispositivos pasan a `target_location_id`.
+
+        Los dispositivos se mueven en una sola sentencia con una fila de
+        historial por dispositivo; el historial existente se conserva.
+        """
+        if on_devices not in DELETE_MODES:
+            raise ValueError(f"Modo de borrado no válido: {on_devices}")
+        if on_devices == "reassign" and target_location_id is None:
+            raise ValueError("Falta la localización de destino")
+        if on_devices != "reassign" and target_location_id is not None:
+            raise ValueError("La localización de destino solo se usa al reasignar")
+        if target_location_id == location_id:
+            raise ValueError("La localización de destino es la que se elimina")
+
+        try:
+            # Bloquea la localización (y el destino, en orden de id) para que no
+            # se le asignen dispositivos ni desaparezca el destino mientras tanto
+            ids = [location_id] if target_location_id is None else [location_id, target_location_id]
+            locked = await db.execute(
+                select(Location.id).where(Location.id.in_(ids)).order_by(Location.id).with_for_update()
+            )
+            locked_ids = set(locked.scalars().all())
+            if location_id not in locked_ids:
+                await db.rollback()
+                return False
+
+            has_children = await db.execute(select(exists().where(Location.parent_id == location_id)))
+            if has_children.scalar():
+                raise ValueError("La localización tiene sublocalizaciones; muévelas o elimínalas antes")
+
+            moved = 0
+            if on_devices == "restrict":
+                in_use = await db.execute(select(exists().where(Device.location_id == location_id)))
+                if in_use.scalar():
+                    raise ValueError("La localización tiene dispositivos asignados")
+            else:
+                if on_devices == "reassign":
+                    if target_location_id not in locked_ids:
+                        raise ValueError("Localización de destino no encontrada")
+                    action = "REASIGNACIÓN POR BAJA DE LOCALIZACIÓN"
+                else:
+                    action = "DESASIGNACIÓN POR BAJA DE LOCALIZACIÓN"
+
+                rows = await DeviceRepository.update_with_history(
+                    db,
+                    DeviceRepository.filter_criteria(location_id=location_id),
+                    action,
+                    {"location_id": target_location_id},
+                )
+                moved = len(rows)
+
+            await db.execute(delete(Location).where(Location.id == location_id))
+            await invalidate(db, "locations")
+            if moved:
+                await invalidate(db, "devices")
+            await db.commit()
+            logger.info(f"Localización {location_id} eliminada ({on_devices}): {moved} dispositivos movidos")
+            return True
+        except Exception:
+            await db.rollback()
+            raise
@@ -0,0 +1,222 @@
+from contextlib import asynccontextmanager
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Any, AsyncIterator, Dict, Iterable, List, NamedTuple, Optional
+import asyncio
+import logging
+import time
+
+from ..cache import invalidate
+from ..config import (
+    PROBE_INTERVAL_SECONDS,
+    PROBE_CONCURRENCY,
+    PROBE_TIMEOUT_MS,
+    PROBE_HOST_INTERVAL_MS,
+    PROBE_SWEEP_BUDGET_SECONDS,
+)
+from ..database import SessionLocal, engine
+from ..models.device_model import Device
+from ..repositories.device_repository import DeviceRepository
+
+logger = logging.getLogger(__name__)
+
+# Clave del advisory lock que evita que varios workers sondeen a la vez
+PROBE_LOCK_KEY = 5_000_002
+
+PROBE_ACTION = "CAMBIO DE STATUS (SONDEO)"
+STATUS_UP = "activo"
+STATUS_DOWN = "inactivo"
+# Solo se sondean (y se tocan) dispositivos en estos status; el resto se gestiona a mano
+PROBED_STATUSES = [STATUS_UP, STATUS_DOWN]
+
+# Puerto TCP según el protocolo, para dispositivos sin puertos registrados
+PROTOCOL_DEFAULT_PORTS = {
+    "ssh": 22,
+    "telnet": 23,
+    "http": 80,
+    "https": 443,
+}
+
+
+class ProbeTarget(NamedTuple):
+    id: int
+    ip: str
+    ports: List[int]
+
+
+def target_ports(protocol: Optional[str], ports: Iterable[int]) -> List[int]:
+    ports = sorted(set(ports))
+    if ports:
+        return ports
+    default = PROTOCOL_DEFAULT_PORTS.get((protocol or "").lower())
+    return [default] if default is not None else []
+
+
+async def check_port(ip: str, port: int, timeout: float) -> bool:
+    """
+    True si se completa una conexión TCP a ip:port antes de `timeout` segundos.
+    """
+    try:
+        _, writer = await asyncio.wait_for(asyncio.open_connection(ip, port), timeout)
+    except (OSError, asyncio.TimeoutError):
+        return False
+    writer.close()
+    try:
+        await writer.wait_closed()
+    except OSError:
+        pass
+    return True
+
+
+async def probe_host(ip: str, ports: List[int], timeout: float, host_interval: float) -> bool:
+    """
+    Prueba los puertos del host de uno en uno, con `host_interval` segundos
+    entre intentos, y para en el primero que responde.
+    """
+    for index, port in enumerate(ports):
+        if index:
+            await asyncio.sleep(host_interval)
+        if await check_port(ip, port, timeout):
+            return True
+    return False
+
+
+async def probe_all(
+    targets: List[ProbeTarget],
+    concurrency: int = PROBE_CONCURRENCY,
+    timeout: float = PROBE_TIMEOUT_MS / 1000,
+    host_interval: float = PROBE_HOST_INTERVAL_MS / 1000,
+    budget: float = PROBE_SWEEP_BUDGET_SECONDS,
+) -> Dict[int, bool]:
+    """
+    Sondea todos los objetivos con como mucho `concurrency` hosts a la vez.
+    Devuelve {device_id: alcanzable}; los que no terminan dentro de `budget`
+    segundos se cancelan y no aparecen en el resultado.
+    """
+    if not targets:
+        return {}
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run(target: ProbeTarget):
+        async with semaphore:
+            return target.id, await probe_host(target.ip, target.ports, timeout, host_interval)
+
+    tasks = [asyncio.create_task(run(target)) for target in targets]
+    done, pending = await asyncio.wait(tasks, timeout=budget)
+    for task in pending:
+        task.cancel()
+    await asyncio.gather(*pending, return_exceptions=True)
+
+    results = {}
+    for task in done:
+        if task.exception() is not None:
+            logger.error(f"Error al sondear dispositivo: {task.exception()}")
+            continue
+        device_id, reachable = task.result()
+        results[device_id] = reachable
+    return results
+
+
+@asynccontextmanager
+async def _sweep_lock() -> AsyncIterator[bool]:
+    """
+    Advisory lock de sesión (PROBE_LOCK_KEY) en una conexión propia en
+    autocommit: dura todo el barrido sin dejar ninguna transacción abierta.
+    Produce False si otro worker ya lo tiene.
+    """
+    async with engine.connect() as conn:
+        await conn.execution_options(isolation_level="AUTOCOMMIT")
+        locked = await conn.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": PROBE_LOCK_KEY})
+        if not locked.scalar():
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            try:
+                await conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": PROBE_LOCK_KEY})
+            except BaseException:
+                # Sin liberar, el lock volvería al pool con la conexión: se descarta
+                await conn.invalidate()
+                raise
+
+
+class ProbeService:
+    @staticmethod
+    async def sweep(db: AsyncSession, **probe_options) -> Optional[Dict[str, Any]]:
+        """
+        Sondea los dispositivos activos/inactivos y actualiza su status, con su
+        historial, solo si el resultado cambia: una sentencia por status nuevo.
+        Devuelve un resumen, o None si otro worker ya está sondeando.
+
+        Los objetivos se leen en una transacción que termina antes de sondear:
+        durante el sondeo no hay ninguna abierta ni conexión de `db` ocupada,
+        y los resultados se escriben en otra transacción corta.
+        """
+        async with _sweep_lock() as locked:
+            if not locked:
+                return None
+            try:
+                rows = await DeviceRepository.get_probe_targets(db, PROBED_STATUSES)
+                await db.commit()
+                targets = []
+                for row in rows:
+                    ports = target_ports(row.protocol, row.ports)
+                    if ports:
+                        targets.append(ProbeTarget(row.id, row.ip, ports))
+
+                started = time.monotonic()
+                results = await probe_all(targets, **probe_options)
+                elapsed = time.monotonic() - started
+
+                changed = 0
+                reachable = {
+                    STATUS_UP: [device_id for device_id, up in results.items() if up],
+                    STATUS_DOWN: [device_id for device_id, up in results.items() if not up],
+                }
+                for new_status, ids in reachable.items():
+                    if not ids:
+                        continue
+                    # El status pudo cambiarse a mano durante el sondeo
+                    criteria = DeviceRepository.filter_criteria(ids=ids) + [Device.status.in_(PROBED_STATUSES)]
+                    updated = await DeviceRepository.update_with_history(
+                        db, criteria, PROBE_ACTION, {"status": new_status}
+                    )
+                    changed += sum(1 for row in updated if row.changed)
+
+                if changed:
+                    await invalidate(db, "devices")
+                await db.commit()
+            except Exception as e:
+                await db.rollback()
+                logger.error(f"Error al sondear dispositivos: {e}")
+                raise
+
+        summary = {
+            "devices": len(rows),
+            "without_ports": len(rows) - len(targets),
+            "probed": len(results),
+            "timed_out": len(targets) - len(results),
+            "up": len(reachable[STATUS_UP]),
+            "down": len(reachable[STATUS_DOWN]),
+            "changed": changed,
+            "seconds": round(elapsed, 3),
+        }
+        logger.info(f"Sondeo de dispositivos: {summary}")
+        return summary
+
+    @staticmethod
+    async def run_periodic(interval_seconds: int = PROBE_INTERVAL_SECONDS):
+        """
+        Tarea de fondo: lanza un barrido cada `interval_seconds`.
+        """
+        while True:
+            try:
+                async with SessionLocal() as db:
+                    await ProbeService.sweep(db)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error en la tarea periódica de sondeo: {e}")
+            await asyncio.sleep(interval_seconds)
@@ -0,0 +1,125 @@
+from sqlalchemy import func, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import datetime, timedelta
+from typing import List, Optional
+import asyncio
+import logging
+
+from ..config import SNAPSHOT_INTERVAL_SECONDS, SNAPSHOT_KEEP
+from ..database import SessionLocal
+from ..models.location_model import Location
+from ..repositories.device_repository import DeviceRepository
+from ..repositories.load_profiles import DEVICE_WITH_PORTS
+from ..repositories.snapshot_repository import SnapshotRepository
+from ..schemas.device_schema import DeviceOut
+from ..schemas.location_schema import LocationOut
+
+logger = logging.getLogger(__name__)
+
+# Clave del advisory lock que evita que varios workers creen el mismo checkpoint
+SNAPSHOT_LOCK_KEY = 5_000_001
+
+class SnapshotService:
+    @staticmethod
+    async def take_checkpoint(db: AsyncSession, min_age: Optional[timedelta] = None):
+        """
+        Crea un checkpoint del inventario y poda los antiguos.
+        Si `min_age` se indica y el último checkpoint es más reciente, no hace nada.
+        Devuelve el checkpoint creado o None.
+        """
+        try:
+            locked = await db.execute(
+                text("SELECT pg_try_advisory_xact_lock(:key)"), {"key": SNAPSHOT_LOCK_KEY}
+            )
+            if not locked.scalar():
+                await db.rollback()
+                return None
+
+            if min_age is not None:
+                latest = await SnapshotRepository.get_latest(db)
+                now = (await db.execute(select(func.now()))).scalar_one()
+                if latest is not None and now - latest.taken_at < min_age:
+                    await db.rollback()
+                    return None
+
+            checkpoint = await SnapshotRepository.create_checkpoint(db)
+            await SnapshotRepository.prune(db, SNAPSHOT_KEEP)
+            await db.commit()
+            logger.info(f"Checkpoint de inventario creado: {checkpoint.id}")
+            return checkpoint
+        except Exception as e:
+            await db.rollback()
+            logger.error(f"Error al crear checkpoint de inventario: {e}")
+            raise
+
+    @staticmethod
+    async def run_periodic(interval_seconds: int = SNAPSHOT_INTERVAL_SECONDS):
+        """
+        Tarea de fondo: crea un checkpoint cada `interval_seconds`.
+        """
+        min_age = timedelta(seconds=interval_seconds)
+        while True:
+            try:
+                async with SessionLocal() as db:
+                    await SnapshotService.take_checkpoint(db, min_age=min_age)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error en la tarea periódica de checkpoints: {e}")
+            await asyncio.sleep(interval_seconds)
+
+    @staticmethod
+    async def check_as_of(db: AsyncSession, as_of: datetime) -> None:
+        """
+        Lanza ValueError si `as_of` es anterior al historial conservado
+        (HISTORY_RETENTION_MONTHS): ese estado ya no puede reconstruirse.
+        """
+        horizon = await SnapshotRepository.get_horizon(db)
+        if horizon is not None and as_of < horizon:
+            raise ValueError(f"El historial anterior a {horizon.isoformat()} ha expirado")
+
+    @staticmethod
+    async def get_device_as_of(db: AsyncSession, device_id: int, as_of: datetime) -> Optional[DeviceOut]:
+        """
+        Dispositivo con el status y la localización que tenía en `as_of`.
+        El resto de campos (puertos, descripción) no tienen historial y son los actuales.
+        Lanza ValueError si `as_of` es anterior al historial conservado.
+        """
+        await SnapshotService.check_as_of(db, as_of)
+        states = await SnapshotRepository.get_states_as_of(db, as_of, device_id=device_id)
+        if not states:
+            return None
+
+        device = await DeviceRepository.get_by_id(db, device_id, DEVICE_WITH_PORTS)
+        if device is None:
+            return None
+
+        state = states[0]
+        location = None
+        if state.location_id is not None:
+            location_obj = await db.get(Location, state.location_id)
+            if location_obj is not None:
+                location = LocationOut.model_validate(location_obj, from_attributes=True)
+
+        return DeviceOut.model_validate(device, from_attributes=True).model_copy(
+            update={"status": state.status, "location": location}
+        )
+
+    @staticmethod
+    async def get_location_devices(
+        db: AsyncSession,
+        location_id: int,
+        as_of: Optional[datetime] = None,
+        status: Optional[str] = None,
+        include_descendants: bool = False,
+    ) -> List:
+        """
+        Dispositivos (id, status, location_id) de la localización (y, con
+        `include_descendants`, de todo su subárbol), ahora o en `as_of`.
+        Lanza ValueError si `as_of` es anterior al historial conservado.
+        """
+        location = {"location_subtree" if include_descendants else "location_id": location_id}
+        if as_of is None:
+            return await DeviceRepository.get_states(db, status=status, **location)
+        await SnapshotService.check_as_of(db, as_of)
+        return await SnapshotRepository.get_states_as_of(db, as_of, status=status, **location)
@@ -0,0 +1,78 @@
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Any, Dict, List, Optional
+import asyncio
+import logging
+
+from ..config import STATS_RECONCILE_SECONDS
+from ..database import SessionLocal
+from ..repositories.stats_repository import StatsRepository
+
+logger = logging.getLogger(__name__)
+
+# Clave del advisory lock que evita que varios workers reconcilien a la vez
+STATS_LOCK_KEY = 5_000_003
+
+class StatsService:
+    @staticmethod
+    async def get_locations(db: AsyncSession) -> List[Dict[str, Any]]:
+        """
+        Dispositivos por localización y status, desde la tabla de contadores.
+        """
+        stats: Dict[Optional[int], Dict[str, Any]] = {}
+        for row in await StatsRepository.get_location_counts(db):
+            entry = stats.get(row.location_id)
+            if entry is None:
+                entry = stats[row.location_id] = {
+                    "location_id": row.location_id,
+                    "location_name": row.location_name,
+                    "total": 0,
+                    "by_status": [],
+                }
+            entry["total"] += row.device_count
+            entry["by_status"].append({"status": row.status, "count": row.device_count})
+        return list(stats.values())
+
+    @staticmethod
+    async def get_status(db: AsyncSession, location_subtree: Optional[int] = None) -> List[Dict[str, Any]]:
+        rows = await StatsRepository.get_status_counts(db, location_subtree)
+        return [{"status": row.status, "count": row.device_count} for row in rows]
+
+    @staticmethod
+    async def reconcile(db: AsyncSession) -> Optional[List[Dict[str, Any]]]:
+        """
+        Corrige la deriva de los contadores. Devuelve las diferencias
+        encontradas, o None si otro worker ya está reconciliando.
+        """
+        try:
+            locked = await db.execute(
+                text("SELECT pg_try_advisory_xact_lock(:key)"), {"key": STATS_LOCK_KEY}
+            )
+            if not locked.scalar():
+                await db.rollback()
+                return None
+
+            differences = await StatsRepository.reconcile(db)
+            await db.commit()
+            if differences:
+                logger.warning(f"Contadores de /stats corregidos: {len(differences)} diferencias")
+            return [dict(row._mapping) for row in differences]
+        except Exception as e:
+            await db.rollback()
+            logger.error(f"Error al reconciliar los contadores: {e}")
+            raise
+
+    @staticmethod
+    async def run_periodic(interval_seconds: int = STATS_RECONCILE_SECONDS):
+        """
+        Tarea de fondo: reconcilia al arrancar y después cada `interval_seconds`.
+        """
+        while True:
+            try:
+                async with SessionLocal() as db:
+                    await StatsService.reconcile(db)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error en la tarea periódica de reconciliación: {e}")
+            await asyncio.sleep(interval_seconds)
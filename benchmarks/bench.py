@@ -0,0 +1,398 @@
+"""
+Benchmark de la API contra una base de datos PostgreSQL local.
+
+Siembra un inventario sintético (dispositivos, puertos e historial) en una base
+de datos propia, ejecuta la aplicación FastAPI en el mismo proceso (sin
+servidor HTTP) y mide latencia p50/p99, rendimiento y sentencias SQL por
+petición de cada escenario. El resultado se escribe en JSON; con --baseline se
+compara con una ejecución anterior y termina con código 1 si algún escenario
+empeora más de --tolerance.
+
+Usa las variables POSTGRES_* de la aplicación, pero siempre sobre la base de
+datos --database (se crea si no existe y se BORRA al sembrar). Las escrituras
+de una ejecución cambian los datos de la siguiente: para comparar con una
+referencia, sembrar de nuevo (sin --skip-seed) con la misma escala y --seed.
+
+    python benchmarks/bench.py --devices 100000 --history 1000000 --output base.json
+    python benchmarks/bench.py --devices 100000 --history 1000000 --baseline base.json --output new.json
+"""
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import sys
+import time
+from datetime import datetime, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCENARIOS = [
+    "list",
+    "list_filtered",
+    "list_cidr",
+    "list_sparse",
+    "get",
+    "get_history",
+    "update",
+    "bulk_status",
+    "bulk_import",
+    "history",
+    "history_device",
+]
+
+# Métricas que se comparan con la ejecución de referencia (mayor es peor)
+COMPARED = ("p50_ms", "p99_ms", "statements_median")
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database", default="inventario_bench", help="Base de datos del benchmark")
+    parser.add_argument("--devices", type=int, default=100_000)
+    parser.add_argument("--history", type=int, default=1_000_000, help="Filas de historial de asignaciones")
+    parser.add_argument("--locations", type=int, default=200)
+    parser.add_argument("--ports-per-device", type=int, default=2)
+    parser.add_argument("--skip-seed", action="store_true", help="Reutiliza los datos de una ejecución anterior")
+    parser.add_argument("--requests", type=int, default=500, help="Peticiones medidas por escenario")
+    parser.add_argument("--warmup", type=int, default=20, help="Peticiones previas no medidas")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Fichero JSON de resultados")
+    parser.add_argument("--baseline", help="Resultados JSON de referencia")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Empeoramiento permitido (0.25 = 25%%)")
+    return parser.parse_args(argv)
+
+
+def configure_environment(args: argparse.Namespace) -> None:
+    """
+    Debe llamarse antes de importar `app`: la configuración se lee al importar.
+    """
+    os.environ["POSTGRES_DB"] = args.database
+    os.environ["SNAPSHOT_INTERVAL_SECONDS"] = "0"
+    os.environ["PROBE_INTERVAL_SECONDS"] = "0"
+    os.environ["METRICS_ENABLED"] = "true"  # las sentencias por petición salen de Server-Timing
+    os.environ["METRICS_SLOW_REQUEST_MS"] = "0"
+    os.environ.setdefault("DB_POOL_SIZE", str(max(args.concurrency, 5)))
+    sys.path.insert(0, ROOT)
+
+
+def device_ip(n: int) -> str:
+    # Misma fórmula que el SQL de siembra
+    return f"10.{(n >> 16) & 255}.{(n >> 8) & 255}.{n & 255}"
+
+
+# --- Base de datos -------------------------------------------------------------
+
+async def ensure_database(name: str) -> None:
+    import asyncpg
+    from app.config import POSTGRES_USER, POSTGRES_PASSWORD, POSTGRES_HOST, POSTGRES_PORT
+
+    conn = await asyncpg.connect(
+        user=POSTGRES_USER, password=POSTGRES_PASSWORD,
+        host=POSTGRES_HOST, port=POSTGRES_PORT, database="postgres",
+    )
+    try:
+        exists = await conn.fetchval("SELECT 1 FROM pg_database WHERE datname = $1", name)
+        if not exists:
+            await conn.execute(f'CREATE DATABASE "{name}"')
+    finally:
+        await conn.close()
+
+
+SEED_STATEMENTS = [
+    "SELECT setseed(:seed)",
+    """
+    INSERT INTO locations (name, description)
+    SELECT 'loc-' || g, 'Localización sintética ' || g
+    FROM generate_series(1, :locations) g
+    """,
+    "INSERT INTO location_closure (ancestor_id, descendant_id, depth) SELECT id, id, 0 FROM locations",
+    """
+    INSERT INTO devices (ip, status, description, protocol, location_id)
+    SELECT ('10.' || ((g >> 16) & 255) || '.' || ((g >> 8) & 255) || '.' || (g & 255))::inet,
+           (ARRAY['activo', 'inactivo', 'mantenimiento'])[1 + g % 3],
+           'Equipo ' || g,
+           (ARRAY['ssh', 'snmp', 'http'])[1 + g % 3],
+           1 + g % :locations
+    FROM generate_series(1, :devices) g
+    """,
+    """
+    INSERT INTO ports (device_id, port_number, description)
+    SELECT d.id, p, 'Puerto ' || p
+    FROM devices d, generate_series(1, :ports_per_device) p
+    """,
+    # Sin el trigger del feed: un NOTIFY por fila no aporta nada al sembrar
+    "ALTER TABLE assignment_history DISABLE TRIGGER assignment_history_feed",
+    """
+    INSERT INTO assignment_history
+        (device_id, action, old_status, new_status, old_location_id, new_location_id, timestamp)
+    SELECT 1 + g % :devices,
+           (ARRAY['CAMBIO DE STATUS', 'CAMBIO DE LOCALIZACIÓN'])[1 + g % 2],
+           'activo', 'inactivo',
+           1 + (random() * (:locations - 1))::int,
+           1 + (random() * (:locations - 1))::int,
+           now() - g * interval '10 seconds'
+    FROM generate_series(1, :history) g
+    """,
+    "ALTER TABLE assignment_history ENABLE TRIGGER assignment_history_feed",
+]
+
+
+async def seed(args: argparse.Namespace) -> float:
+    from sqlalchemy import text
+    from app import migrations
+    from app.database import engine, SessionLocal
+    from app.services.history_maintenance_service import HistoryMaintenanceService
+
+    started = time.perf_counter()
+    # Esquema desde cero con las migraciones, igual que en un despliegue
+    async with engine.begin() as conn:
+        await conn.execute(text("DROP SCHEMA public CASCADE"))
+        await conn.execute(text("CREATE SCHEMA public"))
+    await migrations.upgrade(engine)
+    async with engine.begin() as conn:
+        params = {
+            "seed": (args.seed % 1000) / 1000,
+            "locations": args.locations,
+            "devices": args.devices,
+            "ports_per_device": args.ports_per_device,
+            "history": args.history,
+        }
+        for statement in SEED_STATEMENTS:
+            await conn.execute(text(statement), {k: v for k, v in params.items() if f":{k}" in statement})
+
+    # El historial sembrado cae en la partición DEFAULT: se reparte por meses
+    # como haría la tarea de mantenimiento al arrancar (sin retención)
+    async with SessionLocal() as db:
+        await HistoryMaintenanceService.maintain(db, retention_months=0)
+
+    # ANALYZE fuera de la transacción para que el planificador vea los datos nuevos
+    async with engine.connect() as conn:
+        await conn.execution_options(isolation_level="AUTOCOMMIT")
+        await conn.execute(text("ANALYZE"))
+    return time.perf_counter() - started
+
+
+# --- Cliente ASGI en proceso ---------------------------------------------------
+
+async def call(app, method: str, path: str, query: str = "", body: Any = None) -> Tuple[int, Dict[str, str], bytes]:
+    payload = b"" if body is None else json.dumps(body).encode()
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": query.encode(),
+        "root_path": "",
+        "headers": [
+            (b"host", b"bench"),
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(payload)).encode()),
+        ],
+        "client": ("127.0.0.1", 0),
+        "server": ("bench", 80),
+    }
+    sent = False
+    response: Dict[str, Any] = {"status": 0, "headers": {}, "body": []}
+
+    async def receive():
+        nonlocal sent
+        if not sent:
+            sent = True
+            return {"type": "http.request", "body": payload, "more_body": False}
+        await asyncio.Future()  # el cliente nunca se desconecta
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            response["status"] = message["status"]
+            response["headers"] = {k.decode(): v.decode() for k, v in message.get("headers", [])}
+        elif message["type"] == "http.response.body":
+            response["body"].append(message.get("body", b""))
+
+    await app(scope, receive, send)
+    return response["status"], response["headers"], b"".join(response["body"])
+
+
+def statements_from(headers: Dict[str, str]) -> Optional[int]:
+    # Server-Timing: app;dur=..., db;dur=...;desc="N queries"
+    timing = headers.get("server-timing", "")
+    marker = 'desc="'
+    if marker not in timing:
+        return None
+    return int(timing.split(marker, 1)[1].split(" ", 1)[0])
+
+
+# --- Escenarios ----------------------------------------------------------------
+
+RequestFactory = Callable[[random.Random], Tuple[str, str, str, Any]]
+
+
+def build_scenarios(args: argparse.Namespace) -> Dict[str, RequestFactory]:
+    devices = args.devices
+
+    def device_id(rng: random.Random) -> int:
+        return rng.randint(1, devices)
+
+    def import_row(n: int, rng: random.Random) -> Dict[str, Any]:
+        return {
+            "ip": device_ip(n),
+            "status": rng.choice(["activo", "inactivo"]),
+            "description": f"Equipo {n}",
+            "protocol": "ssh",
+            "location_id": 1 + n % args.locations,
+            "ports": [{"port_number": 22, "description": "Puerto 22"}],
+        }
+
+    return {
+        "list": lambda rng: ("GET", "/devices/", "limit=50", None),
+        "list_filtered": lambda rng: ("GET", "/devices/", f"limit=50&location_id={rng.randint(1, args.locations)}&status=activo", None),
+        "list_cidr": lambda rng: ("GET", "/devices/", f"limit=50&cidr={device_ip(device_id(rng)).rsplit('.', 1)[0]}.0/24", None),
+        "list_sparse": lambda rng: ("GET", "/devices/", "limit=50&fields=id,ip,status", None),
+        "get": lambda rng: ("GET", f"/devices/{device_id(rng)}", "", None),
+        "get_history": lambda rng: ("GET", f"/devices/{device_id(rng)}", "expand=location,ports,history", None),
+        "update": lambda rng: ("PUT", f"/devices/{device_id(rng)}/status", f"status={rng.choice(['activo', 'inactivo'])}", None),
+        "bulk_status": lambda rng: ("POST", "/devices/bulk/status", "", {
+            "ids": rng.sample(range(1, devices + 1), min(100, devices)),
+            "status": rng.choice(["activo", "inactivo"]),
+        }),
+        "bulk_import": lambda rng: ("POST", "/devices/bulk", "", [
+            import_row(n, rng) for n in rng.sample(range(1, devices + 1), min(100, devices))
+        ]),
+        "history": lambda rng: ("GET", "/history/", "limit=50", None),
+        "history_device": lambda rng: ("GET", "/history/", f"limit=50&device_id={device_id(rng)}", None),
+    }
+
+
+def percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, round(q * (len(ordered) - 1)))]
+
+
+async def run_scenario(app, name: str, factory: RequestFactory, args: argparse.Namespace) -> Dict[str, Any]:
+    rng = random.Random(f"{args.seed}:{name}")
+    requests = [factory(rng) for _ in range(args.warmup + args.requests)]
+    latencies: List[float] = []
+    statements: List[int] = []
+    errors = 0
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def one(request, measured: bool):
+        nonlocal errors
+        async with semaphore:
+            started = time.perf_counter()
+            status, headers, _ = await call(app, *request)
+            elapsed = time.perf_counter() - started
+        if not measured:
+            return
+        if status >= 400:
+            errors += 1
+        latencies.append(elapsed * 1000)
+        count = statements_from(headers)
+        if count is not None:
+            statements.append(count)
+
+    await asyncio.gather(*(one(request, False) for request in requests[:args.warmup]))
+    started = time.perf_counter()
+    await asyncio.gather(*(one(request, True) for request in requests[args.warmup:]))
+    wall = time.perf_counter() - started
+
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "p50_ms": round(percentile(latencies, 0.50), 3),
+        "p99_ms": round(percentile(latencies, 0.99), 3),
+        "mean_ms": round(sum(latencies) / len(latencies), 3),
+        "throughput_rps": round(len(latencies) / wall, 1),
+        "statements_median": percentile(statements, 0.50) if statements else None,
+        "statements_max": max(statements) if statements else None,
+    }
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    regressions = []
+    for name, current in results["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(name)
+        if previous is None:
+            continue
+        for metric in COMPARED:
+            before, after = previous.get(metric), current.get(metric)
+            if before is None or after is None:
+                continue
+            # Las sentencias SQL no admiten tolerancia: una más por petición es una regresión
+            limit = before if metric.startswith("statements") else before * (1 + tolerance)
+            if after > limit:
+                regressions.append(f"{name}.{metric}: {before} -> {after}")
+        before, after = previous.get("throughput_rps"), current.get("throughput_rps")
+        if before and after and after < before / (1 + tolerance):
+            regressions.append(f"{name}.throughput_rps: {before} -> {after}")
+        if current["errors"] > previous.get("errors", 0):
+            regressions.append(f"{name}.errors: {previous.get('errors', 0)} -> {current['errors']}")
+    return regressions
+
+
+async def main(args: argparse.Namespace) -> int:
+    selected = [name for name in args.scenarios.split(",") if name]
+    unknown = set(selected) - set(SCENARIOS)
+    if unknown:
+        print(f"Escenarios desconocidos: {', '.join(sorted(unknown))}", file=sys.stderr)
+        return 2
+
+    await ensure_database(args.database)
+    from app.main import app
+    from app.database import engine
+
+    seed_seconds = None
+    if not args.skip_seed:
+        print(f"Sembrando {args.devices} dispositivos y {args.history} filas de historial...", file=sys.stderr)
+        seed_seconds = round(await seed(args), 1)
+
+    factories = build_scenarios(args)
+    results: Dict[str, Any] = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "devices": args.devices,
+            "history": args.history,
+            "locations": args.locations,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "seed": args.seed,
+            "seed_seconds": seed_seconds,
+        },
+        "scenarios": {},
+    }
+    for name in selected:
+        results["scenarios"][name] = result = await run_scenario(app, name, factories[name], args)
+        print(
+            f"{name:16} p50 {result['p50_ms']:8.2f} ms  p99 {result['p99_ms']:8.2f} ms  "
+            f"{result['throughput_rps']:8.1f} req/s  SQL {result['statements_median']}  errores {result['errors']}",
+            file=sys.stderr,
+        )
+    await engine.dispose()
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print("Regresiones respecto a la referencia:", file=sys.stderr)
+            for regression in regressions:
+                print(f"  {regression}", file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    arguments = parse_args()
+    configure_environment(arguments)
+    sys.exit(asyncio.run(main(arguments)))
@@ -0,0 +1,133 @@
+"""
+Comprueba que la salida FAST_JSON de los listados es idéntica, byte a byte, a
+la salida normal (modelos Pydantic + codificador de FastAPI).
+
+Recorre varias páginas de /devices/, /history/ y /locations/ con los mismos
+parámetros en los dos modos y compara los cuerpos. Antes añade unas filas con
+casos límite (sin localización, sin puertos, texto no ASCII, IPv6, fechas sin
+microsegundos) y las borra al terminar. Usa la base de datos de bench.py.
+
+    python benchmarks/bench.py --devices 2000 --history 20000 --requests 10
+    python benchmarks/check_fast_json.py
+"""
+from typing import List, Tuple
+import argparse
+import asyncio
+import json
+import sys
+
+from bench import call, configure_environment
+
+QUERIES: List[Tuple[str, str]] = [
+    ("/devices/", "limit=50"),
+    ("/devices/", "limit=500"),
+    ("/devices/", "limit=20&include_total=true"),
+    ("/devices/", "limit=50&status=activo"),
+    ("/devices/", "limit=50&ip_prefix=192.0.2."),
+    ("/devices/", "limit=50&cidr=192.0.2.0/24"),
+    ("/devices/", "limit=50&cidr=2001:db8::/32"),
+    ("/history/", "limit=50"),
+    ("/history/", "limit=500"),
+    ("/history/", "limit=50&action=CAMBIO%20DE%20STATUS"),
+    ("/locations/", ""),
+]
+
+EDGE_CASES = [
+    """
+    INSERT INTO locations (name, description, parent_id)
+    VALUES ('Almacén Ñandú', 'Descripción "con" comillas y ✓', (SELECT min(id) FROM locations))
+    """,
+    """
+    INSERT INTO devices (ip, status, description, protocol, location_id)
+    VALUES ('192.0.2.1', 'activo', 'Sin localización ni puertos', 'ssh', NULL),
+           ('192.0.2.2', 'activo', 'Equipo ñ €', 'snmp',
+            (SELECT id FROM locations WHERE name = 'Almacén Ñandú')),
+           ('2001:db8::1', 'activo', 'IPv6', 'ssh', NULL)
+    """,
+    """
+    INSERT INTO ports (device_id, port_number, description)
+    SELECT id, p, 'Puerto ' || p FROM devices, (VALUES (443), (22), (8080)) v(p)
+    WHERE ip = '192.0.2.2'
+    """,
+    """
+    INSERT INTO assignment_history (device_id, action, new_status, timestamp)
+    SELECT id, 'ALTA DE DISPOSITIVO', 'activo', date_trunc('second', now()) FROM devices
+    WHERE ip <<= '192.0.2.0/24' OR ip <<= '2001:db8::/32'
+    """,
+]
+
+CLEANUP = [
+    "DELETE FROM devices WHERE ip <<= '192.0.2.0/24' OR ip <<= '2001:db8::/32'",
+    "DELETE FROM locations WHERE name = 'Almacén Ñandú'",
+]
+
+
+async def fetch_pages(app, path: str, query: str, pages: int) -> List[bytes]:
+    bodies = []
+    cursor = None
+    for _ in range(pages):
+        full_query = query if cursor is None else f"{query}&cursor={cursor}"
+        status, _, body = await call(app, "GET", path, full_query)
+        if status != 200:
+            raise RuntimeError(f"{path}?{full_query} -> {status}: {body[:200]!r}")
+        bodies.append(body)
+        content = json.loads(body)
+        cursor = content.get("next_cursor") if isinstance(content, dict) else None
+        if not cursor:
+            break
+    return bodies
+
+
+async def main(args: argparse.Namespace) -> int:
+    from sqlalchemy import text
+    from app.main import app
+    from app.database import engine
+    from app.controllers import device_controller, history_controller, location_controller
+
+    controllers = (device_controller, history_controller, location_controller)
+
+    async with engine.begin() as conn:
+        for statement in CLEANUP + EDGE_CASES:
+            await conn.execute(text(statement))
+
+    failures = 0
+    try:
+        for path, query in QUERIES:
+            results = {}
+            for fast in (False, True):
+                for module in controllers:
+                    module.FAST_JSON = fast
+                results[fast] = await fetch_pages(app, path, query, args.pages)
+
+            if results[False] == results[True]:
+                print(f"OK    {path}?{query} ({len(results[False])} páginas)")
+                continue
+
+            failures += 1
+            print(f"FALLA {path}?{query}")
+            for normal, fast in zip(results[False], results[True]):
+                if normal != fast:
+                    position = next(
+                        (i for i, (a, b) in enumerate(zip(normal, fast)) if a != b),
+                        min(len(normal), len(fast)),
+                    )
+                    print(f"  normal: {normal[max(0, position - 80):position + 80]!r}")
+                    print(f"  fast:   {fast[max(0, position - 80):position + 80]!r}")
+                    break
+    finally:
+        async with engine.begin() as conn:
+            for statement in CLEANUP:
+                await conn.execute(text(statement))
+        await engine.dispose()
+
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database", default="inventario_bench")
+    parser.add_argument("--pages", type=int, default=5, help="Páginas recorridas por consulta")
+    arguments = parser.parse_args()
+    arguments.concurrency = 1
+    configure_environment(arguments)
+    sys.exit(asyncio.run(main(arguments)))
@@ -0,0 +1,66 @@
+"""
+Configuración común de los tests.
+
+Los tests que necesitan PostgreSQL usan la base de datos TEST_POSTGRES_DB
+(por defecto inventario_test; se crea si no existe) con las credenciales
+POSTGRES_* o, si no están, las de docker-compose.yml. Sin servidor se
+saltan. Esa base de datos se vacía y se migra en cada test: no apuntarla a
+una con datos.
+"""
+import asyncio
+import os
+
+# Antes de importar app.config, que lee el entorno al importarse
+os.environ.setdefault("POSTGRES_USER", "postgres")
+os.environ.setdefault("POSTGRES_PASSWORD", "postgres")
+os.environ.setdefault("POSTGRES_HOST", "localhost")
+os.environ.setdefault("POSTGRES_PORT", "5432")
+os.environ["POSTGRES_DB"] = os.environ.get("TEST_POSTGRES_DB", "inventario_test")
+
+import asyncpg
+import pytest
+
+from app import migrations
+from app.database import engine
+
+from helpers import run
+
+
+async def _ensure_database() -> None:
+    settings = dict(
+        user=os.environ["POSTGRES_USER"],
+        password=os.environ["POSTGRES_PASSWORD"],
+        host=os.environ["POSTGRES_HOST"],
+        port=int(os.environ["POSTGRES_PORT"]),
+    )
+    try:
+        conn = await asyncpg.connect(database=os.environ["POSTGRES_DB"], **settings)
+    except asyncpg.InvalidCatalogNameError:
+        conn = await asyncpg.connect(database="postgres", **settings)
+        await conn.execute(f'CREATE DATABASE "{os.environ["POSTGRES_DB"]}"')
+    await conn.close()
+
+
+@pytest.fixture(scope="session")
+def database():
+    """
+    Comprueba (una vez) que hay servidor y que existe la base de datos de tests.
+    """
+    try:
+        asyncio.run(_ensure_database())
+    except (OSError, asyncpg.PostgresError) as e:
+        pytest.skip(f"PostgreSQL no disponible: {e}")
+
+
+@pytest.fixture
+def clean_database(database):
+    """
+    Base de datos de tests vacía y en la última versión de las migraciones.
+    """
+    async def reset():
+        async with engine.begin() as conn:
+            await conn.exec_driver_sql("DROP SCHEMA public CASCADE")
+            await conn.exec_driver_sql("CREATE SCHEMA public")
+        await migrations.upgrade(engine)
+
+    run(reset())
@@ -0,0 +1,17 @@
+import asyncio
+
+from app.database import engine
+
+
+def run(coro):
+    """
+    Ejecuta la corrutina en un bucle nuevo y cierra después las conexiones
+    del pool, que quedan ligadas a ese bucle.
+    """
+    async def main():
+        try:
+            return await coro
+        finally:
+            await engine.dispose()
+
+    return asyncio.run(main())
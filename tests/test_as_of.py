@@ -0,0 +1,66 @@
+"""
+Reconstrucción as_of de un dispositivo eliminado después del último
+checkpoint: su historial se borra con él, pero no debe seguir apareciendo
+(desde el checkpoint) después de la baja.
+"""
+from datetime import datetime
+
+import httpx
+from sqlalchemy import func, select
+
+from app.database import SessionLocal
+from app.main import app
+from app.services.snapshot_service import SnapshotService
+
+from helpers import run
+
+
+async def _now() -> datetime:
+    async with SessionLocal() as db:
+        return (await db.execute(select(func.now()))).scalar_one()
+
+
+async def _devices_at(client: httpx.AsyncClient, location_id: int, as_of: datetime):
+    response = await client.get(f"/locations/{location_id}/devices", params={"as_of": as_of.isoformat()})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_device_deleted_after_checkpoint(clean_database):
+    async def scenario():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            location_id = (await client.post("/locations/", json={"name": "A", "description": "d"})).json()["id"]
+            response = await client.post("/devices/", json={
+                "ip": "10.0.0.1",
+                "status": "activo",
+                "description": "d",
+                "protocol": "ssh",
+                "location_id": location_id,
+                "ports": [],
+            })
+            assert response.status_code == 201, response.text
+            device_id = response.json()["id"]
+            response = await client.put(f"/devices/{device_id}/status", params={"status": "inactivo"})
+            assert response.status_code == 200, response.text
+
+            async with SessionLocal() as db:
+                assert await SnapshotService.take_checkpoint(db) is not None
+            before_delete = await _now()
+
+            response = await client.delete(f"/devices/{device_id}")
+            assert response.status_code == 200, response.text
+            after_delete = await _now()
+
+            current = (await client.get(f"/locations/{location_id}/devices")).json()
+            return (
+                await _devices_at(client, location_id, before_delete),
+                await _devices_at(client, location_id, after_delete),
+                current,
+                device_id,
+                location_id,
+            )
+
+    before, after, current, device_id, location_id = run(scenario())
+    assert before == [{"device_id": device_id, "status": "inactivo", "location_id": location_id}]
+    assert after == current == []
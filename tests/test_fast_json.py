@@ -0,0 +1,112 @@
+"""
+La salida FAST_JSON de los listados es idéntica, byte a byte, a la normal
+(modelos Pydantic + codificador de FastAPI), con orjson y sin él, sobre
+filas con casos límite: sin localización, sin puertos, texto no ASCII,
+IPv6 y fechas sin microsegundos.
+"""
+from typing import Dict, List, Optional
+
+import httpx
+import pytest
+from sqlalchemy import text
+
+from app import fast_json
+from app.cache import device_cache, location_cache
+from app.controllers import device_controller, history_controller, location_controller
+from app.database import engine
+from app.main import app
+
+from helpers import run
+
+LISTINGS = [
+    "/devices/?limit=50",
+    "/devices/?limit=2",
+    "/devices/?limit=50&include_total=true",
+    "/devices/?limit=50&cidr=2001:db8::/32",
+    "/history/?limit=50",
+    "/history/?limit=2",
+    "/locations/",
+]
+
+# Timestamps truncados al segundo: isoformat() los escribe sin microsegundos
+WHOLE_SECOND_HISTORY = """
+    UPDATE assignment_history SET "timestamp" = date_trunc('second', "timestamp")
+    WHERE device_id IN (SELECT id FROM devices WHERE description = 'Sin microsegundos')
+"""
+
+
+async def _seed(client: httpx.AsyncClient) -> None:
+    async def post(path: str, body: Dict) -> Dict:
+        response = await client.post(path, json=body)
+        assert response.status_code == 201, response.text
+        return response.json()
+
+    root = await post("/locations/", {"name": "Almacén Ñandú", "description": 'Descripción "con" comillas ✓'})
+    child = await post("/locations/", {"name": "Sala 1", "description": "d\tcon\nsaltos", "parent_id": root["id"]})
+
+    def device(ip: str, description: str, location: Optional[Dict], ports: List[int]) -> Dict:
+        return {
+            "ip": ip,
+            "status": "activo",
+            "description": description,
+            "protocol": "ssh",
+            "location_id": location["id"] if location else None,
+            "ports": [{"port_number": port, "description": f"Puerto {port} ü"} for port in ports],
+        }
+
+    await post("/devices/", device("192.0.2.1", "Sin localización ni puertos", None, []))
+    await post("/devices/", device("192.0.2.2", "Equipo ñ € 🖧", child, [443, 22, 8080]))
+    await post("/devices/", device("2001:db8::1", "IPv6", root, [22]))
+    await post("/devices/", device("192.0.2.3", "Sin microsegundos", root, []))
+    response = await client.put("/devices/1/status", params={"status": "inactivo"})
+    assert response.status_code == 200, response.text
+
+    async with engine.begin() as conn:
+        await conn.execute(text(WHOLE_SECOND_HISTORY))
+
+
+def _set_fast_json(monkeypatch, enabled: bool) -> None:
+    for controller in (device_controller, history_controller, location_controller):
+        monkeypatch.setattr(controller, "FAST_JSON", enabled)
+
+
+async def _fetch(client: httpx.AsyncClient, url: str) -> bytes:
+    device_cache.invalidate()
+    location_cache.invalidate()
+    response = await client.get(url)
+    assert response.status_code == 200, f"{url}: {response.text}"
+    return response.content
+
+
+@pytest.mark.parametrize("use_orjson", [True, False], ids=["orjson", "json"])
+def test_fast_json_matches_schemas(clean_database, monkeypatch, use_orjson):
+    if use_orjson and fast_json.orjson is None:
+        pytest.skip("orjson no está instalado")
+    if not use_orjson:
+        monkeypatch.setattr(fast_json, "orjson", None)
+
+    async def scenario():
+        bodies = {}
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            await _seed(client)
+            for enabled in (False, True):
+                _set_fast_json(monkeypatch, enabled)
+                for url in LISTINGS:
+                    bodies[url, enabled] = await _fetch(client, url)
+        return bodies
+
+    bodies = run(scenario())
+    for url in LISTINGS:
+        assert bodies[url, True] == bodies[url, False], url
+    # Los casos límite están en la salida comparada
+    devices = bodies["/devices/?limit=50", False].decode("utf-8")
+    assert '"location":null' in devices and '"ports":[]' in devices
+    assert "2001:db8::1" in devices and "🖧" in devices
+    history = bodies["/history/?limit=50", False].decode("utf-8")
+    assert any(len(value) == 20 for value in _timestamps(history))
+
+
+def _timestamps(body: str) -> List[str]:
+    # Valores de "timestamp"; sin microsegundos son "AAAA-MM-DDTHH:MM:SSZ" (20 caracteres)
+    return [part.split('"')[0] for part in body.split('"timestamp":"')[1:]]
@@ -0,0 +1,62 @@
+"""
+Las filas de historial de más de 8000 bytes (el máximo de un NOTIFY) se
+escriben y llegan enteras al feed: el aviso solo lleva sus claves y el feed
+lee la fila por id.
+"""
+import asyncio
+
+import asyncpg
+import httpx
+
+from app.config import DATABASE_URL
+from app.feed import feed_hub
+from app.main import app
+from app.models.triggers import HISTORY_FEED_CHANNEL
+
+from helpers import run
+
+LONG_DESCRIPTION = "ñ" * 9000
+
+
+def test_long_history_row_reaches_feed(clean_database):
+    async def scenario():
+        # Lo que hace listener.run_listener, sin la tarea de fondo
+        listen = await asyncpg.connect(DATABASE_URL.replace("postgresql+asyncpg://", "postgresql://", 1))
+        await listen.add_listener(HISTORY_FEED_CHANNEL, lambda conn, pid, channel, payload: feed_hub.publish(payload))
+        subscriber = feed_hub.subscribe()
+        try:
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                response = await client.post("/locations/", json={"name": "A", "description": "d"})
+                assert response.status_code == 201, response.text
+                location_id = response.json()["id"]
+                response = await client.put(
+                    f"/locations/{location_id}", json={"name": "A", "description": LONG_DESCRIPTION}
+                )
+                assert response.status_code == 200, response.text
+                response = await client.post("/devices/", json={
+                    "ip": "10.0.0.1",
+                    "status": "activo",
+                    "description": LONG_DESCRIPTION,
+                    "protocol": "ssh",
+                    "location_id": location_id,
+                    "ports": [],
+                })
+                assert response.status_code == 201, response.text
+                response = await client.put("/devices/1/status", params={"status": "s" * 9000})
+                assert response.status_code == 200, response.text
+
+            events = []
+            while len(events) < 3:
+                events.append(await asyncio.wait_for(subscriber.queue.get(), 5))
+            return events
+        finally:
+            feed_hub.unsubscribe(subscriber)
+            await listen.close()
+
+    events = run(scenario())
+    assert [kind for kind, row in events] == ["location", "assignment", "assignment"]
+    location, created, changed = (row for kind, row in events)
+    assert location["new_description"] == LONG_DESCRIPTION
+    assert created["action"] and created["new_location_id"] == location["location_id"]
+    assert changed["new_status"] == "s" * 9000
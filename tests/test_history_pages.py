@@ -0,0 +1,83 @@
+"""
+/history/?location_id= pagina igual que el filtro OR sobre old_location_id y
+new_location_id, aunque se lea por separado cada columna: sin perder filas
+entre páginas ni repetir las que tienen la misma localización en ambas.
+"""
+from typing import List
+
+import httpx
+from sqlalchemy import or_, select
+
+from app.database import SessionLocal
+from app.main import app
+from app.models.assignment_model import AssignmentHistory
+
+from helpers import run
+
+
+async def _seed(client: httpx.AsyncClient) -> int:
+    """
+    Dispositivos que entran, salen y cambian de estado en A: filas con A solo
+    en new_location_id, solo en old_location_id y en las dos.
+    """
+    a = (await client.post("/locations/", json={"name": "A", "description": "d"})).json()["id"]
+    b = (await client.post("/locations/", json={"name": "B", "description": "d"})).json()["id"]
+    for i in range(4):
+        response = await client.post("/devices/", json={
+            "ip": f"10.0.0.{i + 1}",
+            "status": "activo",
+            "description": f"d{i}",
+            "protocol": "ssh",
+            "location_id": a if i % 2 else b,
+            "ports": [],
+        })
+        assert response.status_code == 201, response.text
+        device_id = response.json()["id"]
+        for status in ("inactivo", "activo"):
+            response = await client.put(f"/devices/{device_id}/status", params={"status": status})
+            assert response.status_code == 200, response.text
+        response = await client.post(f"/devices/{device_id}/change/{b if i % 2 else a}")
+        assert response.status_code == 200, response.text
+    return a
+
+
+async def _pages(client: httpx.AsyncClient, location_id: int, limit: int) -> List[int]:
+    ids, cursor = [], None
+    while True:
+        params = {"location_id": location_id, "limit": limit}
+        if cursor:
+            params["cursor"] = cursor
+        response = await client.get("/history/", params=params)
+        assert response.status_code == 200, response.text
+        page = response.json()
+        ids += [item["id"] for item in page["items"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return ids
+
+
+async def _expected(location_id: int) -> List[int]:
+    async with SessionLocal() as db:
+        result = await db.execute(
+            select(AssignmentHistory.id)
+            .where(or_(
+                AssignmentHistory.old_location_id == location_id,
+                AssignmentHistory.new_location_id == location_id,
+            ))
+            .order_by(AssignmentHistory.timestamp.desc(), AssignmentHistory.id.desc())
+        )
+        return result.scalars().all()
+
+
+def test_location_pages_match_or_filter(clean_database):
+    async def scenario():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            location_id = await _seed(client)
+            pages = {limit: await _pages(client, location_id, limit) for limit in (1, 3, 100)}
+        return pages, await _expected(location_id)
+
+    pages, expected = run(scenario())
+    assert len(expected) == 10
+    for limit, ids in pages.items():
+        assert ids == expected, limit
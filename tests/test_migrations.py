@@ -0,0 +1,9 @@
+from app.database import engine
+from app.migrations.model_check import compare_with_models
+
+from helpers import run
+
+
+def test_migrations_match_models(database):
+    # Migraciones en un esquema, create_all en otro: mismas tablas, índices, triggers y funciones
+    assert run(compare_with_models(engine)) == []
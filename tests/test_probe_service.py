@@ -0,0 +1,116 @@
+import asyncio
+import time
+
+from app.services import probe_service
+from app.services.probe_service import ProbeTarget, probe_all
+
+from helpers import run
+
+LOCALHOST = "127.0.0.1"
+
+
+class Listener:
+    """
+    Servidor TCP en localhost que cuenta las conexiones recibidas.
+    """
+    def __init__(self):
+        self.connections = 0
+        self.server = None
+
+    async def __aenter__(self):
+        self.server = await asyncio.start_server(self._handle, LOCALHOST, 0)
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.server.close()
+        await self.server.wait_closed()
+
+    @property
+    def port(self) -> int:
+        return self.server.sockets[0].getsockname()[1]
+
+    def _handle(self, reader, writer):
+        self.connections += 1
+        writer.close()
+
+
+async def closed_port() -> int:
+    # Un puerto que acaba de quedar libre: la conexión se rechaza al momento
+    async with Listener() as listener:
+        port = listener.port
+    return port
+
+
+async def hang(*args, **kwargs):
+    # Un host que nunca completa la conexión
+    await asyncio.sleep(3600)
+
+
+def test_probe_all_results():
+    async def scenario():
+        async with Listener() as first, Listener() as second:
+            closed = await closed_port()
+            results = await probe_all(
+                [
+                    ProbeTarget(1, LOCALHOST, [first.port]),
+                    ProbeTarget(2, LOCALHOST, [closed]),
+                    ProbeTarget(3, LOCALHOST, [closed, second.port]),
+                    ProbeTarget(4, LOCALHOST, [first.port, second.port]),
+                ],
+                timeout=1, host_interval=0, budget=5,
+            )
+            await asyncio.sleep(0.05)
+            return results, first.connections, second.connections
+
+    results, first_connections, second_connections = run(scenario())
+    assert results == {1: True, 2: False, 3: True, 4: True}
+    # El host 4 para en el primer puerto que responde
+    assert first_connections == 2
+    assert second_connections == 1
+
+
+def test_probe_all_without_targets():
+    assert run(probe_all([])) == {}
+
+
+def test_connection_timeout_counts_as_down(monkeypatch):
+    monkeypatch.setattr(probe_service.asyncio, "open_connection", hang)
+    started = time.monotonic()
+    results = run(probe_all([ProbeTarget(1, LOCALHOST, [80, 443])], timeout=0.05, host_interval=0, budget=5))
+    assert results == {1: False}
+    assert time.monotonic() - started < 1
+
+
+def test_budget_cancels_unfinished_hosts(monkeypatch):
+    monkeypatch.setattr(probe_service.asyncio, "open_connection", hang)
+    started = time.monotonic()
+    results = run(probe_all([ProbeTarget(i, LOCALHOST, [80]) for i in range(3)], timeout=60, budget=0.1))
+    # Los que no terminan a tiempo no aparecen en el resultado
+    assert results == {}
+    assert time.monotonic() - started < 1
+
+
+def test_probe_all_limits_concurrency(monkeypatch):
+    open_connection = asyncio.open_connection
+    active = 0
+    peak = 0
+
+    async def counted(*args, **kwargs):
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        try:
+            await asyncio.sleep(0.02)
+            return await open_connection(*args, **kwargs)
+        finally:
+            active -= 1
+
+    async def scenario():
+        async with Listener() as listener:
+            targets = [ProbeTarget(i, LOCALHOST, [listener.port]) for i in range(20)]
+            return await probe_all(targets, concurrency=4, timeout=1, budget=5)
+
+    monkeypatch.setattr(probe_service.asyncio, "open_connection", counted)
+    results = run(scenario())
+    assert results == {i: True for i in range(20)}
+    assert peak == 4
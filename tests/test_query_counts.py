@@ -0,0 +1,104 @@
+"""
+Número de sentencias SQL de cada endpoint, con la caché vacía. Los perfiles
+de carga (repositories/load_profiles.py) fijan qué se carga: si una relación
+vuelve a cargarse fila a fila o en cascada, el número cambia aquí.
+"""
+from contextlib import contextmanager
+from typing import Dict, List
+
+import httpx
+from sqlalchemy import event
+
+from app.cache import device_cache, location_cache
+from app.database import engine
+from app.main import app
+
+from helpers import run
+
+# (método, ruta) -> sentencias, con los datos de _seed
+EXPECTED: Dict[tuple, int] = {
+    ("GET", "/devices/"): 3,
+    ("GET", "/devices/?expand=location,ports,history"): 5,
+    # EXPLAIN para la estimación y, con pocas filas, el COUNT exacto
+    ("GET", "/devices/?include_total=true"): 5,
+    ("GET", "/devices/1"): 3,
+    ("GET", "/devices/1?expand=history"): 4,
+    ("GET", "/devices/1/history"): 1,
+    ("GET", "/locations/"): 2,
+    ("GET", "/locations/1"): 1,
+    ("GET", "/locations/1/subtree"): 1,
+    ("GET", "/locations/1/devices"): 1,
+    ("GET", "/history/"): 1,
+    ("GET", "/history/?location_id=1"): 1,
+    ("GET", "/stats/locations"): 1,
+    ("GET", "/stats/status"): 1,
+    ("POST", "/devices/"): 6,
+    ("PUT", "/devices/2/status?status=inactivo"): 4,
+}
+
+NEW_DEVICE = {
+    "ip": "10.0.1.1",
+    "status": "activo",
+    "description": "nuevo",
+    "protocol": "ssh",
+    "location_id": 1,
+    "ports": [{"port_number": 22, "description": "ssh"}],
+}
+
+
+@contextmanager
+def count_statements():
+    statements: List[str] = []
+
+    def on_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine.sync_engine, "after_cursor_execute", on_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine.sync_engine, "after_cursor_execute", on_execute)
+
+
+async def _seed(client: httpx.AsyncClient) -> None:
+    """
+    Dos localizaciones anidadas y tres dispositivos con dos puertos cada uno
+    y más de una fila de historial: suficientes filas para que una carga
+    fila a fila se note en el recuento.
+    """
+    parent = (await client.post("/locations/", json={"name": "A", "description": "d"})).json()["id"]
+    child = (await client.post(
+        "/locations/", json={"name": "B", "description": "d", "parent_id": parent}
+    )).json()["id"]
+    for i in range(3):
+        response = await client.post("/devices/", json={
+            "ip": f"10.0.0.{i + 1}",
+            "status": "activo",
+            "description": f"d{i}",
+            "protocol": "ssh",
+            "location_id": parent if i else child,
+            "ports": [{"port_number": 22, "description": "ssh"}, {"port_number": 80 + i, "description": "http"}],
+        })
+        assert response.status_code == 201, response.text
+    response = await client.put("/devices/1/status", params={"status": "inactivo"})
+    assert response.status_code == 200, response.text
+
+
+async def _measure() -> Dict[tuple, int]:
+    counts = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        await _seed(client)
+        for method, url in EXPECTED:
+            device_cache.invalidate()
+            location_cache.invalidate()
+            body = NEW_DEVICE if method == "POST" else None
+            with count_statements() as statements:
+                response = await client.request(method, url, json=body)
+            assert response.status_code < 300, f"{method} {url}: {response.text}"
+            counts[(method, url)] = len(statements)
+    return counts
+
+
+def test_statements_per_endpoint(clean_database):
+    assert run(_measure()) == EXPECTED